@@ -1,10 +1,17 @@
 from collections import deque
-from concurrent.futures import ProcessPoolExecutor, as_completed
-from tqdm import tqdm
-import pyfiglet
-from multiprocessing import Queue
-from multiprocessing import Manager
 import time
+import heapq
+import json
+import os
+import sys
+import mmap
+import struct
+from array import array
+from bisect import bisect_left, bisect_right
+
+# tqdm, pyfiglet, hashlib, multiprocessing and concurrent.futures are imported
+# where they are used, so `import mixfinder` (and every spawned worker) stays
+# cheap; `python mixfinder.py bench-startup` measures it.
 
 # Base products and their starting effects
 base_products = {
@@ -285,9 +292,23 @@ def is_goal(state_effects, desired_effects):
     return all(effect in state_effects for effect in desired_effects)
 
 MAX_EFFECTS = 8  # Set this globally
+SEARCH_ENGINE = os.environ.get("MIXFINDER_ENGINE", "python")  # "python", "numpy" (vectorized) or "external" (on disk)
 
-def apply_ingredient(effects, ingredient):
-    rule = effect_rules.get(ingredient, {"replaces": {}, "adds": []})
+# Transition kernel
+# mix_step is the reference for what adding an ingredient does, written for
+# clarity and used to explain recipes step by step. Every solver runs the
+# compiled version below instead (CompiledRules.successors, or FrontierKernel
+# on NumPy), so all modes explore the same graph and share one transition
+# cache per ruleset. `python mixfinder.py fuzz` checks the compiled tables,
+# transition() and the recipe trie against the reference on random states,
+# recipes and rulesets.
+def mix_step(effects, ingredient, rules=None, max_effects=None):
+    """Reference transition: returns (sorted effects after, [(old, new) replaced], [added])."""
+    if rules is None:
+        rules = effect_rules
+    if max_effects is None:
+        max_effects = MAX_EFFECTS
+    rule = rules.get(ingredient, {"replaces": {}, "adds": []})
     replaces = rule.get("replaces", {})
     adds = rule.get("adds", [])
 
@@ -304,510 +325,4431 @@ def apply_ingredient(effects, ingredient):
 
     # Step 2: Apply replacements
     updated_effects = []
+    replaced_log = []
     for eff in original_effects:
         if eff in replacements:
             new_eff = replacements[eff]
             updated_effects.append(new_eff)
+            replaced_log.append((eff, new_eff))
         else:
             updated_effects.append(eff)
 
     # Step 3: Apply static additions, even if it was replaced out
+    added_log = []
     for eff in adds:
         if eff not in updated_effects or eff in removed_effects:
-            if len(updated_effects) < MAX_EFFECTS:
+            if len(updated_effects) < max_effects:
                 updated_effects.append(eff)
+                added_log.append(eff)
 
     # Step 4: De-dupe and return
-    return sorted(set(updated_effects))
+    return sorted(set(updated_effects)), replaced_log, added_log
 
-def filter_base_products(starting_product_choice):
-    if starting_product_choice == 0:
-        return base_products
-    elif starting_product_choice == 1:
-        return {k: v for k, v in base_products.items() if k in ['OG Kush', 'Granddaddy Purple', 'Green Crack', 'Sour Diesel']}
-    elif starting_product_choice == 2:
-        return {'Meth': []}
-    elif starting_product_choice == 3:
-        return {'Cocaine': []}
-    elif starting_product_choice == 4:
-        return {'OG Kush': base_products.get('OG Kush', [])}
-    elif starting_product_choice == 5:
-        return {'Granddaddy Purple': base_products.get('Granddaddy Purple', [])}
-    elif starting_product_choice == 6:
-        return {'Green Crack': base_products.get('Green Crack', [])}
-    else:
-        return base_products
+def apply_ingredient(effects, ingredient):
+    return mix_step(effects, ingredient)[0]
 
-def bfs_worker_profit(args, progress_queue):
-    base_name, base_effects, max_depth, effect_rules = args
-    best_result = None
-    best_profit = float('-inf')
+# Compiled state engine
+# Effect sets are int bitmasks with bit i = effects[i] in sorted name order, so
+# walking the bits yields the same sorted list apply_ingredient returns.
+class CompiledRules:
+    # Maximum number of states whose successors are kept in the transition table
+    cache_limit = 1 << 18
 
-    visited = {}
-    queue = deque()
-    steps = 0
+    def __init__(self, rules, max_effects=MAX_EFFECTS, starting_effects=()):
+        names = set(starting_effects)
+        for rule in rules.values():
+            names.update(rule.get("adds", []))
+            names.update(rule.get("replaces", {}).values())
 
-    initial_state = {
-        "effects": base_effects.copy(),
-        "path": []
-    }
-    queue.append(initial_state)
-    visited[tuple(sorted(base_effects))] = 0
+        self.effects = sorted(names)
+        self.bit = {effect: i for i, effect in enumerate(self.effects)}
+        self.ingredients = list(rules)
+        self.ingredient_index = {ingredient: i for i, ingredient in enumerate(self.ingredients)}
+        self.max_effects = max_effects
+        self.nbytes = max(1, (len(self.effects) + 7) // 8)
 
-    while queue:
-        current = queue.popleft()
-        steps += 1
+        # Per ingredient: one 256-entry table per mask byte mapping the byte's
+        # effects to their replacements, plus the mask of the static addition.
+        # Rules adding more than one effect also keep their additions in order
+        # and the mask of the effects they replace (see _add).
+        self.replace_tables = []
+        self.add_masks = []
+        self.introduce_masks = []  # every effect an ingredient can put into a state
+        self.add_bits = []
+        self.source_masks = []
+        for ingredient in self.ingredients:
+            rule = rules[ingredient]
+            targets = [1 << i for i in range(self.nbytes * 8)]
+            introduced = sources = 0
+            for old, new in rule.get("replaces", {}).items():
+                # Effects that can never be present (typos in the rules) are skipped
+                if old in self.bit:
+                    targets[self.bit[old]] = 1 << self.bit[new]
+                    introduced |= 1 << self.bit[new]
+                    sources |= 1 << self.bit[old]
 
-        if steps % 1000 == 0:
-            progress_queue.put(1000)
+            tables = []
+            for offset in range(0, self.nbytes * 8, 8):
+                table = [0] * 256
+                for value in range(1, 256):
+                    low = value & -value
+                    table[value] = table[value ^ low] | targets[offset + low.bit_length() - 1]
+                tables.append(table)
+            self.replace_tables.append(tables)
 
-        # Calculate profit
-        unique_effects = sorted(set(current["effects"]))
-        if len(current["path"]) <= max_depth:
-            base_price = base_prices.get(base_name, 0)
-            ingredient_cost = sum(ingredient_costs.get(ing, 0) for ing in current["path"])
-            total_multiplier = 1.0 + sum(effect_multipliers.get(eff, 0.0) for eff in unique_effects)
-            final_value = base_price * total_multiplier
-            profit = final_value - ingredient_cost
+            add_mask = 0
+            for eff in rule.get("adds", []):
+                add_mask |= 1 << self.bit[eff]
+            self.add_masks.append(add_mask)
+            self.introduce_masks.append(introduced | add_mask)
+            self.add_bits.append([self.bit[eff] for eff in rule.get("adds", [])])
+            self.source_masks.append(sources)
 
-            if profit > best_profit:
-                best_result = {
-                    "base": base_name,
-                    "effects": unique_effects,
-                    "path": current["path"]
-                }
-                best_profit = profit
+        self.multi_add = any(len(bits) > 1 for bits in self.add_bits)
+        self.transitions = {}
+        self.inverse = None
 
-        if len(current["path"]) >= max_depth:
-            continue
+    @classmethod
+    def from_tables(cls, effects, ingredients, max_effects, replace_tables, add_masks, introduce_masks,
+                    add_bits, source_masks):
+        """Rebuild compiled rules from saved tables (see read_compiled_rules)."""
+        compiled = cls.__new__(cls)
+        compiled.effects = effects
+        compiled.bit = {effect: i for i, effect in enumerate(effects)}
+        compiled.ingredients = ingredients
+        compiled.ingredient_index = {ingredient: i for i, ingredient in enumerate(ingredients)}
+        compiled.max_effects = max_effects
+        compiled.nbytes = max(1, (len(effects) + 7) // 8)
+        compiled.replace_tables = replace_tables
+        compiled.add_masks = add_masks
+        compiled.introduce_masks = introduce_masks
+        compiled.add_bits = add_bits
+        compiled.source_masks = source_masks
+        compiled.multi_add = any(len(bits) > 1 for bits in add_bits)
+        compiled.transitions = {}
+        compiled.inverse = None
+        return compiled
 
-        for ingredient in effect_rules:
-            new_effects = apply_ingredient(current["effects"], ingredient)
-            new_path = current["path"] + [ingredient]
-            signature = tuple(sorted(new_effects))
+    def mask_of(self, effects):
+        mask = 0
+        for eff in effects:
+            mask |= 1 << self.bit[eff]
+        return mask
 
-            if visited.get(signature, float('inf')) > len(new_path):
-                visited[signature] = len(new_path)
-                queue.append({
-                    "effects": new_effects,
-                    "path": new_path
-                })
+    def effects_of(self, mask):
+        effects = []
+        while mask:
+            low = mask & -mask
+            effects.append(self.effects[low.bit_length() - 1])
+            mask ^= low
+        return effects
 
-    progress_queue.put(steps % 1000)
-    return best_result
+    def successors(self, mask):
+        """Return the state reached from mask by each ingredient, in ingredient order."""
+        successors = self.transitions.get(mask)
+        if successors is None:
+            successors = self._expand(mask)
+            if len(self.transitions) >= self.cache_limit:
+                self.transitions.clear()
+            self.transitions[mask] = successors
+        return successors
 
-def bfs_solver_multiprocessing_profit(starting_product_choice, max_depth=8):
-    filtered_products = filter_base_products(starting_product_choice)
+    def step(self, mask, ingredient):
+        return self.successors(mask)[self.ingredient_index[ingredient]]
 
-    total = sum(len(effect_rules) ** i for i in range(1, max_depth + 1)) * len(filtered_products)
+    def transition(self, mask, index):
+        """The state one ingredient (by index) leads to, without expanding the others."""
+        successors = self.transitions.get(mask)
+        if successors is not None:
+            return successors[index]
+        new_mask = 0
+        rest = mask
+        for table in self.replace_tables[index]:
+            new_mask |= table[rest & 0xFF]
+            rest >>= 8
+        if self.multi_add:
+            return self._add(mask, new_mask, index)
+        if mask.bit_count() < self.max_effects:
+            new_mask |= self.add_masks[index]
+        return new_mask
 
-    args_list = [
-        (base, effects, max_depth, effect_rules)
-        for base, effects in filtered_products.items()
+    def _add(self, mask, new_mask, index):
+        """Ingredient index's additions to new_mask, one at a time as mix_step makes them.
+
+        mix_step counts slots on its list before de-duplicating: each addition
+        takes one if it is missing or was replaced out of mask (and is then
+        listed twice), and only while fewer than max_effects are taken.
+        """
+        taken = mask.bit_count()
+        replaced = mask & self.source_masks[index]
+        for bit in self.add_bits[index]:
+            if taken >= self.max_effects:
+                break
+            if not new_mask >> bit & 1 or replaced >> bit & 1:
+                new_mask |= 1 << bit
+                taken += 1
+        return new_mask
+
+    def _expand(self, mask):
+        chunks = []
+        for offset in range(0, self.nbytes * 8, 8):
+            chunk = (mask >> offset) & 0xFF
+            if chunk:
+                chunks.append((offset // 8, chunk))
+
+        # Same rule as apply_ingredient: the static addition needs a free slot
+        room = mask.bit_count() < self.max_effects
+        multi_add = self.multi_add
+        successors = []
+        for ingredient, (tables, add_mask) in enumerate(zip(self.replace_tables, self.add_masks)):
+            new_mask = 0
+            for index, chunk in chunks:
+                new_mask |= tables[index][chunk]
+            if multi_add:
+                new_mask = self._add(mask, new_mask, ingredient)
+            elif room:
+                new_mask |= add_mask
+            successors.append(new_mask)
+        return tuple(successors)
+
+    def multiplier_bits(self, multipliers):
+        return [multipliers.get(effect, 0.0) for effect in self.effects]
+
+    def inverse_transitions(self):
+        """Per ingredient, per effect: the mask of effects the ingredient turns into it.
+
+        An effect the ingredient leaves alone is its own preimage; the static
+        addition is not included (see add_masks).
+        """
+        if self.inverse is None:
+            self.inverse = []
+            for tables in self.replace_tables:
+                preimages = [0] * len(self.effects)
+                for bit in range(len(self.effects)):
+                    target = tables[bit // 8][1 << bit % 8]
+                    preimages[target.bit_length() - 1] |= 1 << bit
+                self.inverse.append(preimages)
+        return self.inverse
+
+def mask_multiplier(mask, bit_values):
+    # Summed in sorted effect order to match the list-based calculation exactly
+    total = 0.0
+    while mask:
+        low = mask & -mask
+        total += bit_values[low.bit_length() - 1]
+        mask ^= low
+    return 1.0 + total
+
+def ruleset_fingerprint(rules, max_effects=MAX_EFFECTS, starting_effects=()):
+    import hashlib
+
+    payload = json.dumps([rules, max_effects, sorted(starting_effects)], sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+_compiled_rules = {}
+# (id(rules), max_effects, starting effects) -> (rules, CompiledRules), so a
+# caller passing the same ruleset object again skips the fingerprint. The
+# rules object is kept to pin its id; rulesets are not edited in place.
+# Constrained queries build a fresh ruleset each, so the memo is bounded.
+_compiled_by_id = {}
+COMPILED_BY_ID_LIMIT = 64
+
+def compile_rules(rules=None, max_effects=None):
+    """Return the CompiledRules for a ruleset, compiling it once per process."""
+    if rules is None:
+        rules = effect_rules
+    if max_effects is None:
+        max_effects = MAX_EFFECTS
+    starting_effects = frozenset(eff for effects in base_products.values() for eff in effects)
+    known = _compiled_by_id.get((id(rules), max_effects, starting_effects))
+    if known is not None and known[0] is rules:
+        return known[1]
+
+    key = ruleset_fingerprint(rules, max_effects, starting_effects)
+    compiled = _compiled_rules.get(key)
+    if compiled is None:
+        path = compiled_rules_path(key)
+        compiled = read_compiled_rules(path, key)
+        if compiled is None:
+            compiled = CompiledRules(rules, max_effects, starting_effects)
+            try:
+                write_compiled_rules(compiled, path, key)
+            except OSError:
+                pass  # a read-only cache only costs the compile next time
+        compiled.fingerprint = key
+        _compiled_rules[key] = compiled
+    if len(_compiled_by_id) >= COMPILED_BY_ID_LIMIT:
+        _compiled_by_id.clear()
+    _compiled_by_id[id(rules), max_effects, starting_effects] = (rules, compiled)
+    return compiled
+
+# Compiled-rules artifact
+# The byte tables are cached next to the graphs, keyed by ruleset fingerprint,
+# so a fresh process loads them in one read instead of rebuilding them.
+_RULES_MAGIC = b"S1MPRULE"
+_RULES_VERSION = 2
+# magic, version, metadata length; JSON metadata, padded to 8 bytes, then the
+# replace tables, add masks and introduce masks as uint64 words
+_RULES_HEADER = struct.Struct("<8sII")
+
+def compiled_rules_path(key):
+    return os.path.join(CACHE_DIR, f"rules-{key[:16]}.bin")
+
+def write_compiled_rules(compiled, path, key):
+    meta = json.dumps({
+        "key": key,
+        "effects": compiled.effects,
+        "ingredients": compiled.ingredients,
+        "max_effects": compiled.max_effects,
+        "add_bits": compiled.add_bits,
+        "source_masks": compiled.source_masks,
+    }).encode("utf-8")
+    words = array('Q')
+    for tables in compiled.replace_tables:
+        for table in tables:
+            words.extend(table)
+    words.extend(compiled.add_masks)
+    words.extend(compiled.introduce_masks)
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_RULES_HEADER.pack(_RULES_MAGIC, _RULES_VERSION, len(meta)))
+        f.write(meta)
+        f.write(b"\0" * (-(_RULES_HEADER.size + len(meta)) % 8))
+        f.write(words.tobytes())
+    os.replace(tmp_path, path)
+
+def read_compiled_rules(path, key):
+    """Load an artifact written by write_compiled_rules; None if missing or stale."""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+
+    if len(data) < _RULES_HEADER.size:
+        return None
+    magic, version, meta_length = _RULES_HEADER.unpack_from(data)
+    if magic != _RULES_MAGIC or version != _RULES_VERSION:
+        return None
+    offset = _RULES_HEADER.size + meta_length
+    try:
+        meta = json.loads(data[_RULES_HEADER.size:offset])
+    except ValueError:
+        return None
+    if meta.get("key") != key:
+        return None
+
+    words = array('Q')
+    words.frombytes(data[offset + (-offset % 8):])
+    words = words.tolist()
+    count = len(meta["ingredients"])
+    nbytes = max(1, (len(meta["effects"]) + 7) // 8)
+    tables_size = count * nbytes * 256
+    if len(words) != tables_size + 2 * count:
+        return None
+    replace_tables = [
+        [words[start + 256 * i:start + 256 * (i + 1)] for i in range(nbytes)]
+        for start in range(0, tables_size, nbytes * 256)
     ]
+    return CompiledRules.from_tables(meta["effects"], meta["ingredients"], meta["max_effects"], replace_tables,
+                                     words[tables_size:tables_size + count], words[tables_size + count:],
+                                     meta["add_bits"], meta["source_masks"])
 
-    manager = Manager()
-    progress_queue = manager.Queue()
-
-    with ProcessPoolExecutor() as executor:
-        futures = [executor.submit(bfs_worker_profit, args, progress_queue) for args in args_list]
-
-        with tqdm(total=total, desc="💸 Calculating Profit...", ncols=80) as pbar:
-            result = None
-            while any(f.done() is False for f in futures):
-                try:
-                    while not progress_queue.empty():
-                        pbar.update(progress_queue.get_nowait())
-                except:
-                    pass
-                time.sleep(0.1)
-
-            while not progress_queue.empty():
-                pbar.update(progress_queue.get_nowait())
-
-            best = None
-            best_profit = float('-inf')
-            for future in futures:
-                res = future.result()
-                if res:
-                    base_name = res['base']
-                    base_price = base_prices.get(base_name, 0)
-                    cost = sum(ingredient_costs.get(i, 0) for i in res["path"])
-                    multiplier = 1.0 + sum(effect_multipliers.get(e, 0.0) for e in res["effects"])
-                    value = base_price * multiplier
-                    profit = value - cost
-
-                    if profit > best_profit:
-                        best_profit = profit
-                        best = res
-            return best
+# Reachable-state graphs
+# The states reachable from a base depend only on the ruleset, MAX_EFFECTS and
+# the base's starting effects, so they can be enumerated once ("build-graph")
+# and memory-mapped by every later query.
+CACHE_DIR = os.environ.get(
+    "MIXFINDER_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".mixcache"),
+)
+GRAPH_DEPTH = 6  # Default depth for build-graph; depth 8 is ~2.5M states per base
+NO_STATE = 0xFFFFFFFF
+NO_INGREDIENT = 0xFF
 
-# BFS worker for a single base product (standalone, must be top-level for multiprocessing)
-def bfs_worker_process(args, progress_queue):
-    base_name, base_effects, desired_effects, max_depth, effect_rules = args
+_GRAPH_MAGIC = b"S1MPGRPH"
+_GRAPH_VERSION = 2
+# magic, version, state count, max depth, ingredient count, effect count, key
+_GRAPH_HEADER = struct.Struct("<8sIIIHH64s")
 
-    visited = set()
-    queue = deque()
-    steps = 0
+class StateGraph:
+    """Every effect set reachable from one base within max_depth ingredients.
+
+    States are stored in BFS order and each state's parent is its cheapest
+    predecessor one level up, so path_to gives the cheapest of its shortest
+    recipes. ``order`` holds the state indices sorted by mask for lookups by
+    effect set. Successors of states at max_depth that fall outside the graph
+    are NO_STATE.
+
+    Goal queries use an inverted index: ``rank`` lists the states by (depth,
+    cost) and ``effect_words`` holds, per effect, a bitset over rank positions
+    of the states that have it. ANDing the bitsets of the desired effects
+    leaves exactly the states that are supersets of the query, and its lowest
+    set bit is the shortest, then cheapest, of them.
+    """
+
+    def __init__(self, key, max_depth, ingredient_count, masks, depths, via, parents, successors, order,
+                 rank, costs, effect_words):
+        self.key = key
+        self.max_depth = max_depth
+        self.ingredient_count = ingredient_count
+        self.masks = masks
+        self.depths = depths
+        self.via = via
+        self.parents = parents
+        self.successors = successors
+        self.order = order
+        self.rank = rank
+        self.costs = costs
+        self.effect_words = effect_words
+        self.effect_sets = _effect_sets(effect_words, len(masks))
+        self.all_states = (1 << len(masks)) - 1
+
+    def __len__(self):
+        return len(self.masks)
 
-    initial_state = {
+    def index_of(self, mask):
+        masks = self.masks
+        pos = bisect_left(self.order, mask, key=lambda i: masks[i])
+        if pos < len(self.order) and masks[self.order[pos]] == mask:
+            return self.order[pos]
+        return None
+
+    def successor(self, index, ingredient):
+        return self.successors[index * self.ingredient_count + ingredient]
+
+    def path_to(self, index):
+        path = []
+        while self.parents[index] != NO_STATE:
+            path.append(self.via[index])
+            index = self.parents[index]
+        path.reverse()
+        return path
+
+    def find_shortest(self, desired, max_depth=None):
+        """Return the index of the shortest, then cheapest, state containing desired, or None."""
+        if max_depth is None:
+            max_depth = self.max_depth
+        if desired >> len(self.effect_sets):
+            return None
+        matches = self.all_states
+        while desired and matches:
+            low = desired & -desired
+            matches &= self.effect_sets[low.bit_length() - 1]
+            desired ^= low
+        if not matches:
+            return None
+        index = self.rank[(matches & -matches).bit_length() - 1]
+        return index if self.depths[index] <= max_depth else None
+
+def _bitset_words(count):
+    return (count + 63) // 64
+
+def _effect_words(masks, rank, effect_count):
+    """Per-effect bitsets over rank positions, as consecutive little-endian uint64 words."""
+    words = _bitset_words(len(masks))
+    effect_words = array('Q', bytes(8 * words * effect_count))
+    for position, index in enumerate(rank):
+        mask = masks[index]
+        word, bit = divmod(position, 64)
+        while mask:
+            low = mask & -mask
+            effect_words[(low.bit_length() - 1) * words + word] |= 1 << bit
+            mask ^= low
+    return effect_words
+
+def _effect_sets(effect_words, count):
+    """Split _effect_words output into one Python int bitset per effect."""
+    words = _bitset_words(count)
+    return [int.from_bytes(effect_words[i:i + words], "little") for i in range(0, len(effect_words), words)]
+
+def state_graph_key(base_effects, rules=None):
+    import hashlib
+
+    engine = compile_rules(rules)
+    # Costs order the goal index, so a price change needs a rebuild too
+    costs = [ingredient_costs.get(ing, 0) for ing in engine.ingredients]
+    payload = json.dumps([engine.fingerprint, sorted(base_effects), costs])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def state_graph_path(base_effects, rules=None):
+    return os.path.join(CACHE_DIR, f"graph-{state_graph_key(base_effects, rules)[:16]}.bin")
+
+def build_state_graph(base_effects, max_depth=GRAPH_DEPTH, rules=None):
+    engine = compile_rules(rules)
+    if len(engine.effects) > 64:
+        raise ValueError("State graphs store effect sets as uint64; this ruleset has more than 64 effects")
+
+    start = engine.mask_of(base_effects)
+    ingredient_prices = [ingredient_costs.get(ing, 0) for ing in engine.ingredients]
+    masks = array('Q', [start])
+    depths = array('B', [0])
+    via = array('B', [NO_INGREDIENT])
+    parents = array('I', [NO_STATE])
+    costs = array('d', [0.0])
+    successors = array('I')
+    index = {start: 0}
+
+    current = 0
+    while current < len(masks):
+        depth = depths[current]
+        for ingredient, new_mask in enumerate(engine.successors(masks[current])):
+            new_cost = costs[current] + ingredient_prices[ingredient]
+            target = index.get(new_mask)
+            if target is None:
+                if depth < max_depth:
+                    target = len(masks)
+                    index[new_mask] = target
+                    masks.append(new_mask)
+                    depths.append(depth + 1)
+                    via.append(ingredient)
+                    parents.append(current)
+                    costs.append(new_cost)
+                else:
+                    target = NO_STATE
+            elif depths[target] == depth + 1 and new_cost < costs[target]:
+                # Same depth, cheaper: keep the cheapest shortest predecessor
+                via[target] = ingredient
+                parents[target] = current
+                costs[target] = new_cost
+            successors.append(target)
+        current += 1
+
+    order = array('I', sorted(range(len(masks)), key=masks.__getitem__))
+    rank = array('I', sorted(range(len(masks)), key=lambda i: (depths[i], costs[i])))
+    return StateGraph(state_graph_key(base_effects, rules), max_depth, len(engine.ingredients),
+                      masks, depths, via, parents, successors, order,
+                      rank, costs, _effect_words(masks, rank, len(engine.effects)))
+
+def write_state_graph(graph, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_GRAPH_HEADER.pack(_GRAPH_MAGIC, _GRAPH_VERSION, len(graph), graph.max_depth,
+                                   graph.ingredient_count, len(graph.effect_sets), graph.key.encode("ascii")))
+        for section in _graph_sections(graph):
+            data = bytes(section)
+            f.write(data)
+            f.write(b"\0" * (-len(data) % 8))  # keep every section 8-byte aligned
+    os.replace(tmp_path, path)
+
+def _graph_sections(graph):
+    return (graph.masks, graph.depths, graph.via, graph.parents, graph.successors, graph.order,
+            graph.rank, graph.costs, graph.effect_words)
+
+def open_state_graph(path, expected_key=None):
+    """Memory-map a graph file; returns None if it is missing or stale."""
+    try:
+        with open(path, "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (FileNotFoundError, ValueError):
+        return None
+
+    if len(data) < _GRAPH_HEADER.size:
+        return None
+    magic, version, count, max_depth, ingredient_count, effect_count, key = _GRAPH_HEADER.unpack_from(data)
+    key = key.decode("ascii")
+    if magic != _GRAPH_MAGIC or version != _GRAPH_VERSION or (expected_key and key != expected_key):
+        return None
+
+    view = memoryview(data)
+    offset = _GRAPH_HEADER.size
+    sections = []
+    for typecode, length in (('Q', count), ('B', count), ('B', count), ('I', count),
+                             ('I', count * ingredient_count), ('I', count),
+                             ('I', count), ('d', count), ('Q', effect_count * _bitset_words(count))):
+        size = length * array(typecode).itemsize
+        sections.append(view[offset:offset + size].cast(typecode))
+        offset += size + (-size % 8)
+    return StateGraph(key, max_depth, ingredient_count, *sections)
+
+_graph_cache = {}  # path -> StateGraph or None, so a warm process maps each file once
+
+def load_state_graph(base_effects, rules=None):
+    path = state_graph_path(base_effects, rules)
+    if path not in _graph_cache:
+        _graph_cache[path] = open_state_graph(path, state_graph_key(base_effects, rules))
+    return _graph_cache[path]
+
+def build_graphs(base_names=None, max_depth=GRAPH_DEPTH):
+    """Build and persist the reachable-state graph for each base product."""
+    built = set()
+    for base_name in base_names or base_products:
+        path = state_graph_path(base_products[base_name])
+        if path in built:
+            continue  # bases with the same starting effects share a graph
+        built.add(path)
+
+        start_time = time.time()
+        graph = build_state_graph(base_products[base_name], max_depth)
+        write_state_graph(graph, path)
+        print(f"🗺  {base_name}: {len(graph)} states to depth {max_depth} "
+              f"in {time.time() - start_time:.1f}s -> {path}")
+
+def graph_result(graph, index, base_name, rules=None):
+    engine = compile_rules(rules)
+    return {
         "base": base_name,
-        "effects": base_effects,
-        "path": [],
+        "effects": engine.effects_of(graph.masks[index]),
+        "path": [engine.ingredients[i] for i in graph.path_to(index)],
     }
-    queue.append(initial_state)
-    visited.add(tuple(sorted(base_effects)))
 
-    while queue:
-        current = queue.popleft()
-        steps += 1
+def graph_shortest(graph, base_name, desired_effects, max_depth):
+    """Answer a mode-1 query from a graph.
 
-        # ✅ Send periodic progress updates
-        if steps % 1000 == 0:
-            progress_queue.put(1000)
+    Returns (decided, result): decided is False when the graph is too shallow
+    to rule out a solution within max_depth.
+    """
+    engine = compile_rules()
+    if any(effect not in engine.bit for effect in desired_effects):
+        return True, None
+    index = graph.find_shortest(engine.mask_of(desired_effects), max_depth)
+    if index is not None:
+        return True, graph_result(graph, index, base_name)
+    return graph.max_depth >= max_depth, None
 
-        if all(effect in current["effects"] for effect in desired_effects):
-            progress_queue.put(steps % 1000)  # send remaining step count
-            return current
+def graph_profit_mixes(graph, base_name, max_depth, k=1, per_state=False):
+    """Same answer as profit_worker_shard from the base, walking the graph's stored edges."""
+    engine = compile_rules()
+    base_price = base_prices.get(base_name, 0)
+    costs = [ingredient_costs.get(ing, 0) for ing in engine.ingredients]
+    bit_values = engine.multiplier_bits(effect_multipliers)
+    width = graph.ingredient_count
 
-        if len(current["path"]) >= max_depth:
-            continue
+    found = profit_search(
+        {0: 0}, lambda i: graph.successors[i * width:(i + 1) * width], graph.masks.__getitem__, max_depth,
+        base_price, costs, bit_values, bound=profit_bound(engine, base_price, costs, bit_values, max_depth),
+        top=TopMixes(k, per_state),
+    )
+    return [{
+        "base": base_name,
+        "effects": engine.effects_of(graph.masks[index]),
+        "path": [engine.ingredients[i] for i in path],
+    } for _, index, _, path in found]
 
-        for ingredient in effect_rules:
-            new_effects = current["effects"].copy()
-            rule = effect_rules.get(ingredient, {"replaces": {}, "adds": []})
+# Search labels
+# The BFS, profit DP and A* keep every label they create, so a label is a row
+# in parallel arrays (about 23 bytes) rather than a tuple holding a copy of
+# its path. Rows point at their parent row and record the ingredient that led
+# to them; paths are only walked back for the answers.
+class StateTable:
+    """Array-backed labels: state, parent row, ingredient, depth and (optionally) cost per row."""
 
-            # Phase 1: batch replacements
-            to_remove = []
-            to_add = []
+    def __init__(self, costs=True):
+        self.states = array('Q')
+        self.parents = array('I')
+        self.via = array('B')
+        self.depths = array('H')
+        self.costs = array('d') if costs else None
 
-            current_set = set(new_effects)
-            for old, new in rule.get("replaces", {}).items():
-                if old in current_set and new and new not in current_set:
-                    to_remove.append(old)
-                    to_add.append(new)
+    def __len__(self):
+        return len(self.states)
 
-            for eff in to_remove:
-                new_effects.remove(eff)
-            for eff in to_add:
-                new_effects.append(eff)
+    def add(self, state, parent=NO_STATE, ingredient=NO_INGREDIENT, depth=0, cost=0.0):
+        """Append a label and return its row."""
+        try:
+            self.states.append(state)
+        except OverflowError:
+            # Rulesets with more than 64 effects keep their masks as ints
+            self.states = list(self.states)
+            self.states.append(state)
+        self.parents.append(parent)
+        self.via.append(ingredient)
+        self.depths.append(depth)
+        if self.costs is not None:
+            self.costs.append(cost)
+        return len(self.parents) - 1
 
-            # Phase 2: Add static effects
-            for eff in rule.get("adds", []):
-                if eff not in new_effects and len(new_effects) < MAX_EFFECTS:
-                    new_effects.append(eff)
-
-            new_effects = sorted(set(new_effects))
-            new_path = current["path"] + [ingredient]
-            signature = tuple(new_effects)
-
-            if signature not in visited:
-                visited.add(signature)
-                queue.append({
-                    "base": base_name,
-                    "effects": new_effects,
-                    "path": new_path
-                })
+    def relabel(self, row, parent, ingredient, cost):
+        """Point a row at a cheaper parent found on the same level."""
+        self.parents[row] = parent
+        self.via[row] = ingredient
+        self.costs[row] = cost
 
-    progress_queue.put(steps % 1000)  # Final few steps
-    return None
+    def path_to(self, row):
+        """(root row, ingredient indices from the root's state to the row's)."""
+        path = []
+        while self.parents[row] != NO_STATE:
+            path.append(self.via[row])
+            row = self.parents[row]
+        path.reverse()
+        return row, path
 
-# Multi-process BFS dispatcher
-def bfs_solver_multiprocessing(desired_effects, starting_product_choice, max_depth=16):
-    total_per_base = sum(len(effect_rules) ** i for i in range(1, max_depth + 1))
+    @property
+    def nbytes(self):
+        arrays = (self.states, self.parents, self.via, self.depths, self.costs)
+        return sum(sys.getsizeof(a) for a in arrays if a is not None)
+
+# Search constraints
+# Stock and customer limits on a query, applied inside the searches rather than
+# to their answers. Allowed and excluded ingredients select a sub-ruleset, so
+# every engine only ever tries the usable ingredients and each of them
+# branches less. Forbidden effects and the cost budget are checked as labels
+# are generated. A label over budget, or holding an effect forbidden at every
+# step, is never queued. A state holding an effect forbidden only in the
+# final mix is still expanded but is never an answer. The numpy
+# and external engines do not do those checks, so queries that need them run
+# on the python searches, and a budget also keeps mode-1 queries off the
+# meet-in-the-middle search.
+class MixConstraints:
+    """Usable ingredients, forbidden effects, a cost budget and a length cap for one query."""
+
+    def __init__(self, allowed=None, excluded=(), forbidden=(), anywhere=False, budget=None, max_ingredients=None):
+        self.ingredients = [ing for ing in effect_rules
+                            if (allowed is None or ing in allowed) and ing not in excluded]
+        self.forbidden = sorted(set(forbidden))
+        self.anywhere = anywhere
+        self.budget = float('inf') if budget is None else budget
+        self.max_ingredients = max_ingredients
+
+    @classmethod
+    def from_json(cls, spec):
+        """Constraints from a query's "constraints" object; raises ValueError if it is malformed."""
+        if not isinstance(spec, dict):
+            raise ValueError("constraints must be an object")
+        unknown = set(spec) - {"ingredients", "exclude", "forbid", "forbid_anywhere", "budget", "max_ingredients"}
+        if unknown:
+            raise ValueError(f"Unknown constraint(s): {', '.join(sorted(unknown))}")
+
+        def names(field, known, kind):
+            value = spec.get(field, [])
+            if not isinstance(value, list) or not all(isinstance(name, str) for name in value):
+                raise ValueError(f"{field} must be a list of {kind} names")
+            unknown = [name for name in value if name not in known]
+            if unknown:
+                raise ValueError(f"Unknown {kind}(s) in {field}: {', '.join(unknown)}")
+            return value
+
+        def number(field, kind):
+            value = spec.get(field)
+            if value is not None and (isinstance(value, bool) or not isinstance(value, kind) or value < 0):
+                raise ValueError(f"{field} must be a non-negative {'integer' if kind is int else 'number'}")
+            return value
+
+        anywhere = spec.get("forbid_anywhere", False)
+        if not isinstance(anywhere, bool):
+            raise ValueError("forbid_anywhere must be true or false")
+        return cls(
+            allowed=names("ingredients", effect_rules, "ingredient") if "ingredients" in spec else None,
+            excluded=names("exclude", effect_rules, "ingredient"),
+            forbidden=names("forbid", compile_rules().bit, "effect"),
+            anywhere=anywhere,
+            budget=number("budget", (int, float)),
+            max_ingredients=number("max_ingredients", int),
+        )
+
+    def rules(self):
+        """The ruleset of the usable ingredients (the shipped one if all are usable)."""
+        if len(self.ingredients) == len(effect_rules):
+            return effect_rules
+        return {ing: effect_rules[ing] for ing in self.ingredients}
+
+    def depth(self, max_depth):
+        return max_depth if self.max_ingredients is None else min(max_depth, self.max_ingredients)
+
+    @property
+    def filtering(self):
+        """Whether searches have to check labels, for forbidden effects or a budget."""
+        return bool(self.forbidden) or self.budget != float('inf')
+
+    @property
+    def narrowed(self):
+        """Whether anything but the length cap applies, which rules out the prebuilt graphs."""
+        return self.filtering or len(self.ingredients) < len(effect_rules)
+
+    def limits(self, rules):
+        """Keyword arguments for the searches: ``forbidden`` and ``blocked`` masks and the ``budget``.
+
+        Effects in ``forbidden`` may not be in an answer, those in ``blocked``
+        not in any label.
+        """
+        forbidden = rules.mask_of(effect for effect in self.forbidden if effect in rules.bit)
+        return {"forbidden": forbidden, "blocked": forbidden if self.anywhere else 0, "budget": self.budget}
+
+def filter_base_products(starting_product_choice):
+    # Headless callers may also pick bases by name
+    if isinstance(starting_product_choice, str):
+        starting_product_choice = [starting_product_choice]
+    if isinstance(starting_product_choice, (list, tuple)):
+        unknown = [name for name in starting_product_choice if name not in base_products]
+        if unknown:
+            raise ValueError(f"Unknown base product(s): {', '.join(unknown)}")
+        return {name: base_products[name] for name in starting_product_choice}
 
-    # Filter base products
     if starting_product_choice == 0:
-        filtered_products = base_products
+        return base_products
     elif starting_product_choice == 1:
-        filtered_products = {k: v for k, v in base_products.items() if k in ['OG Kush', 'Granddaddy Purple', 'Green Crack', 'Sour Diesel']}
+        return {k: v for k, v in base_products.items() if k in ['OG Kush', 'Granddaddy Purple', 'Green Crack', 'Sour Diesel']}
     elif starting_product_choice == 2:
-        filtered_products = {'Meth': []}
+        return {'Meth': []}
     elif starting_product_choice == 3:
-        filtered_products = {'Cocaine': []}
+        return {'Cocaine': []}
     elif starting_product_choice == 4:
-        filtered_products = {'OG Kush': base_products.get('OG Kush', [])}
+        return {'OG Kush': base_products.get('OG Kush', [])}
     elif starting_product_choice == 5:
-        filtered_products = {'Granddaddy Purple': base_products.get('Granddaddy Purple', [])}
+        return {'Granddaddy Purple': base_products.get('Granddaddy Purple', [])}
     elif starting_product_choice == 6:
-        filtered_products = {'Green Crack': base_products.get('Green Crack', [])}
+        return {'Green Crack': base_products.get('Green Crack', [])}
     else:
-        filtered_products = base_products  # fallback
+        return base_products
 
-    total = total_per_base * len(filtered_products)
+BOUND_SLACK = 1e-6  # added to profit_bound, far above float rounding and far below a cent
 
-    args_list = [
-        (base, effects, desired_effects, max_depth, effect_rules)
-        for base, effects in filtered_products.items()
-    ]
+def profit_bound(rules, base_price, costs, bit_values, max_depth):
+    """Precompute an upper bound on the profit of any extension of a state.
 
-    manager = Manager()
-    progress_queue = manager.Queue()
-
-    with ProcessPoolExecutor() as executor:
-        futures = [
-            executor.submit(bfs_worker_process, args, progress_queue)
-            for args in args_list
-        ]
-
-        with tqdm(
-            total=total,
-            desc="🔬 Finding your mix...",
-            bar_format="{l_bar}{bar}| {percentage:3.0f}% | {rate_fmt}",
-            ncols=80,
-        ) as pbar:
-            result = None
-            while any(f.done() is False for f in futures):
-                try:
-                    while not progress_queue.empty():
-                        pbar.update(progress_queue.get_nowait())
-                except:
-                    pass
-                time.sleep(0.1)  # Slight delay to reduce CPU usage
-
-            # Final progress update
-            while not progress_queue.empty():
-                pbar.update(progress_queue.get_nowait())
-
-            for future in futures:
-                res = future.result()
-                if res:
-                    executor.shutdown(wait=False, cancel_futures=True)
-                    return res
+    Relaxation: every effect in the final set descends from one "token", either
+    an effect already present or an ingredient's addition, and follows its own
+    replacement chain. best[r][b] is the best multiplier a token of effect b
+    can reach in at most r steps; an addition made t steps from now can
+    evolve for the remaining r - t.
 
-    return None
+    Only the steps after the first are relaxed that way. The first one is
+    taken by every token alike: ingredient i moves each token to its
+    replacement, adds i's effect and costs what i costs. first[r][j][byte]
+    holds, per ingredient, base_price times the best the tokens in byte j of
+    a mask reach after i and r - 1 free steps, so scoring a state is a few
+    table lookups and a max over the ingredients. Sharing that step is what
+    makes the bound prune; with every token free to pick its own ingredient
+    at every step, most labels two steps from the end survived it.
 
-def prompt_starting_product():
-    print("\n🌱 Which starting product would you like?")
-    options = [
-        "Anything",
-        "Weed only",
-        "Meth only",
-        "Cocaine only",
-        "OG Kush",
-        "Granddaddy Purple",
-        "Green Crack"
-    ]
+    One step from the end the bound is often exact, so it is padded by
+    BOUND_SLACK: a label whose best extension ties the incumbent (which the
+    beam may have found without the search having ranked it yet) must not
+    be pruned because of float rounding.
 
-    for i, name in enumerate(options):
-        print(f"{i}: {name}")
-    
-    while True:
-        choice = input("\nPick an option (number): ").strip()
-        if choice.isdigit() and 0 <= int(choice) < len(options):
-            return int(choice)
-        print("❌ Invalid choice. Try again.")
+    What this buys is the last two levels: with two steps left nearly every
+    label is cut, which puts depth 8 at 4-11s for Meth and OG Kush and depth
+    9 at 20-60s. With three or more left the relaxation is far too loose to cut
+    much (Meth at depth 9: a mean bound of 367 against a true best extension
+    of 245 and an incumbent of 304), so every level adds about 4.5x and
+    depth 10 takes 100s+ per base, 12 well over an hour. Capping the tokens
+    at MAX_EFFECTS, sharing their later steps pairwise and charging the later
+    additions' costs each closed under a fifth of that gap and cost more to
+    evaluate than they saved; depth 10-12 needs a different search, not a
+    tighter version of this bound.
 
-def print_banner():
-    banner = pyfiglet.figlet_format("S1MP", font="doom")
-    print(banner)
-    print("🔬 Schedule 1 Mix Pathfinder\n")
+    Returns bound(mask, cost, remaining) -> best possible profit of extending.
+    """
+    effect_count = len(rules.effects)
+    targets = []
+    for tables in rules.replace_tables:
+        row = []
+        for bit in range(effect_count):
+            row.append(tables[bit // 8][1 << (bit % 8)].bit_length() - 1)
+        targets.append(row)
+    # An ingredient adding several effects starts a token for each
+    additions = [[bit for bit in range(effect_count) if add_mask >> bit & 1] for add_mask in rules.add_masks]
 
-def prompt_user_for_effects():
-    import os
+    best = [list(bit_values)]
+    for _ in range(max_depth):
+        previous = best[-1]
+        best.append([
+            max(previous[bit], max(previous[row[bit]] for row in targets))
+            for bit in range(effect_count)
+        ])
 
-    def clear_screen():
-        os.system('cls' if "nt" in os.name else 'clear')
-    
-    # Step 1: Build full list of all possible effects
-    all_effects = set()
-    for rule in effect_rules.values():
-        all_effects.update(effect for effect in rule.get("adds", []) if effect)
-        all_effects.update(effect for effect in rule.get("replaces", {}).values() if effect)
+    count = len(targets)
+    first = [None]  # per remaining: per mask byte, a vector over the first ingredient for each byte value
+    constants = [None]  # per remaining: the part of each first ingredient's score the mask does not change
+    for remaining in range(1, max_depth + 1):
+        row = best[remaining - 1]
+        # Additions after the first step, each the best any ingredient can make
+        later = sum(max(sum(best[remaining - t][bit] for bit in bits) for bits in additions)
+                    for t in range(2, remaining + 1))
+        constants.append([
+            base_price * (1.0 + later + sum(row[bit] for bit in bits)) - costs[i]
+            for i, bits in enumerate(additions)
+        ])
+        tables = []
+        for offset in range(0, rules.nbytes * 8, 8):
+            columns = [[base_price * row[targets[i][bit]] for i in range(count)] if bit < effect_count else
+                       [0.0] * count for bit in range(offset, offset + 8)]
+            table = [[0.0] * count]
+            for value in range(1, 256):
+                low = value & -value
+                table.append([a + b for a, b in zip(table[value ^ low], columns[low.bit_length() - 1])])
+            tables.append(table)
+        first.append(tables)
 
-    all_effects = sorted(all_effects)
-    selected = []
+    nbytes = rules.nbytes
 
-    print("\n🧪 Schedule 1 Mix Selector")
-    print("Pick effects you want your product to have!\n")
+    def bound(mask, cost, remaining):
+        if not remaining:
+            return float('-inf')  # nothing can be added
+        tables = first[remaining]
+        vectors = [tables[index][byte] for index, byte in enumerate(mask.to_bytes(nbytes, "little")) if byte]
+        return max(map(sum, zip(constants[remaining], *vectors))) - cost + BOUND_SLACK
 
-    while True:
-        clear_screen()
-        print_banner()
-        remaining = [e for e in all_effects if e not in selected]
+    return bound
 
-        if not remaining:
-            print("🎉 You've selected all known effects! Let's mix!\n")
+def beam_incumbent(starts, expand, state_mask, max_depth, base_price, costs, bit_values, width=256, count=1,
+                   forbidden=0, blocked=0, budget=float('inf')):
+    """Quick lower bound for branch-and-bound from a narrow beam search.
+
+    Returns the count-th best profit among the distinct states the beam sees,
+    which the exact search can only match or beat (-inf if it saw fewer).
+    The beam keeps to the same ``forbidden``, ``blocked`` and ``budget``
+    limits as profit_search, so it only counts states the search could return.
+    """
+    beam = [(base_price * mask_multiplier(state_mask(state), bit_values) - cost, state, cost)
+            for state, cost in starts.items()]
+    seen = {}  # state -> best profit
+    for depth in range(max_depth + 1):
+        for profit, state, _ in beam:
+            if profit > seen.get(state, float('-inf')) and not state_mask(state) & forbidden:
+                seen[state] = profit
+        if depth == max_depth:
             break
+        candidates = {}
+        for _, state, cost in beam:
+            for index, new_state in enumerate(expand(state)):
+                new_cost = cost + costs[index]
+                if new_cost > budget or blocked and state_mask(new_state) & blocked:
+                    continue
+                if new_cost < candidates.get(new_state, (None, float('inf')))[1]:
+                    profit = base_price * mask_multiplier(state_mask(new_state), bit_values) - new_cost
+                    candidates[new_state] = (profit, new_cost)
+        beam = sorted(((profit, state, cost) for state, (profit, cost) in candidates.items()),
+                      key=lambda item: item[0], reverse=True)[:width]
+    if len(seen) < count:
+        return float('-inf')
+    return heapq.nlargest(count, seen.values())[-1]
 
-        print("Available effects:")
-        for idx, effect in enumerate(remaining):
-            mult = effect_multipliers.get(effect, 0.0)
-            print(f"{idx}: {effect} (+{mult:.2f}x)")
-        print("\nType a number, name (or part of one), or 'm' to mix.\n")
+class TopMixes:
+    """Bounded min-heap of the k most profitable labels, at most one per key.
 
-        print(f"Current effects: {selected}")
-        total_multiplier = 1.0 + sum(effect_multipliers.get(e, 0.0) for e in selected)
-        print(f"\n🔢 Total effect multiplier: x{total_multiplier:.2f}")
-        choice = input("Pick an effect: ").strip().lower()
+    Keyed by state when per_state is set (the best recipe for each distinct
+    effect set), otherwise by (state, depth), i.e. every recipe the profit DP
+    keeps. A better label for a key replaces its entry instead of taking a
+    second slot.
+    """
 
-        if choice in ("m", "mix"):
-            break
+    def __init__(self, k=1, per_state=False):
+        self.k = k
+        self.per_state = per_state
+        self.heap = []  # (profit, -depth, state, ref), worst first
+        self.entries = {}
 
-        # Match by number
-        if choice.isdigit():
-            idx = int(choice)
-            if 0 <= idx < len(remaining):
-                selected_effect = remaining[idx]
-                selected.append(selected_effect)
-                print(f"✅ Added: {selected_effect}\n")
-                continue
-            else:
-                print("❌ That number is out of range.\n")
-                continue
+    def key(self, state, depth):
+        return state if self.per_state else (state, depth)
 
-        # Match by partial text
-        matches = [e for e in remaining if choice in e.lower()]
-        if len(matches) == 1:
-            selected.append(matches[0])
-            print(f"✅ Added: {matches[0]}\n")
-            if len(selected) >= 8:
-                print("Maximum effects reached. Starting to mix...")
-                break
-        elif len(matches) > 1:
-            print("⚠️ Multiple matches found:")
-            for e in matches:
-                print(f" - {e}")
-            print("Please be more specific.\n")
-        else:
-            print("❌ No match found. Try again.\n")
+    def threshold(self):
+        """Profit a new label has to beat to get in."""
+        return self.heap[0][0] if len(self.heap) >= self.k else float('-inf')
 
-    return selected
+    def offer(self, profit, state, depth, ref=None):
+        """Rank a label; returns True if it is now in the top k."""
+        if len(self.heap) >= self.k and profit <= self.heap[0][0]:
+            return False
+        key = self.key(state, depth)
+        old = self.entries.get(key)
+        if old is not None:
+            if old[0] >= profit:
+                return False
+            self.heap.remove(old)
+            heapq.heapify(self.heap)
+        item = (profit, -depth, state, ref)
+        self.entries[key] = item
+        heapq.heappush(self.heap, item)
+        if len(self.heap) > self.k:
+            _, evicted_depth, evicted_state, _ = heapq.heappop(self.heap)
+            del self.entries[self.key(evicted_state, -evicted_depth)]
+        return True
 
-def print_debug_steps(solution, show_debug=True):
-    if not show_debug:
-        return
+    def ranked(self):
+        """(profit, state, depth, ref) for each entry, best first and shallower first on ties."""
+        return [(profit, state, -depth, ref) for profit, depth, state, ref in sorted(self.heap, reverse=True)]
 
-    print("\n🔍 Debugging Mix Path...\n")
-    print(f"Start with: {solution['base']}")
-    effects = base_products[solution['base']].copy()
+def profit_search(starts, expand, state_mask, max_depth, base_price, costs, bit_values,
+                  progress=None, bound=None, top=None, cancelled=None, telemetry=None,
+                  forbidden=0, blocked=0, budget=float('inf'), reached=None):
+    """Exact profit maximisation as a DP over (state, depth).
 
-    for i, ingredient in enumerate(solution["path"], 1):
-        rule = effect_rules.get(ingredient, {"replaces": {}, "adds": []})
-        replaces = rule.get("replaces", {})
-        adds = rule.get("adds", [])
-
-        original_effects = list(effects)
-        replacements = {}
-        removed_effects = set()
-
-        for old in original_effects:
-            if old in replaces:
-                replacements[old] = replaces[old]
-                removed_effects.add(old)
-
-        updated_effects = []
-        replaced_log = []
-        for eff in original_effects:
-            if eff in replacements:
-                new_eff = replacements[eff]
-                updated_effects.append(new_eff)
-                replaced_log.append((eff, new_eff))
-            else:
-                updated_effects.append(eff)
+    Levels are built one ingredient at a time, carrying cost incrementally. A
+    state reached at depth d for cost c is dominated by any earlier label for
+    the same state at depth <= d with cost <= c, because that label can do
+    everything this one can with as many ingredients to spare, so only the
+    cheapest label per state and depth survives. ``expand`` maps a state to
+    its successors in ingredient order and ``state_mask`` maps it to its
+    effect mask, which lets the same DP run on raw masks or graph indices.
+    ``starts`` maps each start state (all at the same depth) to its cost.
 
-        added_log = []
-        for eff in adds:
-            if eff not in updated_effects or eff in removed_effects:
-                if len(updated_effects) < MAX_EFFECTS:
-                    updated_effects.append(eff)
-                    added_log.append(eff)
+    Surviving labels are ranked in ``top``, a TopMixes (by default just the
+    best one). With a ``bound`` from profit_bound, labels whose best possible
+    extension cannot beat the k-th best so far (seeded by beam_incumbent)
+    are not expanded. ``progress`` receives expanded labels against labels
+    queued for expansion, and the search stops early once ``cancelled()``.
+    ``telemetry`` (a SearchTelemetry) records each level. Labels are rows of
+    a StateTable, which is also what ``top`` holds as refs.
 
-        print(f"\nStep {i}/{len(solution['path'])}:")
-        print(f"Add: {ingredient}")
-        print("Effects replaced:")
-        if replaced_log:
-            for old, new in replaced_log:
-                print(f" - {old} → {new}")
-        else:
-            print(" (none)")
-        print("Effects gained:")
-        if added_log:
-            for eff in added_log:
-                print(f" + {eff}")
+    States holding ``forbidden`` effects are expanded but never ranked, and
+    labels holding ``blocked`` effects or costing over ``budget`` are never
+    made (see MixConstraints). ``reached`` maps states already reached at or
+    above the start depth (by a parent that split the search) to their
+    cheapest cost there, so labels that split would dominate are dropped too.
+
+    Returns the ranked labels, best first, as (profit, state, start state,
+    path from it as ingredient indices).
+    """
+    if top is None:
+        top = TopMixes()
+    best_cost = {**(reached or {}), **starts}  # cheapest cost at any depth so far
+    table = StateTable()  # every label kept, refs in top are its rows
+    frontier = {state: table.add(state, cost=cost) for state, cost in starts.items()}  # state -> row
+    for state, cost in starts.items():
+        if not state_mask(state) & forbidden:
+            top.offer(base_price * mask_multiplier(state_mask(state), bit_values) - cost, state, 0, frontier[state])
+    incumbent = top.threshold()
+    if bound is not None:
+        incumbent = max(incumbent, beam_incumbent(starts, expand, state_mask, max_depth, base_price, costs,
+                                                  bit_values, count=top.k, forbidden=forbidden, blocked=blocked,
+                                                  budget=budget))
+    if progress is None:
+        progress = TaskProgress()
+    progress.update(discovered=len(frontier))
+    label_costs = table.costs
+    steps = 0
+
+    for depth in range(1, max_depth + 1):
+        next_frontier = {}
+        threshold = top.threshold()
+        if depth == max_depth:
+            # Nothing is expanded past the last level, so its labels are only
+            # scored, and only those that make it into top get a row
+            scored = {}
+            for state, row in frontier.items():
+                steps += 1
+                if steps % 1000 == 0:
+                    progress.update(done=1000)
+                    if cancelled is not None and cancelled():
+                        break
+
+                cost = label_costs[row]
+                for index, new_state in enumerate(expand(state)):
+                    new_cost = cost + costs[index]
+                    if new_cost < best_cost.get(new_state, float('inf')) and new_cost <= budget:
+                        new_mask = state_mask(new_state)
+                        profit = base_price * mask_multiplier(new_mask, bit_values) - new_cost
+                        if profit <= threshold or new_mask & (forbidden | blocked):
+                            continue
+                        label = scored.get(new_state)
+                        if top.offer(profit, new_state, depth, len(table) if label is None else label):
+                            if label is None:
+                                scored[new_state] = table.add(new_state, row, index, depth, new_cost)
+                            else:
+                                table.relabel(label, row, index, new_cost)
+                            threshold = top.threshold()
+            if telemetry is not None:
+                telemetry.record(depth - 1, len(frontier), len(frontier) * len(costs), len(scored), best_cost,
+                                 labels_bytes=table.nbytes)
+            break
+
+        for state, row in frontier.items():
+            steps += 1
+            if steps % 1000 == 0:
+                progress.update(done=1000)
+
+            cost = label_costs[row]
+            for index, new_state in enumerate(expand(state)):
+                new_cost = cost + costs[index]
+                if new_cost < best_cost.get(new_state, float('inf')):
+                    if new_cost > budget or blocked and state_mask(new_state) & blocked:
+                        continue
+                    best_cost[new_state] = new_cost
+                    if new_state in next_frontier:
+                        table.relabel(next_frontier[new_state], row, index, new_cost)
+                    else:
+                        next_frontier[new_state] = table.add(new_state, row, index, depth, new_cost)
+
+        for state, row in next_frontier.items():
+            mask = state_mask(state)
+            profit = base_price * mask_multiplier(mask, bit_values) - label_costs[row]
+            if profit > threshold and not mask & forbidden and top.offer(profit, state, depth, row):
+                threshold = top.threshold()
+        incumbent = max(incumbent, threshold)
+
+        expanded = frontier
+        if bound is not None:
+            remaining = max_depth - depth
+            frontier = {
+                state: row for state, row in next_frontier.items()
+                if bound(state_mask(state), label_costs[row], remaining) > incumbent
+            }
         else:
-            print(" (none)")
-        print("All effects after adding:")
-        print(f" → {', '.join(sorted(set(updated_effects)))}")
+            frontier = next_frontier
+        if telemetry is not None:
+            telemetry.record(depth - 1, len(expanded), len(expanded) * len(costs), len(next_frontier), best_cost,
+                             pruned=len(next_frontier) - len(frontier), labels_bytes=table.nbytes)
+        progress.update(discovered=len(frontier))
+        if not frontier or (cancelled is not None and cancelled()):
+            break
 
-        effects = sorted(set(updated_effects))
+    progress.update(done=steps % 1000)
 
-if __name__ == "__main__":
-    try:
-        from multiprocessing import freeze_support
-        freeze_support()
+    mixes = []
+    for profit, state, _, row in top.ranked():
+        root, path = table.path_to(row)
+        mixes.append((profit, state, table.states[root], path))
+    return mixes
 
-        print_banner()
-        print("1. Find a mix with desired effects")
-        print("2. Find the most profitable mix\n")
+def mix_profit(mix):
+    """Profit of a result dict, computed from its effects and path."""
+    cost = sum(ingredient_costs.get(i, 0) for i in mix["path"])
+    multiplier = 1.0 + sum(effect_multipliers.get(e, 0.0) for e in mix["effects"])
+    return base_prices.get(mix["base"], 0) * multiplier - cost
 
-        while True:
-            mode = input("Choose mode (1 or 2): ").strip()
-            if mode in ("1", "2"):
-                break
-            print("❌ Invalid choice. Please type 1 or 2.")
+def bfs_worker_profit(args, progress=None):
+    base_name, base_effects, max_depth, effect_rules = args
+    start = compile_rules(effect_rules).mask_of(base_effects)
+    return profit_worker_shard(("python", base_name, [(start, 0, [])], max_depth, effect_rules, 1, False, None, {}),
+                               progress)[0]
 
-        starting_choice = prompt_starting_product()
+def profit_worker_shard(args, progress=None, telemetry=None):
+    """Top-k profit search from one shard: start labels (mask, cost, path) sharing a depth.
 
-        if mode == "1":
-            desired = prompt_user_for_effects()
-            solution = bfs_solver_multiprocessing(desired, starting_choice)
+    Returns the shard's best k mixes (one per effect set if per_state), best
+    first. ``effect_rules`` is already
+    narrowed to the usable ingredients; the rest of the MixConstraints (or
+    None) is applied here, on the python engine. ``reached`` maps the states
+    the parent reached down to the split depth to their cheapest cost, so
+    the shard drops the labels the unsplit DP would.
+    """
+    engine_name, base_name, starts, max_depth, effect_rules, k, per_state, constraints, reached = args
+    rules = compile_rules(effect_rules)
+    base_price = base_prices.get(base_name, 0)
+    costs = [ingredient_costs.get(ing, 0) for ing in rules.ingredients]
+    bit_values = rules.multiplier_bits(effect_multipliers)
+    prefixes = {mask: path for mask, _, path in starts}
+    remaining = max_depth - len(starts[0][2])
+    progress = progress or TaskProgress.for_worker()
+    top = TopMixes(k, per_state)
+    if telemetry is not None:
+        telemetry.depth_offset = len(starts[0][2])
 
-            if solution:
-                print("✅ Solution Found!")
-                print(f"Start with: {solution['base']}")
-                print(f"Ingredients: {' -> '.join(solution['path'])}")
-                print(f"Final Effects: {', '.join(solution['effects'])}")
-                
-                # Value/Profit Calculation
-                base_name = solution['base']
-                base_price = base_prices.get(base_name, 0)
-                ingredient_cost = sum(ingredient_costs.get(ing, 0) for ing in solution["path"])
-                total_multiplier = 1.0 + sum(effect_multipliers.get(eff, 0.0) for eff in solution["effects"])
-                final_value = base_price * total_multiplier
-                profit = final_value - ingredient_cost
-
-                print("\n💸 Final Financial Summary:")
-                print(f"🧪 Base Product: {base_name} (Recommended price: ${base_price})")
-                print(f"🧾 Ingredients Used: {', '.join(solution['path'])}")
-                print(f"💰 Ingredient Cost: ${ingredient_cost:.2f}")
-                print(f"📈 Total Multiplier: x{total_multiplier:.2f}")
-                print(f"🏷 Final Product Value: ${final_value:.2f}")
-                print(f"📊 Profit: ${profit:.2f} per baggie")
-
-                print_debug_steps(solution, show_debug=True)
-            else:
-                print("❌ No valid combination found within depth limit.")
-        
-        elif mode == "2":
-            max_ingredients = 8
-            base_names = list(base_products.keys())
-            base_name = base_names[starting_choice] if starting_choice < len(base_names) else "OG Kush"
-            solution = bfs_solver_multiprocessing_profit(base_name, max_depth=max_ingredients)
+    limits = constraints.limits(rules) if constraints is not None and constraints.filtering else {}
+    if engine_name == "numpy" and not limits:
+        found = numpy_profit_search(
+            rules, {mask: cost for mask, cost, _ in starts}, remaining, base_price, costs, bit_values, progress, top,
+            SharedBound.for_worker().cancelled, telemetry, reached,
+        )
+    else:
+        found = profit_search(
+            {mask: cost for mask, cost, _ in starts}, rules.successors, int, remaining, base_price, costs,
+            bit_values, progress, bound=profit_bound(rules, base_price, costs, bit_values, remaining), top=top,
+            cancelled=SharedBound.for_worker().cancelled, telemetry=telemetry, reached=reached, **limits,
+        )
+    mixes = [{
+        "base": base_name,
+        "effects": rules.effects_of(mask),
+        "path": [rules.ingredients[i] for i in prefixes[origin] + path],
+    } for _, mask, origin, path in found]
+    return mixes
 
-            if solution:
-                print("💸 Best Profit Mix Found!")
-                print(f"Start with: {solution['base']}")
-                print(f"Ingredients: {' -> '.join(solution['path'])}")
-                print(f"Final Effects: {', '.join(solution['effects'])}")
-
-                base_price = base_prices.get(solution['base'], 0)
-                ingredient_cost = sum(ingredient_costs.get(ing, 0) for ing in solution["path"])
-                total_multiplier = 1.0 + sum(effect_multipliers.get(eff, 0.0) for eff in solution["effects"])
-                final_value = base_price * total_multiplier
-                profit = final_value - ingredient_cost
-
-                print("\n💸 Final Financial Summary:")
-                print(f"🧪 Base Product: {solution['base']} (Recommended price: ${base_price})")
-                print(f"🧾 Ingredients Used: {', '.join(solution['path'])}")
-                print(f"💰 Ingredient Cost: ${ingredient_cost:.2f}")
-                print(f"📈 Total Multiplier: x{total_multiplier:.2f}")
-                print(f"🏷 Final Product Value: ${final_value:.2f}")
-                print(f"📊 Profit: ${profit:.2f}")
-
-                print_debug_steps(solution, show_debug=True)
-            else:
-                print("❌ No profitable mix found.")
-    
+def bfs_solver_multiprocessing_profit(starting_product_choice, max_depth=8, engine=SEARCH_ENGINE, pool=None,
+                                     telemetry=None, constraints=None):
+    return next(iter_profit_mixes(starting_product_choice, 1, max_depth, engine=engine, pool=pool,
+                                  telemetry=telemetry, constraints=constraints), None)
+
+def iter_profit_mixes(starting_product_choice, k=20, max_depth=8, per_effect_set=False, engine=SEARCH_ENGINE,
+                      pool=None, telemetry=None, constraints=None):
+    """Yield the k most profitable mixes across the chosen bases, best first.
+
+    Every shard keeps its own top k and the parent merges each shard's list
+    into the running top k as it arrives. Before dispatch the parent bounds
+    the best profit each shard could add (profit_bound over its start
+    labels), so a merged mix is yielded as soon as no running shard could
+    still beat it, and shards that cannot reach the top k are never run.
+    With per_effect_set only the best recipe for each final effect set counts.
+
+    Shards start from the parent's cheapest costs down to the split depth,
+    but a state can still be reached more cheaply in another shard's
+    subtree, so merging drops the labels the unsplit DP would not keep. A
+    shard that lost labels that way may have left out mixes that belong in
+    the top k; it is run again for twice as many once nothing else can be
+    settled.
+    Only mixes meeting ``constraints`` (a MixConstraints) are searched for.
+    """
+    start_time = time.time()
+    filtered_products = filter_base_products(starting_product_choice)
+    constraints = constraints or MixConstraints()
+    max_depth = constraints.depth(max_depth)
+    task_rules = constraints.rules()
+    rules = compile_rules(task_rules)
+    costs = [ingredient_costs.get(ing, 0) for ing in rules.ingredients]
+    bit_values = rules.multiplier_bits(effect_multipliers)
+    limits = constraints.limits(rules)
+
+    def rank(mixes):
+        items = []
+        for mix in mixes:
+            key = (mix["base"], tuple(mix["effects"]))
+            items.append((mix_profit(mix), key if per_effect_set else key + (len(mix["path"]),), mix))
+        items.sort(key=lambda item: -item[0])
+        return items
+
+    # Bases with a prebuilt graph at least max_depth deep are answered from it;
+    # the rest are split into shards, with the levels above the split scored here.
+    known = []
+    shards = []  # (best profit the shard could add, task)
+    for base, effects in filtered_products.items():
+        graph = None if constraints.narrowed else load_state_graph(effects)
+        if graph is not None and graph.max_depth >= max_depth:
+            known.extend(graph_profit_mixes(graph, base, max_depth, k, per_effect_set))
+            continue
+
+        shallow, frontier = plan_shards(rules, effects, max_depth, shard_count(), costs, limits["blocked"],
+                                        limits["budget"])
+        base_price = base_prices.get(base, 0)
+        known.extend({
+            "base": base,
+            "effects": rules.effects_of(mask),
+            "path": [rules.ingredients[i] for i in path],
+        } for mask, _, path in heapq.nlargest(
+            k, (label for label in shallow + frontier if not label[0] & limits["forbidden"]),
+            key=lambda label: base_price * mask_multiplier(label[0], bit_values) - label[1]))
+
+        remaining = max_depth - len(frontier[0][2]) if frontier else 0
+        if remaining:
+            bound = profit_bound(rules, base_price, costs, bit_values, remaining)
+            reached = {mask: cost for mask, cost, _ in shallow + frontier}  # later labels are cheaper
+            for shard in split_shards(frontier, shard_count()):
+                shards.append((max(bound(mask, cost, remaining) for mask, cost, _ in shard),
+                               (engine, base, shard, max_depth, task_rules, k, per_effect_set, constraints,
+                                reached)))
+
+    def undominated(items):
+        # Per state, a label survives only if it is cheaper than every label
+        # at a smaller depth and the cheapest at its own, as in profit_search
+        best = {}
+        kept = []
+        for item in sorted(items, key=lambda item: (item[1][:2], 0 if per_effect_set else len(item[2]["path"]),
+                                                    -item[0])):
+            if item[0] > best.get(item[1][:2], float('-inf')):
+                best[item[1][:2]] = item[0]
+                kept.append(item)
+        kept.sort(key=lambda item: -item[0])
+        return kept
+
+    known = rank(known)
+    ranked = undominated(known)[:k]
+    kth = ranked[-1][0] if len(ranked) == k else float('-inf')
+    # Highest ceilings first, so the mixes most likely to top the list settle early
+    shards = sorted(((ceiling, task) for ceiling, task in shards if ceiling > kth), key=lambda shard: -shard[0])
+    tasks = [task for _, task in shards]
+    asked = [k] * len(tasks)  # how many mixes each shard was asked for
+    pending = dict(enumerate(ceiling for ceiling, _ in shards))
+    found = {}  # shard -> its ranked mixes
+    floors = {}  # shard -> best profit it left out, for full shards that lost labels in the merge
+    emitted = 0
+
+    def merge():
+        nonlocal ranked
+        kept = undominated(known + [item for items in found.values() for item in items])
+        survivors = {(key, profit) for profit, key, _ in kept}
+        floors.clear()
+        for index, items in found.items():
+            if len(items) == asked[index] and any((key, profit) not in survivors for profit, key, _ in items):
+                floors[index] = items[-1][0]
+        ranked = kept[:k]
+
+    def final():
+        nonlocal emitted
+        # Strictly above, so a label with the same profit cannot still turn up and dominate it
+        ceiling = max([*pending.values(), *floors.values()], default=float('-inf'))
+        while emitted < len(ranked) and ranked[emitted][0] > ceiling:
+            emitted += 1
+            yield ranked[emitted - 1][2]
+
+    if telemetry is not None:
+        telemetry.phase("plan", start_time)
+    yield from final()
+    worker = profit_worker_shard if telemetry is None else telemetry.worker(profit_worker_shard)
+    start_time = time.time()
+    run = list(pending)
+    try:
+        while run and emitted < k:
+            for position, mixes in run_tasks_iter(worker, [tasks[index] for index in run],
+                                                  "💸 Calculating Profit...", pool):
+                index = run[position]
+                if telemetry is not None:
+                    mixes = telemetry.task_done(f"{tasks[index][1]} shard {index}", mixes)
+                del pending[index]
+                found[index] = rank(mixes)
+                merge()
+                yield from final()
+                if emitted == k:
+                    break  # the rest could not make the top k; closing cancels them
+            # Only shards whose left-out mixes could still be next need to run again
+            upcoming = ranked[emitted][0] if emitted < len(ranked) else float('-inf')
+            run = [index for index, floor in floors.items() if floor >= upcoming] if emitted < k else []
+            for index in run:
+                asked[index] *= 2
+                tasks[index] = tasks[index][:5] + (asked[index],) + tasks[index][6:]
+                pending[index] = floors[index]
+    finally:
+        if telemetry is not None and tasks:
+            telemetry.phase("search", start_time)
+
+# Pareto fronts
+# Profit against mixing steps (ingredient count) against cash spent. The
+# profit DP already keeps, per state, only the labels no other label for that
+# state beats on both depth and cost, and a recipe whose label is beaten that
+# way is beaten on all three objectives by the same recipe from the better
+# label. So the front is found in one pass over those labels, level by level.
+# A label can only be dominated by one at its own depth or shallower, so each
+# level is checked against the front found so far and then joins it, and a
+# label whose best extension (profit_bound) the front already matches is not
+# expanded.
+PARETO_DEPTH = 7  # default depth of Pareto queries
+PARETO_TOLERANCE = 1e-9  # relative; closer profits (float noise) are the same profit
+
+class ProfitStaircase:
+    """2-D Pareto front of (cost, profit) points: best profit at or under a cost."""
+
+    def __init__(self):
+        self.costs = []  # ascending
+        self.profits = []  # strictly ascending with cost
+
+    def __len__(self):
+        return len(self.costs)
+
+    def best(self, cost):
+        """Highest profit of a point costing at most cost (-inf if none)."""
+        index = bisect_right(self.costs, cost)
+        return self.profits[index - 1] if index else float('-inf')
+
+    def add(self, cost, profit):
+        """Add a point unless one as cheap is as profitable; returns whether it was added."""
+        tie = abs(profit) * PARETO_TOLERANCE
+        if self.best(cost) >= profit - tie:
+            return False
+        index = bisect_left(self.costs, cost)
+        end = index
+        while end < len(self.costs) and self.profits[end] <= profit + tie:
+            end += 1
+        self.costs[index:end] = [cost]
+        self.profits[index:end] = [profit]
+        return True
+
+def pareto_search(starts, expand, state_mask, max_depth, base_price, costs, bit_values,
+                  progress=None, bound=None, cancelled=None, telemetry=None,
+                  forbidden=0, blocked=0, budget=float('inf')):
+    """Recipes on the (profit, ingredient count, cost) Pareto front, in one DP pass.
+
+    ``starts``, ``expand`` and ``state_mask`` are as for profit_search, and
+    labels are kept the same way (cheapest per state and depth, beaten ones
+    dropped). Labels are scored as each level completes: the level's labels,
+    cheapest first, join the front unless a shallower or as shallow label is
+    at least as cheap and as profitable. With a ``bound`` from profit_bound,
+    labels no extension of which could get onto the front are not expanded.
+    Only labels that join the front or get expanded take a StateTable row.
+    ``forbidden``, ``blocked`` and ``budget`` are as for profit_search.
+
+    Returns the front as (profit, depth, cost, state, start state, path),
+    shallowest first and cheapest first within a depth. Ties on all three
+    keep the first recipe found.
+    """
+    if progress is None:
+        progress = TaskProgress()
+    table = StateTable()
+    stairs = ProfitStaircase()
+    front = []  # (profit, row)
+    best_cost = dict(starts)
+    level = {state: (cost, NO_STATE, NO_INGREDIENT) for state, cost in starts.items()}
+    cheapest = min(costs)
+    progress.update(discovered=len(level))
+    steps = 0
+
+    for depth in range(max_depth + 1):
+        rows = {}
+        scored = sorted(
+            ((base_price * mask_multiplier(state_mask(state), bit_values) - cost, cost, state)
+             for state, (cost, _, _) in level.items() if not state_mask(state) & forbidden),
+            key=lambda item: (item[1], -item[0]),
+        )
+        for profit, cost, state in scored:
+            if stairs.add(cost, profit):
+                _, parent, ingredient = level[state]
+                rows[state] = table.add(state, parent, ingredient, depth, cost)
+                front.append((profit, rows[state]))
+        if depth == max_depth:
+            break
+
+        remaining = max_depth - depth
+        frontier = []
+        for state, (cost, parent, ingredient) in level.items():
+            if bound is not None and stairs.best(cost + cheapest) >= bound(state_mask(state), cost, remaining):
+                continue
+            row = rows.get(state)
+            if row is None:
+                row = table.add(state, parent, ingredient, depth, cost)
+            frontier.append((state, row, cost))
+
+        next_level = {}
+        for state, row, cost in frontier:
+            steps += 1
+            if steps % 1000 == 0:
+                progress.update(done=1000)
+                if cancelled is not None and cancelled():
+                    break
+
+            for index, new_state in enumerate(expand(state)):
+                new_cost = cost + costs[index]
+                if new_cost < best_cost.get(new_state, float('inf')):
+                    if new_cost > budget or blocked and state_mask(new_state) & blocked:
+                        continue
+                    best_cost[new_state] = new_cost
+                    next_level[new_state] = (new_cost, row, index)
+        if telemetry is not None:
+            telemetry.record(depth, len(frontier), len(frontier) * len(costs), len(next_level), best_cost,
+                             pruned=len(level) - len(frontier), front=len(front), labels_bytes=table.nbytes)
+        progress.update(discovered=len(next_level))
+        level = next_level
+        if not level or (cancelled is not None and cancelled()):
+            break
+
+    progress.update(done=steps % 1000)
+
+    results = []
+    for profit, row in front:
+        root, path = table.path_to(row)
+        results.append((profit, table.depths[row], table.costs[row], table.states[row], table.states[root], path))
+    return results
+
+def pareto_worker(args, progress=None, telemetry=None):
+    """Pareto front of one base, as result dicts shallowest then cheapest first."""
+    base_name, base_effects, max_depth, effect_rules, constraints = args
+    rules = compile_rules(effect_rules)
+    base_price = base_prices.get(base_name, 0)
+    costs = [ingredient_costs.get(ing, 0) for ing in rules.ingredients]
+    bit_values = rules.multiplier_bits(effect_multipliers)
+    limits = (constraints or MixConstraints()).limits(rules)
+    start = rules.mask_of(base_effects)
+    if start & limits["blocked"]:
+        return []
+    found = pareto_search(
+        {start: 0}, rules.successors, int, max_depth, base_price, costs, bit_values,
+        progress or TaskProgress.for_worker(), bound=profit_bound(rules, base_price, costs, bit_values, max_depth),
+        cancelled=SharedBound.for_worker().cancelled, telemetry=telemetry, **limits,
+    )
+    return [{
+        "base": base_name,
+        "effects": rules.effects_of(mask),
+        "path": [rules.ingredients[i] for i in path],
+    } for _, _, _, mask, _, path in found]
+
+def pareto_fronts(starting_product_choice, max_depth=PARETO_DEPTH, pool=None, telemetry=None, constraints=None):
+    """Pareto-optimal mixes over profit, ingredient count and cost, per chosen base.
+
+    Returns one list per base in menu order, concatenated; within a base the
+    mixes go shallowest first, then cheapest. Only mixes meeting
+    ``constraints`` (a MixConstraints) count.
+    """
+    start_time = time.time()
+    constraints = constraints or MixConstraints()
+    tasks = [(base, effects, constraints.depth(max_depth), constraints.rules(), constraints)
+             for base, effects in filter_base_products(starting_product_choice).items()]
+    if telemetry is None:
+        fronts = run_tasks(pareto_worker, tasks, "⚖️ Tracing the Pareto front...", pool)
+    else:
+        telemetry.phase("plan", start_time)
+        start_time = time.time()
+        traced = run_tasks(telemetry.worker(pareto_worker), tasks, "⚖️ Tracing the Pareto front...", pool)
+        fronts = [telemetry.task_done(task[0], result) for task, result in zip(tasks, traced)]
+        telemetry.phase("search", start_time)
+    return [mix for front in fronts for mix in front]
+
+# Price re-scoring
+# Which effect sets a base can reach, and by which recipes, depends only on
+# the ruleset; prices only pick among them. A recipe book keeps, for every
+# reachable effect set, the recipes whose ingredient counts are Pareto-minimal
+# (no other recipe to the same set uses at most as many of every ingredient).
+# With non-negative ingredient costs one of those is the cheapest recipe
+# under any prices, so the best mix for new prices is one pass over the
+# book's labels. Books are built once per base and depth, cached next to the
+# graphs and kept in memory by a warm process. Depth 6 is ~500k labels per
+# base; depth 7 is ~3M and takes about a minute to build.
+BOOK_DEPTH = 6  # default depth of re-scored profit queries
+BOOK_MAX_DEPTH = 7  # past this the book outgrows memory
+_BOOK_MAGIC = b"S1MPBOOK"
+_BOOK_VERSION = 1
+# magic, version, state count, label count, max depth, key
+_BOOK_HEADER = struct.Struct("<8sIIII64s")
+
+class RecipeBook:
+    """Pareto-minimal recipes per reachable effect set, ready to be priced.
+
+    Labels are in BFS order. Label i reaches masks[states[i]] with depths[i]
+    ingredients, from label parents[i] by ingredient via[i]; label 0 is the
+    base itself. Costs are never stored: a pass down the levels adds them up
+    for whatever the ingredient prices are.
+    """
+
+    def __init__(self, key, max_depth, masks, states, parents, via, depths):
+        self.key = key
+        self.max_depth = max_depth
+        self.masks = masks
+        self.states = states
+        self.parents = parents
+        self.via = via
+        self.depths = depths
+        self.numpy_arrays = None
+        self.numpy_paths = None
+
+    def __len__(self):
+        return len(self.parents)
+
+    def path_to(self, label):
+        path = []
+        while self.parents[label] != NO_STATE:
+            path.append(self.via[label])
+            label = self.parents[label]
+        path.reverse()
+        return path
+
+    def rank(self, base_price, costs, bit_values, k=1, per_state=False, max_depth=None):
+        """(profit, label) of the k best labels, best first, then fewest ingredients.
+
+        Like the profit DP, keeps one label per (state, depth), or per state
+        with per_state, and only labels within max_depth ingredients.
+        """
+        max_depth = self.max_depth if max_depth is None else min(max_depth, self.max_depth)
+        try:
+            np = _numpy()
+        except ImportError:
+            return self._rank_python(base_price, costs, bit_values, k, per_state, max_depth)
+
+        mask_bytes, states, depths, parents, via, bounds = self._arrays(np)
+        # Multiplier per state from a table of per-byte sums
+        weights = np.zeros(len(mask_bytes) * 8)
+        weights[:len(bit_values)] = bit_values
+        byte_sums = ((np.arange(256)[:, None] >> np.arange(8)) & 1) @ weights.reshape(-1, 8).T
+        total = byte_sums[mask_bytes[0], 0]
+        for index in range(1, len(mask_bytes)):
+            total = total + byte_sums[mask_bytes[index], index]
+        values = base_price * (1.0 + total)
+
+        count = bounds[max_depth + 1]
+        profits = values[states[:count]] - self.label_costs(np, np.asarray(costs, dtype=np.float64), max_depth)
+        if k == 1:
+            label = int(np.flatnonzero(profits == profits.max())[0])
+            return [(float(profits[label]), label)]
+
+        # The best labels overall, widened until they cover k groups: a group
+        # with no label among them cannot beat any group that has one
+        wanted = 4 * k
+        while True:
+            if wanted >= count:
+                candidates = np.arange(count)
+            else:
+                candidates = np.flatnonzero(profits >= np.partition(profits, count - wanted)[count - wanted])
+            heads = {}
+            for label in candidates[np.lexsort((candidates, -profits[candidates]))].tolist():
+                group = states[label] if per_state else (states[label], depths[label])
+                if group not in heads:
+                    heads[group] = label
+                    if len(heads) == k:
+                        break
+            if len(heads) == k or wanted >= count:
+                return [(float(profits[label]), label) for label in heads.values()]
+            wanted *= 4
+
+    def label_costs(self, np, prices, max_depth):
+        """Cost of every label within max_depth, each from its parent's a level at a time."""
+        _, _, _, parents, via, bounds = self._arrays(np)
+        costs = np.zeros(bounds[max_depth + 1])
+        for depth in range(1, max_depth + 1):
+            level = slice(bounds[depth], bounds[depth + 1])
+            costs[level] = costs[parents[level]] + prices[via[level]]
+        return costs
+
+    def ingredient_paths(self, np):
+        """labels x max_depth matrix of each label's ingredients, 255 past its depth."""
+        if self.numpy_paths is None:
+            _, _, _, parents, via, bounds = self._arrays(np)
+            paths = np.full((len(self), self.max_depth), 255, dtype=np.uint8)
+            for depth in range(1, self.max_depth + 1):
+                level = slice(bounds[depth], bounds[depth + 1])
+                paths[level] = paths[parents[level]]
+                paths[level, depth - 1] = via[level]
+            self.numpy_paths = paths
+        return self.numpy_paths
+
+    def _arrays(self, np):
+        """NumPy views of the book and its level offsets, built on first use."""
+        if self.numpy_arrays is None:
+            masks = np.asarray(self.masks, dtype=np.uint64).astype("<u8")
+            nbytes = max(1, (int(masks.max()).bit_length() + 7) // 8)
+            mask_bytes = masks.view(np.uint8).reshape(-1, 8).T[:nbytes].astype(np.intp)
+            depths = np.asarray(self.depths, dtype=np.uint8)
+            parents = np.asarray(self.parents, dtype=np.int64)
+            parents[0] = 0
+            self.numpy_arrays = (mask_bytes, np.asarray(self.states, dtype=np.intp), depths, parents,
+                                 np.asarray(self.via, dtype=np.intp),
+                                 np.searchsorted(depths, np.arange(self.max_depth + 2)))
+        return self.numpy_arrays
+
+    def _rank_python(self, base_price, costs, bit_values, k, per_state, max_depth):
+        values = {}
+        label_costs = [0.0] * len(self)
+        best = {}  # group -> (profit, -label)
+        for label in range(len(self)):
+            depth = self.depths[label]
+            if depth > max_depth:
+                break
+            if label:
+                label_costs[label] = label_costs[self.parents[label]] + costs[self.via[label]]
+            state = self.states[label]
+            if state not in values:
+                values[state] = base_price * mask_multiplier(self.masks[state], bit_values)
+            item = (values[state] - label_costs[label], -label)
+            group = state if per_state else (state, depth)
+            if group not in best or item > best[group]:
+                best[group] = item
+        return [(profit, -label) for profit, label in heapq.nlargest(k, best.values())]
+
+def recipe_book_key(base_effects, rules=None):
+    import hashlib
+
+    engine = compile_rules(rules)
+    payload = json.dumps([engine.fingerprint, sorted(base_effects), "book"])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def recipe_book_path(base_effects, rules=None):
+    return os.path.join(CACHE_DIR, f"book-{recipe_book_key(base_effects, rules)[:16]}.bin")
+
+def build_recipe_book(base_effects, max_depth=BOOK_DEPTH, rules=None):
+    """Label-setting DP over (state, ingredient counts), keeping Pareto-minimal counts per state."""
+    engine = compile_rules(rules)
+    if len(engine.effects) > 64:
+        raise ValueError("Recipe books store effect sets as uint64; this ruleset has more than 64 effects")
+    width = len(engine.ingredients)
+    # Counts are packed a byte per ingredient; with a guard bit on top of
+    # every byte, a <= b in every ingredient iff no guard bit borrows in
+    # (b | guard) - a.
+    guard = int.from_bytes(b"\x80" * width, "little")
+    start = engine.mask_of(base_effects)
+    table = StateTable(costs=False)
+    vectors = [0]
+    minimal = {start: [0]}  # state -> count vectors of its labels
+    frontier = [table.add(start)]
+
+    for depth in range(1, max_depth + 1):
+        next_frontier = []
+        for row in frontier:
+            vector = vectors[row]
+            for index, new_mask in enumerate(engine.successors(table.states[row])):
+                new_vector = vector + (1 << 8 * index)
+                labels = minimal.setdefault(new_mask, [])
+                # Later labels never use fewer ingredients, so only the new one can be dominated
+                if any(((new_vector | guard) - old) & guard == guard for old in labels):
+                    continue
+                labels.append(new_vector)
+                vectors.append(new_vector)
+                next_frontier.append(table.add(new_mask, row, index, depth))
+        frontier = next_frontier
+
+    masks = array('Q', minimal)
+    state_of = {mask: state for state, mask in enumerate(masks)}
+    return RecipeBook(recipe_book_key(base_effects, rules), max_depth, masks,
+                      array('I', (state_of[mask] for mask in table.states)),
+                      table.parents, table.via, array('B', table.depths))
+
+def write_recipe_book(book, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_BOOK_HEADER.pack(_BOOK_MAGIC, _BOOK_VERSION, len(book.masks), len(book), book.max_depth,
+                                  book.key.encode("ascii")))
+        for section in (book.masks, book.states, book.parents, book.via, book.depths):
+            data = bytes(section)
+            f.write(data)
+            f.write(b"\0" * (-len(data) % 8))
+    os.replace(tmp_path, path)
+
+def open_recipe_book(path, expected_key=None):
+    """Memory-map a book file; returns None if it is missing or stale."""
+    try:
+        with open(path, "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (FileNotFoundError, ValueError):
+        return None
+
+    if len(data) < _BOOK_HEADER.size:
+        return None
+    magic, version, states, labels, max_depth, key = _BOOK_HEADER.unpack_from(data)
+    key = key.decode("ascii")
+    if magic != _BOOK_MAGIC or version != _BOOK_VERSION or (expected_key and key != expected_key):
+        return None
+
+    view = memoryview(data)
+    offset = _BOOK_HEADER.size
+    sections = []
+    for typecode, length in (('Q', states), ('I', labels), ('I', labels), ('B', labels), ('B', labels)):
+        size = length * array(typecode).itemsize
+        sections.append(view[offset:offset + size].cast(typecode))
+        offset += size + (-size % 8)
+    return RecipeBook(key, max_depth, *sections)
+
+_book_cache = {}  # path -> RecipeBook
+
+def load_recipe_book(base_effects, max_depth=BOOK_DEPTH, rules=None):
+    """The base's book at least max_depth deep, built and saved first if need be."""
+    if max_depth > BOOK_MAX_DEPTH:
+        raise ValueError(f"Re-scored profit queries go up to depth {BOOK_MAX_DEPTH}, not {max_depth}")
+    path = recipe_book_path(base_effects, rules)
+    book = _book_cache.get(path) or open_recipe_book(path, recipe_book_key(base_effects, rules))
+    if book is None or book.max_depth < max_depth:
+        book = build_recipe_book(base_effects, max(max_depth, BOOK_DEPTH), rules)
+        write_recipe_book(book, path)
+    _book_cache[path] = book
+    return book
+
+def build_recipe_books(base_names=None, max_depth=BOOK_DEPTH):
+    """Build and persist the recipe book for each base product."""
+    built = set()
+    for base_name in base_names or base_products:
+        path = recipe_book_path(base_products[base_name])
+        if path in built:
+            continue  # bases with the same starting effects share a book
+        built.add(path)
+
+        start_time = time.time()
+        book = build_recipe_book(base_products[base_name], max_depth)
+        write_recipe_book(book, path)
+        _book_cache[path] = book
+        print(f"📒 {base_name}: {len(book)} recipes over {len(book.masks)} effect sets to depth {max_depth} "
+              f"in {time.time() - start_time:.1f}s -> {path}")
+
+def merged_prices(overrides=None):
+    """(base prices, ingredient costs, effect multipliers) with a query's overrides applied.
+
+    ``overrides`` may hold "base_prices", "ingredient_costs" and
+    "effect_multipliers" dicts, each keyed by names of that kind.
+    """
+    overrides = overrides or {}
+    if not isinstance(overrides, dict):
+        raise ValueError("prices must be an object")
+    unknown = set(overrides) - {"base_prices", "ingredient_costs", "effect_multipliers"}
+    if unknown:
+        raise ValueError(f"Unknown price table(s): {', '.join(sorted(unknown))}")
+    merged = []
+    for name, current in (("base_prices", base_prices), ("ingredient_costs", ingredient_costs),
+                          ("effect_multipliers", effect_multipliers)):
+        changes = overrides.get(name, {})
+        if not isinstance(changes, dict) or not all(
+                isinstance(value, (int, float)) and not isinstance(value, bool) for value in changes.values()):
+            raise ValueError(f"{name} must map names to numbers")
+        unknown = set(changes) - set(current)
+        if unknown:
+            raise ValueError(f"Unknown name(s) in {name}: {', '.join(sorted(unknown))}")
+        merged.append({**current, **changes})
+    if any(cost < 0 for cost in merged[1].values()):
+        raise ValueError("Ingredient costs must not be negative")
+    return tuple(merged)
+
+def rescored_profit_mixes(starting_product_choice, max_depth=BOOK_DEPTH, k=1, per_effect_set=False, prices=None):
+    """The k most profitable mixes under ``prices`` (see merged_prices), from the recipe books."""
+    bases, costs_by_name, multipliers = merged_prices(prices)
+    rules = compile_rules()
+    costs = [costs_by_name.get(ing, 0) for ing in rules.ingredients]
+    bit_values = rules.multiplier_bits(multipliers)
+
+    ranked = []
+    for order, (base, effects) in enumerate(filter_base_products(starting_product_choice).items()):
+        book = load_recipe_book(effects, max_depth)
+        for profit, label in book.rank(bases.get(base, 0), costs, bit_values, k, per_effect_set, max_depth):
+            ranked.append((profit, -book.depths[label], -order, base, book, label))
+    return [{
+        "base": base,
+        "effects": rules.effects_of(book.masks[book.states[label]]),
+        "path": [rules.ingredients[i] for i in book.path_to(label)],
+    } for _, _, _, base, book, label in heapq.nlargest(k, ranked, key=lambda item: item[:3])]
+
+# Price-scenario sweeps
+# Many price scenarios against the same recipe books at once. Per book, the
+# value of every effect set under every scenario is one matrix product (effect
+# bits as columns against the scenarios' multipliers), and the best label per
+# scenario is an argmax down a labels x scenarios profit matrix. Scenarios go
+# SWEEP_CHUNK at a time, and within a chunk the matrix only gets rows for
+# labels that might win one of its scenarios, so it stays small. A breakpoint
+# is where the best mix changes between consecutive scenarios; "at" is where
+# the two mixes' profits cross if prices move linearly from one scenario to
+# the next, as in a scale sweep. Without NumPy every scenario is re-scored on
+# its own (rescored_profit_mixes), which gives the same answers, only slower.
+SWEEP_CHUNK = 16
+SWEEP_TOLERANCE = 1e-9  # relative; closer profits are a tie, not a breakpoint
+
+def scaled_scenarios(table, start, stop, steps, names=None):
+    """Price overrides scaling ``names`` (default all) of a price table from start to stop times today's."""
+    current = {"base_prices": base_prices, "ingredient_costs": ingredient_costs,
+               "effect_multipliers": effect_multipliers}.get(table)
+    if current is None:
+        raise ValueError(f"Unknown price table: {table!r}")
+    unknown = set(names or ()) - set(current)
+    if unknown:
+        raise ValueError(f"Unknown name(s) in {table}: {', '.join(sorted(unknown))}")
+    if steps < 2:
+        raise ValueError("A sweep needs at least 2 steps")
+    return [{table: {name: current[name] * (start + (stop - start) * step / (steps - 1)) for name in names or current}}
+            for step in range(steps)]
+
+def sweep_book(book, base_prices_by_scenario, costs, bit_values, max_depth=None):
+    """Best (profit, label) of one book under every scenario, as two arrays.
+
+    ``base_prices_by_scenario`` has one base price per scenario, ``costs`` is
+    ingredients x scenarios and ``bit_values`` is effects x scenarios. Per
+    chunk of scenarios, labels whose best case (highest value, cheapest
+    prices) is below some label's worst case are dropped before the exact
+    matrix is built; in a sweep of gradual changes that is nearly all.
+    """
+    np = _numpy()
+    max_depth = book.max_depth if max_depth is None else min(max_depth, book.max_depth)
+    mask_bytes, states, _, _, _, bounds = book._arrays(np)
+    states = states[:bounds[max_depth + 1]]
+    paths = book.ingredient_paths(np)[:len(states), :max_depth]
+    bits = np.unpackbits(mask_bytes.T.astype(np.uint8), axis=1, bitorder="little")[:, :len(bit_values)]
+    bits, bit_values = bits.astype(np.float64), bit_values[:bits.shape[1]]  # effects past the top byte never occur
+    best_profits = np.empty(len(base_prices_by_scenario))
+    best_labels = np.empty(len(base_prices_by_scenario), dtype=np.int64)
+
+    for first in range(0, len(base_prices_by_scenario), SWEEP_CHUNK):
+        chunk = slice(first, first + SWEEP_CHUNK)
+        values = base_prices_by_scenario[chunk] * (1.0 + bits @ bit_values[:, chunk])  # states x scenarios
+        prices = costs[:, chunk]
+        worst = values.min(axis=1)[states] - book.label_costs(np, prices.max(axis=1), max_depth)
+        best = values.max(axis=1)[states] - book.label_costs(np, prices.min(axis=1), max_depth)
+        keep = np.flatnonzero(best >= worst.max() - SWEEP_TOLERANCE * max(1.0, abs(worst.max())))
+
+        # Exact profits of the survivors: value minus the prices along the path
+        padded = np.zeros((256, prices.shape[1]))
+        padded[:len(prices)] = prices
+        profits = values[states[keep]]
+        for step in paths[keep].T:
+            profits -= padded[step]
+        # Near-equal profits are ties, won by the first (shallowest) label
+        top = profits.max(axis=0)
+        labels = keep[(profits >= top - SWEEP_TOLERANCE * np.maximum(1.0, np.abs(top))).argmax(axis=0)]
+        best_labels[chunk] = labels
+        best_profits[chunk] = top
+    return best_profits, best_labels
+
+def price_sweep(scenarios, starting_product_choice=0, max_depth=BOOK_DEPTH):
+    """Best mix under each price scenario (a "prices" override dict) and the breakpoints between them.
+
+    Returns {"scenarios": [{"scenario": i, "result": mix, ...financials}],
+    "breakpoints": [{"after": i, "from": mix, "to": mix, "at": i + fraction}]}.
+    """
+    if not scenarios:
+        raise ValueError("A sweep needs at least one scenario")
+    merged = [merged_prices(scenario) for scenario in scenarios]
+    try:
+        np = _numpy()
+    except ImportError:
+        mixes = [rescored_profit_mixes(starting_product_choice, max_depth, prices=scenario)[0]
+                 for scenario in scenarios]
+    else:
+        mixes = _sweep_numpy(np, merged, starting_product_choice, max_depth)
+
+    breakpoints = []
+    for index in range(len(mixes) - 1):
+        before, after = mixes[index], mixes[index + 1]
+        if before == after:
+            continue
+        # Profit gap between the two mixes at either end; it closes linearly
+        gap = [mix_financials(before, prices)["profit"] - mix_financials(after, prices)["profit"]
+               for prices in merged[index:index + 2]]
+        fraction = gap[0] / (gap[0] - gap[1]) if gap[0] != gap[1] else 0.0
+        breakpoints.append({"after": index, "from": before, "to": after,
+                            "at": index + min(max(fraction, 0.0), 1.0)})
+    return {
+        "scenarios": [{"scenario": index, "result": mix, **mix_financials(mix, prices)}
+                      for index, (mix, prices) in enumerate(zip(mixes, merged))],
+        "breakpoints": breakpoints,
+    }
+
+def _sweep_numpy(np, merged, starting_product_choice, max_depth):
+    rules = compile_rules()
+    costs = np.array([[prices[1].get(ing, 0) for prices in merged] for ing in rules.ingredients], dtype=np.float64)
+    bit_values = np.array([rules.multiplier_bits(prices[2]) for prices in merged], dtype=np.float64).T
+
+    best_profits = np.full(len(merged), -np.inf)
+    winners = [None] * len(merged)  # (base, book, label) per scenario
+    for base, effects in filter_base_products(starting_product_choice).items():
+        book = load_recipe_book(effects, max_depth)
+        base_price = np.array([prices[0].get(base, 0) for prices in merged], dtype=np.float64)
+        profits, labels = sweep_book(book, base_price, costs, bit_values, max_depth)
+        # Bases in menu order, so an earlier one keeps a tie
+        ahead = profits > best_profits + SWEEP_TOLERANCE * np.maximum(1.0, np.abs(profits))
+        for scenario in np.flatnonzero(ahead):
+            winners[scenario] = (base, book, int(labels[scenario]))
+        best_profits = np.where(ahead, profits, best_profits)
+
+    return [{
+        "base": base,
+        "effects": rules.effects_of(book.masks[book.states[label]]),
+        "path": [rules.ingredients[i] for i in book.path_to(label)],
+    } for base, book, label in winners]
+
+def run_sweep(scenarios, bases=0, max_depth=BOOK_DEPTH, json_path=None):
+    """CLI front end of price_sweep: a line per breakpoint, the full results optionally as JSON."""
+    start_time = time.time()
+    swept = price_sweep(scenarios, bases, max_depth)
+    first = swept["scenarios"][0]
+    print(f"🧮 {len(scenarios)} scenarios in {time.time() - start_time:.2f}s, "
+          f"{len(swept['breakpoints'])} breakpoint(s)")
+    print(f"  #0: {first['result']['base']}: {' → '.join(first['result']['path']) or '(nothing)'}"
+          f"  profit ${first['profit']:.2f}")
+    for point in swept["breakpoints"]:
+        scenario = swept["scenarios"][point["after"] + 1]
+        print(f"  #{point['at']:.2f}: {scenario['result']['base']}: {' → '.join(scenario['result']['path']) or '(nothing)'}"
+              f"  profit ${scenario['profit']:.2f}")
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(swept, f, indent=1)
+        print(f"💾 Results written to {json_path}")
+    return swept
+
+# BFS worker for a single base product (standalone, must be top-level for multiprocessing)
+def bfs_worker_process(args, progress=None):
+    base_name, base_effects, desired_effects, max_depth, effect_rules = args
+    start = compile_rules(effect_rules).mask_of(base_effects)
+    return bfs_worker_shard(("python", base_name, [(start, 0, [])], desired_effects, max_depth, effect_rules, None),
+                            progress)
+
+def bfs_worker_shard(args, progress=None, telemetry=None):
+    """Shortest-recipe search from one shard: start labels (mask, cost, path) sharing a depth.
+
+    ``effect_rules`` is already narrowed to the usable ingredients; the rest
+    of the MixConstraints (or None) is applied here.
+    """
+    engine_name, base_name, starts, desired_effects, max_depth, effect_rules, constraints = args
+    rules = compile_rules(effect_rules)
+
+    # An effect no ingredient can produce can never be reached
+    if any(effect not in rules.bit for effect in desired_effects):
+        return None
+    desired = rules.mask_of(desired_effects)
+    costs = [ingredient_costs.get(ing, 0) for ing in rules.ingredients]
+    progress = progress or TaskProgress.for_worker()
+    bound = SharedBound.for_worker()
+
+    if constraints is not None and constraints.filtering:
+        limits = constraints.limits(rules)
+        if limits["budget"] < float('inf'):
+            found = shortest_search(rules, starts, desired, max_depth, progress, bound, telemetry, costs=costs,
+                                    **limits)
+        elif max_depth > MITM_DEPTH:
+            found = mitm_shortest_search(rules, starts, desired, max_depth, progress, bound, telemetry,
+                                         limits["forbidden"], limits["blocked"], costs)
+        else:
+            found = shortest_search(rules, starts, desired, max_depth, progress, bound, telemetry, costs=costs,
+                                    **limits)
+    elif engine_name == "numpy":
+        found = numpy_shortest_search(rules, starts, desired, max_depth, progress, bound, telemetry, costs)
+    elif engine_name == "external":
+        found = external_shortest_search(rules, starts, desired, max_depth, progress, bound, telemetry,
+                                         costs=costs)
+    elif max_depth > MITM_DEPTH:
+        found = mitm_shortest_search(rules, starts, desired, max_depth, progress, bound, telemetry, costs=costs)
+    else:
+        found = shortest_search(rules, starts, desired, max_depth, progress, bound, telemetry, costs=costs)
+    if found is None:
+        return None
+
+    mask, path = found
+    return {
+        "base": base_name,
+        "effects": rules.effects_of(mask),
+        "path": [rules.ingredients[i] for i in path],
+    }
+
+def shortest_search(rules, starts, desired, max_depth, progress, bound, telemetry=None,
+                    forbidden=0, blocked=0, budget=float('inf'), costs=None):
+    """BFS from the start labels; returns (mask, path) of the cheapest shortest recipe.
+
+    Answers are published to ``bound`` and the search gives up once it is
+    deeper than the best depth any task has found. The queue is a StateTable
+    read in row order, so each state costs a row rather than a path copy.
+    As in StateGraph, a state keeps its cheapest parent on the level it is
+    first reached at, by ingredient ``costs`` (default: all free), and the
+    goal level is read to its end, so the answer is the cheapest of the
+    shortest recipes.
+
+    States holding ``forbidden`` effects are not answers and states holding
+    ``blocked`` ones are never queued. With a ``budget``, labels over it are
+    not queued either, and a state is queued again whenever it is reached
+    more cheaply than before, since only the cheaper label might finish
+    within budget.
+    """
+    if costs is None:
+        costs = [0] * len(rules.ingredients)
+    revisit = budget < float('inf')
+    table = StateTable()
+    prefixes = {}  # root row -> the start label's path
+    visited = {}  # mask -> row on its first level (NO_STATE if blocked); with a budget, cheapest cost queued
+    for mask, cost, path in starts:
+        if revisit and cost < visited.get(mask, float('inf')):
+            visited[mask] = cost
+            prefixes[table.add(mask, depth=len(path), cost=cost)] = path
+        elif not revisit and mask not in visited:
+            visited[mask] = table.add(mask, depth=len(path), cost=cost)
+            prefixes[visited[mask]] = path
+        elif not revisit and cost < table.costs[visited[mask]]:
+            table.costs[visited[mask]] = cost
+            prefixes[visited[mask]] = path
+    discovered = len(table)
+    limit = min(max_depth, bound.depth())
+    steps = 0
+    level_depth, level_size, level_steps, level_visited = len(starts[0][2]), len(table), 0, len(visited)
+
+    def close_level(expanded):
+        # States at the depth limit are popped but not expanded
+        expanded = expanded if level_depth < limit else 0
+        telemetry.record(level_depth, level_size, expanded * len(rules.ingredients),
+                         len(visited) - level_visited, visited, labels_bytes=table.nbytes)
+
+    while steps < len(table):
+        row = steps
+        mask, depth = table.states[row], table.depths[row]
+        steps += 1
+
+        # ✅ Publish progress and pick up other tasks' answers every 1000 states
+        if steps % 1000 == 0:
+            progress.update(done=1000, discovered=discovered)
+            discovered = 0
+            limit = min(max_depth, bound.depth())
+
+        # BFS order: every row after this one is at least this deep
+        if depth > limit:
+            if telemetry is not None:
+                close_level(steps - 1 - level_steps)
+            break
+
+        # The first state of a level: the one before it is fully expanded
+        if telemetry is not None and depth != level_depth:
+            close_level(level_size)
+            level_depth, level_size, level_steps, level_visited = depth, len(table) - row, steps - 1, len(visited)
+
+        if mask & desired == desired and not mask & forbidden:
+            if telemetry is not None:
+                close_level(steps - 1 - level_steps)
+            # The rest of the level is final: keep its cheapest goal
+            best = row
+            while steps < len(table) and table.depths[steps] == depth:
+                other = table.states[steps]
+                if other & desired == desired and not other & forbidden and table.costs[steps] < table.costs[best]:
+                    best = steps
+                steps += 1
+            progress.update(done=steps % 1000, discovered=discovered)
+            bound.offer(depth=depth)
+            root, path = table.path_to(best)
+            return table.states[best], prefixes[root] + path
+
+        if depth >= limit:
+            continue
+
+        cost = table.costs[row]
+        if not revisit:
+            for index, new_mask in enumerate(rules.successors(mask)):
+                target = visited.get(new_mask)
+                if target is None:
+                    if new_mask & blocked:
+                        visited[new_mask] = NO_STATE
+                    else:
+                        visited[new_mask] = table.add(new_mask, row, index, depth + 1, cost + costs[index])
+                        discovered += 1
+                elif target != NO_STATE and cost + costs[index] < table.costs[target] \
+                        and table.depths[target] == depth + 1:
+                    # Same level, cheaper: keep the cheapest shortest parent
+                    table.relabel(target, row, index, cost + costs[index])
+            continue
+        for index, new_mask in enumerate(rules.successors(mask)):
+            new_cost = cost + costs[index]
+            if new_cost <= budget and new_cost < visited.get(new_mask, float('inf')) and not new_mask & blocked:
+                visited[new_mask] = new_cost
+                table.add(new_mask, row, index, depth + 1, new_cost)
+                discovered += 1
+
+    progress.update(done=steps % 1000, discovered=discovered)  # Final few steps
+    if telemetry is not None and steps:
+        close_level(steps - level_steps)
+    return None
+
+# Meet-in-the-middle search
+# A forward BFS past depth 7 or so holds millions of states, so deep mode-1
+# searches only run it until a level reaches MITM_FRONTIER states. The rest of
+# the recipe is searched backwards from the goal, on requirements rather than
+# states: a requirement is a set of effects, and any state containing one of
+# level b's requirements may reach the goal in b more ingredients. Regressing
+# a requirement through an ingredient uses the inverse transitions: each
+# effect must have been in the state as one of its preimages, unless the
+# ingredient adds it. Requirements never grow and each level keeps only its
+# minimal ones, so the backward side stays small at any depth.
+MITM_DEPTH = 7  # deeper python-engine mode-1 searches meet in the middle
+MITM_FRONTIER = 1 << 16  # forward levels stop growing once this many states are reached
+
+def regress_requirements(rules, requirements):
+    """Minimal requirements one ingredient before the given ones.
+
+    A state satisfying none of them cannot reach any of ``requirements`` in
+    one step. The converse can fail when an ingredient's addition is blocked
+    by a full state, which the suffix search checks concretely.
+    """
+    found = set()
+    for preimages, add_mask in zip(rules.inverse_transitions(), rules.add_masks):
+        for requirement in requirements:
+            options = [0]
+            needed = requirement & ~add_mask
+            while needed and options:
+                low = needed & -needed
+                needed ^= low
+                sources = preimages[low.bit_length() - 1]
+                choices = []
+                while sources:
+                    source = sources & -sources
+                    choices.append(source)
+                    sources ^= source
+                options = [option | choice for option in options for choice in choices]
+            found.update(option for option in options if option.bit_count() <= rules.max_effects)
+
+    minimal = []
+    for requirement in sorted(found, key=int.bit_count):
+        if not any(requirement & kept == kept for kept in minimal):
+            minimal.append(requirement)
+    return minimal
+
+def mitm_shortest_search(rules, starts, desired, max_depth, progress, bound, telemetry=None,
+                         forbidden=0, blocked=0, costs=None):
+    """shortest_search for deep queries: forward BFS levels joined with backward requirements.
+
+    Finds the same recipe as the BFS, the cheapest of the shortest, with
+    bounded memory. Each requirement level is joined with the last forward
+    level through per-effect bitsets, and the cheapest suffix of each
+    matching state is found by a search that only steps into states meeting
+    the next requirement level. Requirements only track the desired effects,
+    so ``forbidden`` and ``blocked`` (as for shortest_search) are checked by
+    the forward levels and the suffix search.
+    """
+    if costs is None:
+        costs = [0] * len(rules.ingredients)
+    depth = len(starts[0][2])
+    table = StateTable()
+    start_paths = {}  # root row -> the start label's path
+    frontier = {}  # mask -> row
+    for mask, cost, path in starts:
+        if mask not in frontier or cost < table.costs[frontier[mask]]:
+            frontier[mask] = table.add(mask, depth=depth, cost=cost)
+            start_paths[frontier[mask]] = path
+    visited = set(frontier)
+    limit = min(max_depth, bound.depth())
+    progress.update(discovered=len(frontier))
+
+    def prefix(mask):
+        root, path = table.path_to(frontier[mask])
+        return start_paths[root] + path
+
+    # Forward: plain BFS levels, so shallow answers match shortest_search
+    while True:
+        hits = [mask for mask in frontier if mask & desired == desired and not mask & forbidden]
+        if hits:
+            bound.offer(depth=depth)
+            hit = min(hits, key=lambda mask: table.costs[frontier[mask]])
+            return hit, prefix(hit)
+        if depth >= limit or len(frontier) >= MITM_FRONTIER:
+            break
+        progress.update(done=len(frontier))
+        next_frontier = {}
+        for mask, row in frontier.items():
+            cost = table.costs[row]
+            for index, new_mask in enumerate(rules.successors(mask)):
+                if new_mask not in visited:
+                    visited.add(new_mask)
+                    if not new_mask & blocked:
+                        next_frontier[new_mask] = table.add(new_mask, row, index, depth + 1, cost + costs[index])
+                elif new_mask in next_frontier and cost + costs[index] < table.costs[next_frontier[new_mask]]:
+                    table.relabel(next_frontier[new_mask], row, index, cost + costs[index])
+        if telemetry is not None:
+            telemetry.record(depth, len(frontier), len(frontier) * len(rules.ingredients), len(next_frontier), visited,
+                             labels_bytes=table.nbytes)
+        if not next_frontier:
+            return None
+        frontier = next_frontier
+        depth += 1
+        progress.update(discovered=len(frontier))
+        limit = min(max_depth, bound.depth())
+    visited = None
+
+    # Backward: the k-th requirement level is joined with the last forward
+    # level for recipes of depth + k ingredients
+    masks = list(frontier)
+    effect_sets = _effect_sets(_effect_words(masks, range(len(masks)), len(rules.effects)), len(masks))
+    everything = (1 << len(masks)) - 1
+    backward = [[desired]]
+    suffixes = {}  # (mask, remaining) -> (cost, first ingredient) of its cheapest suffix, or None
+
+    def suffix_cost(mask, remaining):
+        if not remaining:
+            return 0 if mask & desired == desired and not mask & forbidden else None
+        key = (mask, remaining)
+        if key in suffixes:
+            best = suffixes[key]
+            return best and best[0]
+        best = None
+        requirements = backward[remaining - 1]
+        for index, new_mask in enumerate(rules.successors(mask)):
+            if not new_mask & blocked and any(new_mask & requirement == requirement for requirement in requirements):
+                rest = suffix_cost(new_mask, remaining - 1)
+                if rest is not None and (best is None or costs[index] + rest < best[0]):
+                    best = (costs[index] + rest, index)
+        suffixes[key] = best
+        return best and best[0]
+
+    while depth + len(backward) <= limit:
+        requirements = regress_requirements(rules, backward[-1])
+        progress.update(done=len(backward[-1]), discovered=len(requirements))
+        if telemetry is not None:
+            telemetry.record(depth + len(backward), len(backward[-1]), len(backward[-1]) * len(rules.ingredients),
+                             len(requirements), phase="backward")
+        if not requirements:
+            return None
+        backward.append(requirements)
+
+        matches = 0
+        for requirement in requirements:
+            candidates = everything
+            while requirement and candidates:
+                low = requirement & -requirement
+                candidates &= effect_sets[low.bit_length() - 1]
+                requirement ^= low
+            matches |= candidates
+        best = None  # (cost, mask)
+        while matches:
+            low = matches & -matches
+            matches ^= low
+            mask = masks[low.bit_length() - 1]
+            rest = suffix_cost(mask, len(backward) - 1)
+            if rest is not None and (best is None or table.costs[frontier[mask]] + rest < best[0]):
+                best = (table.costs[frontier[mask]] + rest, mask)
+        if best is not None:
+            mask = best[1]
+            path = prefix(mask)
+            for remaining in range(len(backward) - 1, 0, -1):
+                index = suffixes[mask, remaining][1]
+                path.append(index)
+                mask = rules.successors(mask)[index]
+            bound.offer(depth=depth + len(backward) - 1)
+            return mask, path
+        limit = min(max_depth, bound.depth())
+    return None
+
+# External-memory BFS
+# For rulesets whose reachable sets do not fit in RAM (more ingredients, a
+# higher MAX_EFFECTS), the "external" engine keeps every BFS level on disk as
+# a sorted file of fixed-width records: state mask, cost, parent mask,
+# ingredient, with masks and the (non-negative) cost big-endian so byte order
+# is numeric order. A level is expanded by streaming its file; successors
+# collect in a dict, cheapest label per state, until it holds about
+# SPILL_MEMORY_MB worth of entries and then go out as a sorted run. Merging
+# the runs against the earlier levels' files keeps each new state's first,
+# so cheapest, record and drops states seen before in one streaming pass, so
+# memory stays within the budget however large a level gets. Paths are walked back by binary search in the level
+# files. A manifest lists the completed levels, so a search that was
+# interrupted or failed resumes from the last of them; one that finishes
+# (an answer, or no answer within its depth) removes its files.
+SPILL_DIR = os.path.join(CACHE_DIR, "spill")
+SPILL_MEMORY_MB = float(os.environ.get("MIXFINDER_MEMORY_MB", "256"))  # per worker process
+SPILL_ENTRY_BYTES = 160  # one buffered successor: dict slot, int key and record
+SPILL_READ_RECORDS = 4096  # records per read when streaming a file
+_SPILL_FORMAT = 2  # record layout, part of the spill key
+_SPILL_COST = struct.Struct(">d")
+
+def spill_key(rules, starts, costs):
+    import hashlib
+
+    payload = json.dumps([_SPILL_FORMAT, rules.fingerprint, list(costs), sorted(map(list, starts))])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def _read_spill(path, size):
+    """Stream the size-byte records of a spill file."""
+    with open(path, "rb") as handle:
+        while True:
+            block = handle.read(size * SPILL_READ_RECORDS)
+            if not block:
+                return
+            for offset in range(0, len(block), size):
+                yield block[offset:offset + size]
+
+def _write_spill(path, records):
+    # Written aside and renamed, so a file that exists is complete
+    with open(path + ".tmp", "wb") as handle:
+        for record in records:
+            handle.write(record)
+    os.replace(path + ".tmp", path)
+
+def _unseen_records(merged, seen, width):
+    """The first record per state of a sorted stream, minus the states in the sorted stream seen."""
+    last = None
+    current = next(seen, None)
+    for record in merged:
+        mask = record[:width]
+        if mask == last:
+            continue
+        last = mask
+        while current is not None and current[:width] < mask:
+            current = next(seen, None)
+        if current is None or current[:width] != mask:
+            yield record
+
+def external_shortest_search(rules, starts, desired, max_depth, progress, bound, telemetry=None,
+                             spill_dir=None, memory_mb=None, costs=None):
+    """shortest_search with its levels on disk and its memory capped at memory_mb.
+
+    Picks up the completed levels of an interrupted search from the same
+    start labels under the same ruleset and ``costs``; the files are removed
+    once the search finishes. Returns (mask, path) of the cheapest goal state
+    (the smallest on a tie) on the shallowest level that has one.
+    """
+    import shutil
+
+    if costs is None:
+        costs = [0] * len(rules.ingredients)
+    width = rules.nbytes
+    size = 2 * width + _SPILL_COST.size + 1
+    parent_at = width + _SPILL_COST.size
+    key = spill_key(rules, starts, costs)
+    directory = os.path.join(spill_dir or SPILL_DIR, key[:16])
+    manifest_path = os.path.join(directory, "manifest.json")
+    capacity = max(1, int((memory_mb or SPILL_MEMORY_MB) * 2 ** 20) // SPILL_ENTRY_BYTES)
+    depth = len(starts[0][2])
+    start_labels = {}  # mask bytes -> (cost, path) of the cheapest start label
+    for mask, cost, path in starts:
+        mask = mask.to_bytes(width, "big")
+        if mask not in start_labels or cost < start_labels[mask][0]:
+            start_labels[mask] = (cost, path)
+    ingredient_bytes = [bytes((index,)) for index in range(len(rules.ingredients))]
+    os.makedirs(directory, exist_ok=True)
+
+    def level_path(level):
+        return os.path.join(directory, f"level-{level:03d}.bin")
+
+    def save_manifest(levels):
+        with open(manifest_path + ".tmp", "w", encoding="utf-8") as handle:
+            json.dump({"key": key, "levels": levels}, handle)
+        os.replace(manifest_path + ".tmp", manifest_path)
+
+    def find_goal(level):
+        best = None
+        for record in _read_spill(level_path(level), size):
+            if int.from_bytes(record[:width], "big") & desired == desired and (
+                    best is None or record[width:parent_at] < best[width:parent_at]):
+                best = record
+        return best
+
+    def lookup(level, mask):
+        with open(level_path(level), "rb") as handle, \
+                mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            low, high = 0, len(data) // size
+            while low < high:
+                middle = (low + high) // 2
+                if data[middle * size:middle * size + width] < mask:
+                    low = middle + 1
+                else:
+                    high = middle
+            return data[low * size:(low + 1) * size]
+
+    def answer(record, level):
+        bound.offer(depth=depth + level)
+        mask = int.from_bytes(record[:width], "big")
+        path = []
+        for parent_level in range(level - 1, -1, -1):
+            path.append(record[-1])
+            record = lookup(parent_level, record[parent_at:parent_at + width])
+        path.reverse()
+        return mask, start_labels[record[:width]][1] + path
+
+    def search():
+        levels = 0
+        try:
+            with open(manifest_path, encoding="utf-8") as handle:
+                manifest = json.load(handle)
+            if manifest["key"] == key and all(os.path.exists(level_path(level)) for level in range(manifest["levels"])):
+                levels = manifest["levels"]
+        except (OSError, ValueError, KeyError):
+            pass
+        if not levels:
+            # Start labels are their own parents
+            _write_spill(level_path(0), sorted(mask + _SPILL_COST.pack(cost) + mask + bytes((NO_INGREDIENT,))
+                                               for mask, (cost, _) in start_labels.items()))
+            levels = 1
+            save_manifest(levels)
+
+        # Levels finished before an interruption are only scanned
+        limit = min(max_depth, bound.depth())
+        for level in range(levels):
+            if depth + level > limit:
+                return None
+            hit = find_goal(level)
+            if hit is not None:
+                return answer(hit, level)
+        progress.update(discovered=os.path.getsize(level_path(levels - 1)) // size)
+
+        def spill():
+            run = os.path.join(directory, f"run-{len(runs):04d}.bin")
+            _write_spill(run, (buffer[mask] for mask in sorted(buffer)))
+            runs.append(run)
+            buffer.clear()
+
+        while depth + levels - 1 < limit:
+            runs = []
+            buffer = {}  # successor mask -> its record
+            frontier = 0
+            for record in _read_spill(level_path(levels - 1), size):
+                frontier += 1
+                if frontier % 1000 == 0:
+                    progress.update(done=1000)
+                parent = record[:width]
+                cost = _SPILL_COST.unpack_from(record, width)[0]
+                # _expand rather than successors: the transition cache would outgrow the budget
+                for index, new_mask in enumerate(rules._expand(int.from_bytes(parent, "big"))):
+                    new_record = (new_mask.to_bytes(width, "big") + _SPILL_COST.pack(cost + costs[index]) + parent
+                                  + ingredient_bytes[index])
+                    if new_mask not in buffer or new_record < buffer[new_mask]:
+                        buffer[new_mask] = new_record
+                if len(buffer) >= capacity:
+                    spill()
+            if buffer or not runs:
+                spill()
+            progress.update(done=frontier % 1000)
+
+            merged = heapq.merge(*(_read_spill(run, size) for run in runs))
+            seen = heapq.merge(*(_read_spill(level_path(level), size) for level in range(levels)))
+            _write_spill(level_path(levels), _unseen_records(merged, seen, width))
+            for run in runs:
+                os.remove(run)
+            levels += 1
+            save_manifest(levels)
+
+            new = os.path.getsize(level_path(levels - 1)) // size
+            progress.update(discovered=new)
+            if telemetry is not None:
+                telemetry.record(depth + levels - 2, frontier, frontier * len(rules.ingredients), new,
+                                 runs=len(runs), spilled_bytes=sum(
+                                     os.path.getsize(level_path(level)) for level in range(levels)))
+            if not new:
+                break
+            hit = find_goal(levels - 1)
+            if hit is not None:
+                return answer(hit, levels - 1)
+            limit = min(max_depth, bound.depth())
+        return None
+
+    found = search()
+    # Done, found or not: the levels can be huge. An interrupted or failed
+    # search never gets here and leaves them, with the manifest, to resume.
+    shutil.rmtree(directory, ignore_errors=True)
+    return found
+
+# Search telemetry
+# Opt-in per-level counters for the BFS and profit searches: frontier size,
+# transitions generated, new states (the rest were dedup hits against the
+# visited table), time per level and the visited table's size. Searches take
+# telemetry=None and only touch it at level boundaries, so it stays compiled
+# in at the cost of a None check. Dispatchers given a QueryTelemetry run
+# their tasks through traced_task and merge the records, adding when each
+# task was queued, ran and came back, so pool and IPC time show up too.
+class SearchTelemetry:
+    """Per-level counters of one search task, recorded as each level is expanded."""
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.started = time.time()
+        self.mark = time.perf_counter()
+        self.levels = []
+        self.depth_offset = 0  # for searches that count depth from their own start labels
+
+    def record(self, depth, frontier, generated, new, visited=None, **extra):
+        """Close the level expanded since the previous record (or the start)."""
+        now = time.perf_counter()
+        seconds = now - self.mark
+        level = {
+            "depth": depth + self.depth_offset,
+            "frontier": frontier,
+            "generated": generated,
+            "new": new,
+            "dedup_hit_rate": 1 - new / generated if generated else 0.0,
+            "seconds": seconds,
+            "transitions_per_sec": generated / seconds if seconds else 0.0,
+            "start": time.time() - seconds,
+        }
+        if visited is not None:
+            # The hash table (or array) itself, not the ints it points to
+            level["visited"] = len(visited)
+            level["visited_bytes"] = getattr(visited, "nbytes", None) or sys.getsizeof(visited)
+        level.update(extra)
+        self.levels.append(level)
+        self.mark = time.perf_counter()
+
+    def finish(self):
+        return {"pid": self.pid, "started": self.started, "finished": time.time(), "levels": self.levels}
+
+def traced_task(worker, args):
+    """Run a worker with telemetry; returns (result, telemetry record)."""
+    telemetry = SearchTelemetry()
+    return worker(args, telemetry=telemetry), telemetry.finish()
+
+class QueryTelemetry:
+    """Telemetry of one dispatcher call: parent phases plus every task's levels.
+
+    Exported with to_json() (per-depth totals and the raw records) or as a
+    Chrome trace (chrome://tracing, Perfetto) with write_chrome_trace().
+    """
+
+    def __init__(self, label="query"):
+        self.label = label
+        self.pid = os.getpid()
+        self.started = time.time()
+        self.phases = []  # (name, start, end) in the parent
+        self.tasks = []
+        self.dispatched = None
+
+    def phase(self, name, start):
+        self.phases.append((name, start, time.time()))
+
+    def worker(self, worker):
+        """The callable to submit in place of worker."""
+        import functools
+
+        self.dispatched = time.time()
+        return functools.partial(traced_task, worker)
+
+    def task_done(self, label, traced):
+        """Record a traced_task result as it arrives; returns the worker's own result."""
+        result, record = traced
+        record.update(label=label, dispatched=self.dispatched, received=time.time())
+        self.tasks.append(record)
+        return result
+
+    def by_depth(self):
+        """Levels summed over tasks, per search phase and depth."""
+        totals = {}
+        for task in self.tasks:
+            for level in task["levels"]:
+                key = (level.get("phase", "forward"), level["depth"])
+                total = totals.setdefault(key, {
+                    "phase": key[0], "depth": key[1], "tasks": 0, "frontier": 0, "generated": 0, "new": 0,
+                    "seconds": 0.0, "visited_bytes": 0,
+                })
+                total["tasks"] += 1
+                for name in ("frontier", "generated", "new", "seconds"):
+                    total[name] += level[name]
+                total["visited_bytes"] = max(total["visited_bytes"], level.get("visited_bytes", 0))
+        for total in totals.values():
+            total["dedup_hit_rate"] = 1 - total["new"] / total["generated"] if total["generated"] else 0.0
+            total["transitions_per_sec"] = total["generated"] / total["seconds"] if total["seconds"] else 0.0
+        return [totals[key] for key in sorted(totals)]
+
+    def to_json(self):
+        finished = max([end for _, _, end in self.phases] + [task["received"] for task in self.tasks],
+                       default=time.time())
+        return {
+            "label": self.label,
+            "seconds": finished - self.started,
+            "phases": [{"name": name, "seconds": end - start} for name, start, end in self.phases],
+            "tasks": len(self.tasks),
+            "worker_seconds": sum(task["finished"] - task["started"] for task in self.tasks),
+            "queue_seconds": sum(task["started"] - task["dispatched"] for task in self.tasks),
+            "return_seconds": sum(task["received"] - task["finished"] for task in self.tasks),
+            "by_depth": self.by_depth(),
+            "task_records": self.tasks,
+        }
+
+    def trace_events(self):
+        """Chrome trace events: parent phases, then one row per worker with its tasks and levels."""
+        def micros(seconds):
+            return round(seconds * 1e6)
+
+        events = [{"name": name, "cat": "parent", "ph": "X", "pid": self.pid, "tid": 0,
+                   "ts": micros(start), "dur": micros(end - start), "args": {"query": self.label}}
+                  for name, start, end in self.phases]
+        for task in self.tasks:
+            events.append({"name": task["label"], "cat": "task", "ph": "X", "pid": task["pid"], "tid": 0,
+                           "ts": micros(task["started"]), "dur": micros(task["finished"] - task["started"]),
+                           "args": {"query": self.label, "queued_ms": (task["started"] - task["dispatched"]) * 1000,
+                                    "return_ms": (task["received"] - task["finished"]) * 1000}})
+            for level in task["levels"]:
+                events.append({"name": f"{level.get('phase', 'forward')} depth {level['depth']}", "cat": "level",
+                               "ph": "X", "pid": task["pid"], "tid": 0, "ts": micros(level["start"]),
+                               "dur": micros(level["seconds"]),
+                               "args": {key: value for key, value in level.items() if key != "start"}})
+        return events
+
+    def write_chrome_trace(self, path):
+        write_chrome_trace([self], path)
+
+def write_chrome_trace(telemetries, path):
+    """Write the trace events of several QueryTelemetry objects as one Chrome trace file."""
+    events = [event for telemetry in telemetries for event in telemetry.trace_events()]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+# Progress reporting
+# Every pool process owns two uint64 counters in a shared array: states done
+# and states discovered (queued for expansion). Workers bump their own slot
+# with plain stores, so there is no IPC on the hot path, and the parent
+# samples the sums at a fixed rate. Discovered states give the bar a real
+# total that grows as the frontier does.
+PROGRESS_INTERVAL = 0.1  # seconds between progress samples
+
+_worker_counters = None  # (shared array, slot) inside a pool process
+_worker_bound = None  # SharedBound of the pool this process belongs to
+
+def _attach_progress_board(counters, next_slot, bound):
+    global _worker_counters, _worker_bound
+    with next_slot.get_lock():
+        slot = next_slot.value % (len(counters) // 2)
+        next_slot.value += 1
+    _worker_counters = (counters, slot)
+    _worker_bound = bound
+
+class TaskProgress:
+    """Progress of one task: counted locally and mirrored to the worker's shared slot."""
+
+    def __init__(self, counters=None, slot=0):
+        self.counters = counters
+        self.done_index = 2 * slot
+        self.discovered_index = 2 * slot + 1
+        self.done = 0
+        self.discovered = 0
+
+    @classmethod
+    def for_worker(cls):
+        if _worker_counters is None:
+            return cls()
+        return cls(*_worker_counters)
+
+    def update(self, done=0, discovered=0):
+        self.done += done
+        self.discovered += discovered
+        if self.counters is not None:
+            self.counters[self.done_index] += done
+            self.counters[self.discovered_index] += discovered
+
+class SharedBound:
+    """Shallowest depth and lowest cost of any answer found so far by the pool.
+
+    Tasks publish answers with offer() and poll depth()/cost() (every 1000
+    states, so a stale read only costs a little extra work) to stop expanding
+    past them. cancel() drops both below anything reachable, which stops
+    every polling task.
+    """
+
+    def __init__(self, depth=float('inf'), cost=float('inf')):
+        import multiprocessing
+
+        self.values = multiprocessing.Array('d', [depth, cost], lock=False)
+        self.lock = multiprocessing.Lock()
+
+    @classmethod
+    def for_worker(cls):
+        return _worker_bound or cls()
+
+    def depth(self):
+        return self.values[0]
+
+    def cost(self):
+        return self.values[1]
+
+    def offer(self, depth=float('inf'), cost=float('inf')):
+        with self.lock:
+            self.values[0] = min(self.values[0], depth)
+            self.values[1] = min(self.values[1], cost)
+
+    def cancel(self):
+        self.offer(-1, float('-inf'))
+
+    def cancelled(self):
+        return self.values[0] < 0
+
+    def reset(self, depth=float('inf'), cost=float('inf')):
+        with self.lock:
+            self.values[0] = depth
+            self.values[1] = cost
+
+class ProgressBoard:
+    """Shared per-worker counters for a process pool, sampled by the parent."""
+
+    def __init__(self, workers=None):
+        import multiprocessing
+
+        self.workers = workers or os.cpu_count() or 1
+        self.counters = multiprocessing.Array('Q', 2 * self.workers, lock=False)
+        self.next_slot = multiprocessing.Value('i', 0)
+
+    def executor(self, bound):
+        from concurrent.futures import ProcessPoolExecutor
+
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=_attach_progress_board,
+                                   initargs=(self.counters, self.next_slot, bound))
+
+    def totals(self):
+        counters = self.counters[:]
+        return sum(counters[0::2]), sum(counters[1::2])
+
+    def follow(self, futures, pbar):
+        """Drive pbar from the counters, yielding each future as it finishes."""
+        from concurrent.futures import wait
+
+        start_done, start_discovered = self.totals()
+        pending = futures
+        while pending:
+            finished, pending = wait(pending, timeout=PROGRESS_INTERVAL)
+            done, discovered = self.totals()
+            pbar.total = max(discovered - start_discovered, done - start_done)
+            pbar.n = done - start_done
+            pbar.refresh()
+            yield from finished
+
+class WorkerPool:
+    """A process pool kept warm across queries, with its progress board and shared bound.
+
+    Solvers take an optional pool; without one, each call spins up its own.
+    Runs on a pool take turns, each using every worker, so several threads
+    may share one pool (as the query server does).
+    """
+
+    def __init__(self, workers=None, show_progress=True):
+        import threading
+
+        self.board = ProgressBoard(workers)
+        self.bound = SharedBound()
+        self.executor = self.board.executor(self.bound)
+        self.show_progress = show_progress
+        self.lock = threading.Lock()  # one run at a time owns the bound
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.executor.shutdown(cancel_futures=True)
+
+    def run(self, worker, tasks, desc, depth=float('inf'), cost=float('inf')):
+        """Run worker over tasks with a live progress bar; results in task order."""
+        results = [None] * len(tasks)
+        for index, result in self.run_iter(worker, tasks, desc, depth, cost):
+            results[index] = result
+        return results
+
+    def run_iter(self, worker, tasks, desc, depth=float('inf'), cost=float('inf')):
+        """Yield (task index, result) as each task finishes.
+
+        The bound starts at (depth, cost). If the run is interrupted, fails or
+        is closed early, the bound is cancelled and the tasks still running
+        are waited out (they stop at their next poll), so they cannot pick
+        up the next run's bound.
+        """
+        from concurrent.futures import wait
+
+        with self.lock:
+            self.bound.reset(depth, cost)
+            futures = [self.executor.submit(worker, task) for task in tasks]
+            index_of = {future: index for index, future in enumerate(futures)}
+            if self.show_progress:
+                from tqdm import tqdm
+                bar = tqdm(total=0, desc=desc, unit=" states", ncols=80)
+            else:
+                bar = _QuietBar()
+            try:
+                with bar as pbar:
+                    for future in self.board.follow(futures, pbar):
+                        yield index_of[future], future.result()
+            except BaseException:
+                self.bound.cancel()
+                for future in futures:
+                    future.cancel()
+                wait(futures)
+                raise
+
+    def warm_up(self):
+        """Start every worker and load the rules in it, ahead of the first query."""
+        futures = [self.executor.submit(compile_rules_in_worker) for _ in range(self.board.workers)]
+        for future in futures:
+            future.result()
+
+def compile_rules_in_worker():
+    compile_rules()
+
+class _QuietBar:
+    """Stands in for tqdm when progress is hidden, so tqdm is never imported."""
+    total = n = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def refresh(self):
+        pass
+
+def run_tasks(worker, tasks, desc, pool=None, depth=float('inf')):
+    """WorkerPool.run on ``pool``, or on a pool of its own for this call."""
+    if pool is not None:
+        return pool.run(worker, tasks, desc, depth)
+    with WorkerPool() as pool:
+        return pool.run(worker, tasks, desc, depth)
+
+def run_tasks_iter(worker, tasks, desc, pool=None, depth=float('inf')):
+    """WorkerPool.run_iter on ``pool``, or on a pool of its own for this call."""
+    if pool is not None:
+        yield from pool.run_iter(worker, tasks, desc, depth)
+        return
+    with WorkerPool() as pool:
+        yield from pool.run_iter(worker, tasks, desc, depth)
+
+# Work sharding
+# Rather than one task per base, each base's search is expanded in the parent
+# to the shallowest depth with enough states and that frontier is split into
+# shards, so a single-base query still uses every core. There are several
+# shards per core so the pool can balance subtrees of uneven size.
+SHARDS_PER_WORKER = 4
+
+def plan_shards(rules, base_effects, max_depth, shard_count, costs=None, blocked=0, budget=float('inf'),
+                revisit=True):
+    """Expand a base to the shallowest depth with at least shard_count states.
+
+    Returns (shallow, frontier): every label above the split depth in BFS
+    order, and the labels at the split depth, both as (mask, cost, path).
+    With costs and ``revisit``, labels are kept by the profit DP's cost
+    dominance; otherwise a state is kept on the level it is first reached
+    at, with its cheapest path there, as in the BFS. Labels holding
+    ``blocked`` effects or costing over ``budget`` are dropped, as the
+    searches would.
+    """
+    start = rules.mask_of(base_effects)
+    if start & blocked:
+        return [], []
+    best_cost = {start: 0}
+    shallow = []
+    frontier = [(start, 0, [])]
+    depth = 0
+
+    while len(frontier) < shard_count and depth < max_depth:
+        shallow.extend(frontier)
+        next_frontier = {}
+        for mask, cost, path in frontier:
+            for index, new_mask in enumerate(rules.successors(mask)):
+                new_cost = cost + costs[index] if costs else 0
+                if not (costs and revisit) and new_mask in best_cost and (
+                        new_mask not in next_frontier or new_cost >= best_cost[new_mask]):
+                    continue
+                if costs and revisit and new_cost >= best_cost.get(new_mask, float('inf')):
+                    continue
+                if new_mask & blocked or new_cost > budget:
+                    continue
+                best_cost[new_mask] = new_cost
+                next_frontier[new_mask] = (new_mask, new_cost, path + [index])
+        frontier = list(next_frontier.values())
+        depth += 1
+
+    return shallow, frontier
+
+def split_shards(frontier, shard_count):
+    count = min(shard_count, len(frontier))
+    return [frontier[i::count] for i in range(count)]
+
+def shard_count():
+    return (os.cpu_count() or 1) * SHARDS_PER_WORKER
+
+# Multi-process BFS dispatcher
+def bfs_solver_multiprocessing(desired_effects, starting_product_choice, max_depth=16, engine=SEARCH_ENGINE,
+                               pool=None, telemetry=None, constraints=None):
+    start_time = time.time()
+    filtered_products = filter_base_products(starting_product_choice)
+    constraints = constraints or MixConstraints()
+    max_depth = constraints.depth(max_depth)
+    task_rules = constraints.rules()
+    rules = compile_rules(task_rules)
+    if any(effect not in rules.bit for effect in desired_effects):
+        return None
+    desired = rules.mask_of(desired_effects)
+    limits = constraints.limits(rules)
+    forbidden = limits["forbidden"]
+    costs = [ingredient_costs.get(ing, 0) for ing in rules.ingredients]
+
+    # Bases with a prebuilt graph are answered by lookup when the graph is
+    # deep enough to decide, and the shallow levels expanded while planning
+    # shards are checked here; only the rest need BFS workers.
+    results = []
+    pending = []
+    for base, effects in filtered_products.items():
+        graph = None if constraints.narrowed else load_state_graph(effects)
+        if graph is not None:
+            decided, result = graph_shortest(graph, base, desired_effects, max_depth)
+            if decided:
+                if result:
+                    results.append(result)
+                continue
+
+        shallow, frontier = plan_shards(rules, effects, max_depth, shard_count(), costs, limits["blocked"],
+                                        limits["budget"], revisit=limits["budget"] < float('inf'))
+        hit = min((label for label in shallow + frontier if label[0] & desired == desired and not label[0] & forbidden),
+                  key=lambda label: (len(label[2]), label[1]), default=None)
+        if hit is not None:
+            mask, _, path = hit
+            results.append({
+                "base": base,
+                "effects": rules.effects_of(mask),
+                "path": [rules.ingredients[i] for i in path],
+            })
+            continue
+        if frontier:
+            pending.append((base, frontier))
+
+    # Workers stop past the shallowest answer found anywhere so far. A base
+    # whose shards start at or below it can only tie, and its frontier had no
+    # hit, so it is not searched at all.
+    found_depth = min((len(res["path"]) for res in results), default=float('inf'))
+    tasks = [
+        (engine, base, shard, desired_effects, max_depth, task_rules, constraints)
+        for base, frontier in pending if len(frontier[0][2]) < found_depth
+        for shard in split_shards(frontier, shard_count())
+    ]
+    if telemetry is not None:
+        telemetry.phase("plan", start_time)
+    if tasks and telemetry is not None:
+        start_time = time.time()
+        for index, traced in run_tasks_iter(telemetry.worker(bfs_worker_shard), tasks, "🔬 Finding your mix...",
+                                            pool, found_depth):
+            res = telemetry.task_done(f"{tasks[index][1]} shard {index}", traced)
+            if res:
+                results.append(res)
+        telemetry.phase("search", start_time)
+    elif tasks:
+        results.extend(res for res in run_tasks(bfs_worker_shard, tasks, "🔬 Finding your mix...", pool, found_depth)
+                       if res)
+
+    # Globally shortest, then cheapest, then the first base in menu order
+    order = list(filtered_products)
+    return min(results, default=None, key=lambda res: (
+        len(res["path"]), sum(ingredient_costs.get(i, 0) for i in res["path"]), order.index(res["base"])))
+
+# Cheapest-recipe search (A*)
+# Weighted variant of mode 1: minimises total ingredient cost rather than the
+# ingredient count, so a longer but cheaper path to an effect set can win.
+def intro_costs(rules, costs):
+    """Cost of the cheapest ingredient able to introduce each effect (inf if none can)."""
+    cheapest = [float('inf')] * len(rules.effects)
+    for introduced, cost in zip(rules.introduce_masks, costs):
+        for bit in range(len(rules.effects)):
+            if introduced >> bit & 1 and cost < cheapest[bit]:
+                cheapest[bit] = cost
+    return cheapest
+
+def astar_worker_cheapest(args, progress=None):
+    base_name, base_effects, desired_effects, max_depth, effect_rules, constraints = args
+    rules = compile_rules(effect_rules)
+
+    if any(effect not in rules.bit for effect in desired_effects):
+        return None
+    desired = rules.mask_of(desired_effects)
+    costs = [ingredient_costs.get(ing, 0) for ing in rules.ingredients]
+    cheapest = intro_costs(rules, costs)
+
+    # Every missing effect still has to be introduced by some ingredient, so the
+    # dearest of their cheapest introducers is an admissible, consistent bound.
+    def heuristic(mask):
+        missing = desired & ~mask
+        bound = 0
+        while missing:
+            low = missing & -missing
+            bound = max(bound, cheapest[low.bit_length() - 1])
+            missing ^= low
+        return bound
+
+    # Forbidden effects are checked like the goal; the budget caps f, which
+    # never overestimates, alongside the shared bound
+    limits = (constraints or MixConstraints()).limits(rules)
+    forbidden, blocked, budget = limits["forbidden"], limits["blocked"], limits["budget"]
+    progress = progress or TaskProgress.for_worker()
+    shared = SharedBound.for_worker()
+    limit = min(shared.cost(), budget)
+    start = rules.mask_of(base_effects)
+    if start & blocked:
+        return None
+    # Heap entries carry a StateTable row so paths are only rebuilt once
+    labels = StateTable(costs=False)
+    heap = [(heuristic(start), 0, 0, start, labels.add(start))]
+    settled = {}  # mask -> smallest depth expanded so far (at no greater cost)
+    queued = {start: (0, 0)}  # mask -> (cost, depth) of the cheapest queued label
+    steps = 0
+
+    while heap:
+        f, depth, cost, mask, label = heapq.heappop(heap)
+        # Labels pop in order of f, so nothing left can beat another base's answer
+        if f > limit:
+            break
+
+        # States pop in order of cost, so an earlier label at the same or a
+        # smaller depth dominates this one.
+        if settled.get(mask, max_depth + 1) <= depth:
+            continue
+        settled[mask] = depth
+
+        steps += 1
+        if steps % 1000 == 0:
+            progress.update(done=1000, discovered=len(heap))
+            limit = min(shared.cost(), budget)
+
+        if mask & desired == desired and not mask & forbidden:
+            progress.update(done=steps % 1000)
+            shared.offer(cost=cost)
+            return {
+                "base": base_name,
+                "effects": rules.effects_of(mask),
+                "path": [rules.ingredients[i] for i in labels.path_to(label)[1]],
+            }
+
+        if depth >= max_depth:
+            continue
+
+        for index, new_mask in enumerate(rules.successors(mask)):
+            new_cost = cost + costs[index]
+            if settled.get(new_mask, max_depth + 1) <= depth + 1 or new_mask & blocked:
+                continue
+            best = queued.get(new_mask)
+            if best is not None and best[0] <= new_cost and best[1] <= depth + 1:
+                continue
+            bound = heuristic(new_mask)
+            if bound == float('inf'):
+                continue
+            if best is None or new_cost < best[0]:
+                queued[new_mask] = (new_cost, depth + 1)
+            heapq.heappush(heap, (new_cost + bound, depth + 1, new_cost, new_mask,
+                                  labels.add(new_mask, label, index, depth + 1)))
+
+    progress.update(done=steps % 1000)
+    return None
+
+def astar_solver_multiprocessing(desired_effects, starting_product_choice, max_depth=16, pool=None,
+                                 constraints=None):
+    """Cheapest recipe containing every desired effect, across the chosen bases, within ``constraints``."""
+    filtered_products = filter_base_products(starting_product_choice)
+    constraints = constraints or MixConstraints()
+    args_list = [
+        (base, effects, desired_effects, constraints.depth(max_depth), constraints.rules(), constraints)
+        for base, effects in filtered_products.items()
+    ]
+
+    best = None
+    best_key = None
+    for res in run_tasks(astar_worker_cheapest, args_list, "🪙 Finding the cheapest mix...", pool):
+        if res:
+            key = (sum(ingredient_costs.get(i, 0) for i in res["path"]), len(res["path"]))
+            if best_key is None or key < best_key:
+                best, best_key = res, key
+    return best
+
+# Vectorized level-synchronous engine (optional, needs NumPy)
+# Each BFS level is a uint64 array of effect masks; all ingredients are applied
+# to the whole frontier with byte-table gathers and levels are deduped by
+# sorting, so the hot loop runs in NumPy instead of the interpreter.
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("The numpy engine needs NumPy: pip install numpy") from None
+    return numpy
+
+class FrontierKernel:
+    """Applies every ingredient to a whole array of uint64 masks at once."""
+
+    def __init__(self, rules):
+        np = _numpy()
+        if len(rules.effects) > 64:
+            raise ValueError("The numpy engine stores effect sets as uint64; this ruleset has more than 64 effects")
+        self.np = np
+        self.tables = np.array(rules.replace_tables, dtype=np.uint64)  # (ingredient, byte, 256)
+        self.add_masks = np.array(rules.add_masks, dtype=np.uint64)
+        # As in CompiledRules._add, for rules that add more than one effect
+        self.add_bits = rules.add_bits if rules.multi_add else None
+        self.source_masks = np.array(rules.source_masks, dtype=np.uint64)
+        self.max_effects = rules.max_effects
+        self.popcount8 = np.array([bin(value).count("1") for value in range(256)], dtype=np.int64)
+
+    @classmethod
+    def for_rules(cls, rules):
+        kernel = getattr(rules, "frontier_kernel", None)
+        if kernel is None:
+            kernel = rules.frontier_kernel = cls(rules)
+        return kernel
+
+    def expand(self, masks):
+        """Return an (ingredients, len(masks)) array of successor masks."""
+        np = self.np
+        chunks = [((masks >> np.uint64(offset)) & np.uint64(0xFF)).astype(np.intp)
+                  for offset in range(0, self.tables.shape[1] * 8, 8)]
+        counts = sum(self.popcount8[chunk] for chunk in chunks)
+        room = counts < self.max_effects
+
+        successors = np.empty((len(self.tables), len(masks)), dtype=np.uint64)
+        for index, tables in enumerate(self.tables):
+            new_masks = tables[0][chunks[0]]
+            for table, chunk in zip(tables[1:], chunks[1:]):
+                new_masks |= table[chunk]
+            if self.add_bits is None:
+                new_masks[room] |= self.add_masks[index]
+            else:
+                taken = counts.copy()
+                replaced = masks & self.source_masks[index]
+                for bit in self.add_bits[index]:
+                    flag = np.uint64(1 << bit)
+                    add = (((new_masks & flag) == 0) | ((replaced & flag) != 0)) & (taken < self.max_effects)
+                    new_masks[add] |= flag
+                    taken += add
+            successors[index] = new_masks
+        return successors
+
+    def multipliers(self, masks, bit_values, chunk_size=1 << 20):
+        """1 + (bit columns of masks) . (multiplier per bit), in bounded-size chunks."""
+        np = self.np
+        weights = np.asarray(bit_values, dtype=np.float64)
+        result = np.empty(len(masks), dtype=np.float64)
+        for start in range(0, len(masks), chunk_size):
+            block = masks[start:start + chunk_size].astype("<u8")
+            bits = np.unpackbits(block.view(np.uint8).reshape(-1, 8), axis=1, bitorder="little")
+            result[start:start + chunk_size] = 1.0 + bits[:, :len(weights)] @ weights
+        return result
+
+def _sorted_lookup(np, sorted_values, values):
+    """Positions of values in a sorted array and whether each is present."""
+    positions = np.searchsorted(sorted_values, values)
+    clipped = np.minimum(positions, max(len(sorted_values) - 1, 0))
+    found = (positions < len(sorted_values)) & (sorted_values[clipped] == values)
+    return clipped, found
+
+def _level_path(levels, index):
+    """Walk per-level parent arrays back to a start; returns (start index, path)."""
+    path = []
+    for parents, ingredients in reversed(levels):
+        path.append(int(ingredients[index]))
+        index = parents[index]
+    path.reverse()
+    return int(index), path
+
+def numpy_shortest_search(rules, starts, desired, max_depth, progress, bound, telemetry=None, costs=None):
+    """Vectorized shortest_search: returns (mask, path) of the cheapest shortest recipe, or None.
+
+    Each new state keeps its cheapest parent on the level (ties go to the
+    first in parent order), as in shortest_search.
+    """
+    np = _numpy()
+    kernel = FrontierKernel.for_rules(rules)
+    desired = np.uint64(desired)
+    ingredient_prices = np.array(costs if costs is not None else [0] * len(rules.ingredients), dtype=np.float64)
+    start_masks = np.array([mask for mask, _, _ in starts], dtype=np.uint64)
+    start_costs = np.array([cost for _, cost, _ in starts], dtype=np.float64)
+    order = np.lexsort((start_costs, start_masks))
+    frontier, first = np.unique(start_masks[order], return_index=True)
+    first = order[first]
+    prefixes = [starts[i][2] for i in first]
+    frontier_costs = start_costs[first]
+    visited = frontier.copy()
+    levels = []  # per depth: (parent index, ingredient index) for each frontier mask
+    width = len(rules.ingredients)
+    progress.update(discovered=len(frontier))
+
+    for depth in range(len(starts[0][2]), max_depth + 1):
+        limit = min(max_depth, bound.depth())
+        if depth > limit:
+            break
+        progress.update(done=len(frontier))
+
+        hits = np.flatnonzero(frontier & desired == desired)
+        if hits.size:
+            bound.offer(depth=depth)
+            hit = hits[np.argmin(frontier_costs[hits])]
+            origin, path = _level_path(levels, hit)
+            return int(frontier[hit]), prefixes[origin] + path
+        if depth >= limit:
+            break
+
+        # Transposed so the flat index is parent * ingredients + ingredient;
+        # sorting by (mask, cost) puts each state's cheapest label first
+        children = kernel.expand(frontier).T.ravel()
+        child_costs = (frontier_costs[:, None] + ingredient_prices[None, :]).ravel()
+        order = np.lexsort((child_costs, children))
+        masks, first = np.unique(children[order], return_index=True)
+        first = order[first]
+        _, seen = _sorted_lookup(np, visited, masks)
+        masks, first = masks[~seen], first[~seen]
+        if telemetry is not None:
+            telemetry.record(depth, len(frontier), children.size, masks.size, visited)
+        if not masks.size:
+            break
+
+        levels.append((first // width, first % width))
+        visited = np.union1d(visited, masks)
+        frontier = masks
+        frontier_costs = child_costs[first]
+        progress.update(discovered=len(frontier))
+
+    return None
+
+def numpy_profit_search(rules, starts, max_depth, base_price, costs, bit_values, progress, top=None,
+                        cancelled=None, telemetry=None, reached=None):
+    """Vectorized profit_search: the same (state, depth) cost-dominance DP, a level at a time.
+
+    ``starts`` maps start masks to costs, ``reached`` is as for profit_search.
+    Returns the labels ranked in ``top`` as (profit, mask, start mask, path),
+    best first.
+    """
+    np = _numpy()
+    kernel = FrontierKernel.for_rules(rules)
+    costs = np.asarray(costs, dtype=np.float64)
+    width = len(rules.ingredients)
+
+    frontier = np.array(sorted(starts), dtype=np.uint64)
+    frontier_costs = np.array([starts[int(mask)] for mask in frontier], dtype=np.float64)
+    origins = frontier
+    reached = {**(reached or {}), **starts}
+    best_masks = np.array(sorted(reached), dtype=np.uint64)  # cheapest cost at any depth, sorted
+    best_costs = np.array([reached[int(mask)] for mask in best_masks], dtype=np.float64)
+    if top is None:
+        top = TopMixes()
+
+    def rank_level(masks, profits, depth):
+        # Only labels that beat the current k-th best reach the Python heap
+        candidates = np.flatnonzero(profits > top.threshold())
+        if candidates.size > top.k:
+            candidates = candidates[np.argpartition(-profits[candidates], top.k - 1)[:top.k]]
+        for index in candidates[np.lexsort((candidates, -profits[candidates]))]:
+            top.offer(float(profits[index]), int(masks[index]), depth, int(index))
+
+    rank_level(frontier, base_price * kernel.multipliers(frontier, bit_values) - frontier_costs, 0)
+    levels = []
+    progress.update(discovered=len(frontier))
+
+    for depth in range(1, max_depth + 1):
+        if cancelled is not None and cancelled():
+            break
+        progress.update(done=len(frontier))
+        children = kernel.expand(frontier).T.ravel()
+        child_costs = (frontier_costs[:, None] + costs[None, :]).ravel()
+
+        # Cheapest label per mask within the level...
+        order = np.lexsort((child_costs, children))
+        sorted_masks = children[order]
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = sorted_masks[1:] != sorted_masks[:-1]
+        picks = order[first]
+        masks, mask_costs = children[picks], child_costs[picks]
+
+        # ...that also beats every label for it at a smaller depth
+        positions, found = _sorted_lookup(np, best_masks, masks)
+        keep = ~found | (mask_costs < best_costs[positions])
+        masks, mask_costs, picks = masks[keep], mask_costs[keep], picks[keep]
+        positions, found = positions[keep], found[keep]
+        if telemetry is not None:
+            telemetry.record(depth - 1, len(frontier), children.size, masks.size, best_masks)
+        if not masks.size:
+            break
+
+        best_costs[positions[found]] = mask_costs[found]
+        best_masks = np.concatenate((best_masks, masks[~found]))
+        best_costs = np.concatenate((best_costs, mask_costs[~found]))
+        merged = np.argsort(best_masks, kind="stable")
+        best_masks, best_costs = best_masks[merged], best_costs[merged]
+
+        rank_level(masks, base_price * kernel.multipliers(masks, bit_values) - mask_costs, depth)
+        levels.append((picks // width, picks % width))
+        frontier, frontier_costs = masks, mask_costs
+        if depth < max_depth:  # the last level is only scored, like profit_search
+            progress.update(discovered=len(masks))
+
+    mixes = []
+    for profit, mask, depth, index in top.ranked():
+        origin, path = _level_path(levels[:depth], index)
+        mixes.append((profit, mask, int(origins[origin]), path))
+    return mixes
+
+def prompt_starting_product():
+    print("\n🌱 Which starting product would you like?")
+    options = [
+        "Anything",
+        "Weed only",
+        "Meth only",
+        "Cocaine only",
+        "OG Kush",
+        "Granddaddy Purple",
+        "Green Crack"
+    ]
+
+    for i, name in enumerate(options):
+        print(f"{i}: {name}")
+    
+    while True:
+        choice = input("\nPick an option (number): ").strip()
+        if choice.isdigit() and 0 <= int(choice) < len(options):
+            return int(choice)
+        print("❌ Invalid choice. Try again.")
+
+def print_banner():
+    import pyfiglet
+
+    banner = pyfiglet.figlet_format("S1MP", font="doom")
+    print(banner)
+    print("🔬 Schedule 1 Mix Pathfinder\n")
+
+def prompt_user_for_effects():
+    import os
+
+    def clear_screen():
+        os.system('cls' if "nt" in os.name else 'clear')
+    
+    # Step 1: Build full list of all possible effects
+    all_effects = set()
+    for rule in effect_rules.values():
+        all_effects.update(effect for effect in rule.get("adds", []) if effect)
+        all_effects.update(effect for effect in rule.get("replaces", {}).values() if effect)
+
+    all_effects = sorted(all_effects)
+    selected = []
+
+    print("\n🧪 Schedule 1 Mix Selector")
+    print("Pick effects you want your product to have!\n")
+
+    while True:
+        clear_screen()
+        print_banner()
+        remaining = [e for e in all_effects if e not in selected]
+
+        if not remaining:
+            print("🎉 You've selected all known effects! Let's mix!\n")
+            break
+
+        print("Available effects:")
+        for idx, effect in enumerate(remaining):
+            mult = effect_multipliers.get(effect, 0.0)
+            print(f"{idx}: {effect} (+{mult:.2f}x)")
+        print("\nType a number, name (or part of one), or 'm' to mix.\n")
+
+        print(f"Current effects: {selected}")
+        total_multiplier = 1.0 + sum(effect_multipliers.get(e, 0.0) for e in selected)
+        print(f"\n🔢 Total effect multiplier: x{total_multiplier:.2f}")
+        choice = input("Pick an effect: ").strip().lower()
+
+        if choice in ("m", "mix"):
+            break
+
+        # Match by number
+        if choice.isdigit():
+            idx = int(choice)
+            if 0 <= idx < len(remaining):
+                selected_effect = remaining[idx]
+                selected.append(selected_effect)
+                print(f"✅ Added: {selected_effect}\n")
+                continue
+            else:
+                print("❌ That number is out of range.\n")
+                continue
+
+        # Match by partial text
+        matches = [e for e in remaining if choice in e.lower()]
+        if len(matches) == 1:
+            selected.append(matches[0])
+            print(f"✅ Added: {matches[0]}\n")
+            if len(selected) >= 8:
+                print("Maximum effects reached. Starting to mix...")
+                break
+        elif len(matches) > 1:
+            print("⚠️ Multiple matches found:")
+            for e in matches:
+                print(f" - {e}")
+            print("Please be more specific.\n")
+        else:
+            print("❌ No match found. Try again.\n")
+
+    return selected
+
+def print_debug_steps(solution, show_debug=True):
+    if not show_debug:
+        return
+
+    print("\n🔍 Debugging Mix Path...\n")
+    print(f"Start with: {solution['base']}")
+    effects = base_products[solution['base']].copy()
+
+    for i, ingredient in enumerate(solution["path"], 1):
+        effects, replaced_log, added_log = mix_step(effects, ingredient)
+
+        print(f"\nStep {i}/{len(solution['path'])}:")
+        print(f"Add: {ingredient}")
+        print("Effects replaced:")
+        if replaced_log:
+            for old, new in replaced_log:
+                print(f" - {old} → {new}")
+        else:
+            print(" (none)")
+        print("Effects gained:")
+        if added_log:
+            for eff in added_log:
+                print(f" + {eff}")
+        else:
+            print(" (none)")
+        print("All effects after adding:")
+        print(f" → {', '.join(effects)}")
+
+def pool_stats(pool, start_time):
+    """Search throughput of everything a fresh pool's workers ran since start_time."""
+    seconds = time.time() - start_time
+    states = pool.board.totals()[0]
+    return {"states": states, "seconds": seconds, "states_per_sec": states / seconds if seconds else 0.0}
+
+def interactive_session():
+    print_banner()
+    print("1. Find a mix with desired effects")
+    print("2. Find the most profitable mix")
+    print("3. Find the cheapest mix with desired effects")
+    print("4. Trade off profit, ingredient count and cost\n")
+
+    while True:
+        mode = input("Choose mode (1, 2, 3 or 4): ").strip()
+        if mode in ("1", "2", "3", "4"):
+            break
+        print("❌ Invalid choice. Please type 1, 2, 3 or 4.")
+
+    starting_choice = prompt_starting_product()
+
+    if mode in ("1", "3"):
+        desired = prompt_user_for_effects()
+        with WorkerPool() as pool:
+            start_time = time.time()
+            if mode == "1":
+                solution = bfs_solver_multiprocessing(desired, starting_choice, pool=pool)
+            else:
+                solution = astar_solver_multiprocessing(desired, starting_choice, pool=pool)
+            stats = pool_stats(pool, start_time)
+
+        if solution:
+            print("✅ Solution Found!")
+            print(f"Start with: {solution['base']}")
+            print(f"Ingredients: {' -> '.join(solution['path'])}")
+            print(f"Final Effects: {', '.join(solution['effects'])}")
+            
+            # Value/Profit Calculation
+            base_name = solution['base']
+            base_price = base_prices.get(base_name, 0)
+            ingredient_cost = sum(ingredient_costs.get(ing, 0) for ing in solution["path"])
+            total_multiplier = 1.0 + sum(effect_multipliers.get(eff, 0.0) for eff in solution["effects"])
+            final_value = base_price * total_multiplier
+            profit = final_value - ingredient_cost
+
+            print("\n💸 Final Financial Summary:")
+            print(f"🧪 Base Product: {base_name} (Recommended price: ${base_price})")
+            print(f"🧾 Ingredients Used: {', '.join(solution['path'])}")
+            print(f"💰 Ingredient Cost: ${ingredient_cost:.2f}")
+            print(f"📈 Total Multiplier: x{total_multiplier:.2f}")
+            print(f"🏷 Final Product Value: ${final_value:.2f}")
+            print(f"📊 Profit: ${profit:.2f} per baggie")
+
+            if stats["states"]:
+                print(f"⚡ Searched {stats['states']:,} states at {stats['states_per_sec']:,.0f} states/sec")
+
+            print_debug_steps(solution, show_debug=True)
+        else:
+            print("❌ No valid combination found within depth limit.")
+    
+    elif mode == "2":
+        max_ingredients = 8
+        with WorkerPool() as pool:
+            start_time = time.time()
+            solution = bfs_solver_multiprocessing_profit(starting_choice, max_depth=max_ingredients, pool=pool)
+            stats = pool_stats(pool, start_time)
+
+        if solution:
+            print("💸 Best Profit Mix Found!")
+            print(f"Start with: {solution['base']}")
+            print(f"Ingredients: {' -> '.join(solution['path'])}")
+            print(f"Final Effects: {', '.join(solution['effects'])}")
+
+            base_price = base_prices.get(solution['base'], 0)
+            ingredient_cost = sum(ingredient_costs.get(ing, 0) for ing in solution["path"])
+            total_multiplier = 1.0 + sum(effect_multipliers.get(eff, 0.0) for eff in solution["effects"])
+            final_value = base_price * total_multiplier
+            profit = final_value - ingredient_cost
+
+            print("\n💸 Final Financial Summary:")
+            print(f"🧪 Base Product: {solution['base']} (Recommended price: ${base_price})")
+            print(f"🧾 Ingredients Used: {', '.join(solution['path'])}")
+            print(f"💰 Ingredient Cost: ${ingredient_cost:.2f}")
+            print(f"📈 Total Multiplier: x{total_multiplier:.2f}")
+            print(f"🏷 Final Product Value: ${final_value:.2f}")
+            print(f"📊 Profit: ${profit:.2f}")
+
+            if stats["states"]:
+                print(f"⚡ Searched {stats['states']:,} states at {stats['states_per_sec']:,.0f} states/sec")
+
+            print_debug_steps(solution, show_debug=True)
+        else:
+            print("❌ No profitable mix found.")
+
+    elif mode == "4":
+        front = pareto_fronts(starting_choice)
+        print(f"⚖️ Pareto-optimal mixes (up to {PARETO_DEPTH} ingredients): none beats another on "
+              "profit, ingredient count and cost at once")
+        for base in dict.fromkeys(mix["base"] for mix in front):
+            print(f"\n🧪 {base}")
+            for mix in front:
+                if mix["base"] == base:
+                    financials = mix_financials(mix)
+                    print(f"  {len(mix['path'])} ingredient(s)  cost ${financials['cost']:.2f}  "
+                          f"profit ${financials['profit']:.2f}  {' -> '.join(mix['path']) or '(nothing)'}")
+
+# Headless queries
+# One query per JSON object: {"mode": "shortest" | "profit" | "cheapest" | "pareto",
+# "bases": menu number, base name or list of names (default all),
+# "effects": [...], "depth": max ingredients, "engine": "python" | "numpy" |
+# "external" (shortest queries only; profit and cheapest run in memory),
+# "id": anything echoed back}. Every query in a batch shares one warm pool.
+# Profit queries may ask for the "top": k mixes, optionally with
+# "per_effect_set": true; those stream one {"rank": n, "result": ...} record
+# per mix as soon as it is settled, then a {"done": true, "count": n} record.
+# "telemetry": true adds the search telemetry (see QueryTelemetry.to_json) to
+# the query's record. Profit queries with "prices": {"base_prices": {...},
+# "ingredient_costs": {...}, "effect_multipliers": {...}} are answered under
+# those prices by re-scoring the recipe books instead of searching, to
+# depth 6 unless given (at most 7). "pareto" queries stream the Pareto front
+# of each chosen base over profit, ingredient count and cost the same way as
+# top-k ones, to depth 7 unless given. Any query but a re-scored one may carry
+# "constraints": {"ingredients": [...] (the only ones usable), "exclude":
+# [...], "forbid": [effects], "forbid_anywhere": true (forbidden effects may
+# not appear at any step, not just in the result), "budget": max ingredient
+# cost, "max_ingredients": n}, which the searches apply as they expand.
+QUERY_MODES = {"1": "shortest", "2": "profit", "3": "cheapest", "4": "pareto"}
+QUERY_DEPTHS = {"shortest": 16, "profit": 8, "cheapest": 16, "pareto": PARETO_DEPTH}
+
+def query_mode(query):
+    mode = query.get("mode", "shortest")
+    return QUERY_MODES.get(str(mode), mode)
+
+def mix_financials(solution, prices=None):
+    bases, costs, multipliers = prices or (base_prices, ingredient_costs, effect_multipliers)
+    base_price = bases.get(solution["base"], 0)
+    cost = sum(costs.get(ing, 0) for ing in solution["path"])
+    multiplier = 1.0 + sum(multipliers.get(eff, 0.0) for eff in solution["effects"])
+    return {"cost": cost, "multiplier": multiplier, "value": base_price * multiplier,
+            "profit": base_price * multiplier - cost}
+
+def solve(query, pool=None, telemetry=None):
+    """Answer one query dict; raises ValueError if it is malformed.
+
+    Top-k profit queries return an iterator over the mixes, best first; the
+    search runs as it is consumed. Pareto queries return the front as a list.
+    Shortest and profit searches record into ``telemetry`` (a QueryTelemetry)
+    if one is given.
+    """
+    mode = query_mode(query)
+    if mode not in QUERY_DEPTHS:
+        raise ValueError(f"Unknown mode: {mode!r}")
+    unknown = set(query) - {"id", "mode", "bases", "effects", "depth", "engine", "top", "per_effect_set",
+                            "telemetry", "prices", "constraints"}
+    if unknown:
+        raise ValueError(f"Unknown query field(s): {', '.join(sorted(unknown))}")
+    if mode != "profit" and ("top" in query or "per_effect_set" in query or "prices" in query):
+        raise ValueError("Only profit queries take top / per_effect_set / prices")
+
+    bases = query.get("bases", 0)
+    menu = isinstance(bases, int) and not isinstance(bases, bool) and 0 <= bases <= 6
+    names = isinstance(bases, (list, tuple)) and all(isinstance(name, str) for name in bases)
+    if not (menu or names or isinstance(bases, str)) or not filter_base_products(bases):
+        raise ValueError(f"Unknown base selection: {bases!r}")
+    depth = query.get("depth", BOOK_DEPTH if "prices" in query else QUERY_DEPTHS[mode])
+    if isinstance(depth, bool) or not isinstance(depth, int) or depth < 0:
+        raise ValueError(f"depth must be a non-negative integer, not {depth!r}")
+    engine = query.get("engine", SEARCH_ENGINE)
+    if engine not in ("python", "numpy", "external"):
+        raise ValueError(f"Unknown engine: {engine!r}")
+    constraints = None
+    if "constraints" in query:
+        if "prices" in query:
+            raise ValueError("Re-scored (prices) queries do not take constraints")
+        constraints = MixConstraints.from_json(query["constraints"])
+
+    if mode == "profit" and "top" in query:
+        k = query["top"]
+        if isinstance(k, bool) or not isinstance(k, int) or k < 1:
+            raise ValueError(f"top must be a positive integer, not {k!r}")
+        if "prices" in query:
+            return iter(rescored_profit_mixes(bases, depth, k, bool(query.get("per_effect_set")), query["prices"]))
+        return iter_profit_mixes(bases, k, depth, bool(query.get("per_effect_set")), engine, pool, telemetry,
+                                 constraints)
+    if mode == "profit" and "prices" in query:
+        mixes = rescored_profit_mixes(bases, depth, prices=query["prices"])
+        return mixes[0] if mixes else None
+    if mode == "pareto":
+        return pareto_fronts(bases, depth, pool, telemetry, constraints)
+    if mode == "profit":
+        return bfs_solver_multiprocessing_profit(bases, depth, engine, pool, telemetry, constraints)
+    effects = query.get("effects")
+    if not effects or not isinstance(effects, list) or not all(isinstance(effect, str) for effect in effects):
+        raise ValueError(f"Mode {mode!r} needs a non-empty list of effect names")
+    unknown = [effect for effect in effects if effect not in compile_rules().bit]
+    if unknown:
+        raise ValueError(f"Unknown effect(s): {', '.join(unknown)}")
+    if mode == "shortest":
+        return bfs_solver_multiprocessing(effects, bases, depth, engine, pool, telemetry, constraints)
+    return astar_solver_multiprocessing(effects, bases, depth, pool, constraints)
+
+def solve_many(queries, pool=None, traces=None):
+    """Answer queries in order on one warm pool, yielding result records as they finish.
+
+    With a ``traces`` list, every query's QueryTelemetry is appended to it.
+    """
+    own_pool = pool is None
+    if own_pool:
+        pool = WorkerPool(show_progress=False)
+    try:
+        for number, query in enumerate(queries, 1):
+            yield from query_records(query, pool, number, traces)
+    finally:
+        if own_pool:
+            pool.close()
+
+def query_records(query, pool=None, number=1, traces=None):
+    """Solve one parsed query into output records; errors become an "error" field.
+
+    Most queries yield a single record. Top-k queries yield a ranked record
+    per mix as it is settled, then a "done" record; closing the generator
+    early cancels the search. Pareto queries yield their front the same way.
+    """
+    record = {"id": query.get("id", number) if isinstance(query, dict) else number}
+    start_time = time.time()
+    telemetry = None
+    if isinstance(query, dict) and (query.get("telemetry") or traces is not None):
+        telemetry = QueryTelemetry(f"query {record['id']}")
+        if traces is not None:
+            traces.append(telemetry)
+    report = isinstance(query, dict) and bool(query.get("telemetry"))
+    try:
+        if isinstance(query, ValueError):
+            raise query
+        if not isinstance(query, dict):
+            raise ValueError("Query must be a JSON object")
+        solution = solve(query, pool, telemetry)
+        prices = merged_prices(query.get("prices"))
+        if "top" in query or query_mode(query) == "pareto":
+            count = 0
+            for count, mix in enumerate(solution, 1):
+                yield {**record, "rank": count, "result": mix, **mix_financials(mix, prices),
+                       "seconds": time.time() - start_time}
+            record.update(done=True, count=count)
+        else:
+            record["result"] = solution
+            if solution:
+                record.update(mix_financials(solution, prices))
+    except ValueError as error:
+        record["error"] = str(error)
+    except Exception as error:
+        # Anything else is a bug, but one query must not take the batch down
+        record["error"] = f"{type(error).__name__}: {error}"
+    record["seconds"] = time.time() - start_time
+    if report and "error" not in record:
+        record["telemetry"] = telemetry.to_json()
+    yield record
+
+def read_queries(lines):
+    """Parse NDJSON query lines, skipping blanks; bad JSON is passed on as a ValueError."""
+    for line in lines:
+        line = line.strip()
+        if line:
+            yield parse_query(line)
+
+def parse_query(line):
+    try:
+        return json.loads(line)
+    except ValueError as error:
+        return ValueError(f"Invalid JSON: {error}")
+
+def run_batch(path, show_progress=False, trace_path=None):
+    """Stream NDJSON results for the NDJSON queries in path ("-" for stdin) to stdout.
+
+    With trace_path, telemetry is recorded for every query and written there
+    as a Chrome trace.
+    """
+    source = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    traces = [] if trace_path else None
+    try:
+        with WorkerPool(show_progress=show_progress) as pool:
+            for record in solve_many(read_queries(source), pool, traces):
+                print(json.dumps(record), flush=True)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if trace_path:
+            write_chrome_trace(traces, trace_path)
+
+# Bulk recipe evaluation
+# Re-scores a book of known recipes (NDJSON, one {"base": ..., "path": [...]}
+# per line, or result records from earlier runs) under the current rules and
+# prices. Recipes go into a trie as they are read. Each distinct prefix is one
+# StateTable row holding its effect mask and ingredient cost, so a recipe
+# only costs a transition for each ingredient past the longest prefix it
+# shares with an earlier recipe. Transitions are also cached by (state,
+# ingredient), since different prefixes often reach the same state, and are
+# computed one ingredient at a time rather than as a full successor row:
+# recipes visit few of a state's successors. Every recipe's record is written
+# as soon as it is read.
+class RecipeTrie:
+    """Ingredient sequences from base states, one row per distinct prefix."""
+
+    def __init__(self, rules, costs):
+        self.rules = rules
+        self.costs = costs
+        self.table = StateTable()
+        self.roots = {}  # start mask -> row
+        self.children = {}  # row * 256 + ingredient -> row
+        self.transitions = {}  # mask * 256 + ingredient -> mask
+        self.steps = 0  # ingredients inserted, shared or not
+
+    def __len__(self):
+        return len(self.table)
+
+    def insert(self, start, path):
+        """Add a recipe (start mask, ingredient indices); returns the row of its final state."""
+        table = self.table
+        row = self.roots.get(start)
+        if row is None:
+            row = self.roots[start] = table.add(start)
+        for index in path:
+            child = self.children.get(row * 256 + index)
+            if child is None:
+                mask = table.states[row]
+                new_mask = self.transitions.get(mask * 256 + index)
+                if new_mask is None:
+                    new_mask = self.transitions[mask * 256 + index] = self.rules.transition(mask, index)
+                child = table.add(new_mask, row, index, table.depths[row] + 1, table.costs[row] + self.costs[index])
+                self.children[row * 256 + index] = child
+            row = child
+        self.steps += len(path)
+        return row
+
+def evaluate_recipes(recipes, prices=None, trie=None):
+    """Yield a record per recipe, in order: effects, cost, multiplier, value and profit.
+
+    ``recipes`` holds recipe dicts ({"base", "path", optional "id"}, or a
+    record with a "result" one) or ValueErrors, as read_queries yields them;
+    ``prices`` are overrides as for merged_prices. A malformed recipe gets a
+    record with an "error" field instead. Pass a ``trie`` (a RecipeTrie with
+    the same ingredient costs) to keep hold of the prefixes.
+    """
+    bases, costs_by_name, multipliers = merged_prices(prices)
+    rules = compile_rules()
+    if trie is None:
+        trie = RecipeTrie(rules, [costs_by_name.get(ing, 0) for ing in rules.ingredients])
+    bit_values = rules.multiplier_bits(multipliers)
+    table = trie.table
+    index_of = rules.ingredient_index
+    scored = {}  # final mask -> (effects, multiplier)
+
+    for number, recipe in enumerate(recipes, 1):
+        record = {"id": recipe.get("id", number) if isinstance(recipe, dict) else number}
+        try:
+            if isinstance(recipe, ValueError):
+                raise recipe
+            if not isinstance(recipe, dict):
+                raise ValueError("Recipe must be a JSON object")
+            recipe = recipe.get("result") or recipe
+            base, path = recipe.get("base"), recipe.get("path", [])
+            if not isinstance(base, str) or base not in base_products:
+                raise ValueError(f"Unknown base product: {base!r}")
+            try:
+                indices = [index_of[ing] for ing in path] if isinstance(path, list) else None
+            except (KeyError, TypeError):
+                indices = None
+            if indices is None:
+                if not isinstance(path, list) or not all(isinstance(ing, str) for ing in path):
+                    raise ValueError("path must be a list of ingredient names")
+                raise ValueError(f"Unknown ingredient(s): {', '.join(ing for ing in path if ing not in index_of)}")
+        except ValueError as error:
+            record["error"] = str(error)
+            yield record
+            continue
+
+        row = trie.insert(rules.mask_of(base_products[base]), indices)
+        mask, cost = table.states[row], table.costs[row]
+        if mask not in scored:
+            scored[mask] = (rules.effects_of(mask), mask_multiplier(mask, bit_values))
+        effects, multiplier = scored[mask]
+        value = bases.get(base, 0) * multiplier
+        record.update(base=base, path=path, effects=list(effects), cost=cost, multiplier=multiplier, value=value,
+                      profit=value - cost)
+        yield record
+
+def run_evaluate(path, prices_path=None):
+    """Stream evaluate_recipes records for the NDJSON recipes in path ("-" for stdin) to stdout."""
+    prices = None
+    if prices_path:
+        with open(prices_path, encoding="utf-8") as f:
+            prices = json.load(f)
+    start_time = time.time()
+    _, costs, _ = merged_prices(prices)  # a bad prices file fails before any output
+    rules = compile_rules()
+    trie = RecipeTrie(rules, [costs.get(ing, 0) for ing in rules.ingredients])
+    source = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    count = 0
+    try:
+        for count, record in enumerate(evaluate_recipes(read_queries(source), prices, trie), 1):
+            print(json.dumps(record))
+    finally:
+        if source is not sys.stdin:
+            source.close()
+    print(f"🧾 Evaluated {count:,} recipes in {time.time() - start_time:.2f}s: {len(trie):,} distinct prefixes "
+          f"for {trie.steps:,} ingredient steps", file=sys.stderr)
+
+# Local query server
+# `serve` keeps the rules, graphs and worker pool loaded and answers the same
+# NDJSON queries over a Unix socket or a localhost TCP port, answering each
+# request line in order per connection (top-k queries stream several lines).
+# Connections are served concurrently: queries are solved on a few threads, so
+# graph lookups are not stuck behind a long search, while pool runs take
+# turns on the shared pool.
+# {"op": "stats"} returns the server's counters instead of solving anything.
+SERVER_PORT = 7878
+SERVER_THREADS = 4
+SERVER_LATENCY_WINDOW = 1000  # recent requests kept for latency percentiles
+
+class ServerStats:
+    """Request counters and recent latencies for the query server."""
+
+    def __init__(self):
+        self.start_time = time.time()
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.solve_seconds = 0.0
+        self.latencies = deque(maxlen=SERVER_LATENCY_WINDOW)
+
+    def record(self, seconds, failed):
+        self.requests += 1
+        self.errors += failed
+        self.solve_seconds += seconds
+        self.latencies.append(seconds)
+
+    def snapshot(self):
+        uptime = time.time() - self.start_time
+        latencies = sorted(self.latencies)
+
+        def percentile(fraction):
+            return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))] * 1000 if latencies else 0.0
+
+        return {
+            "uptime": uptime,
+            "requests": self.requests,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "requests_per_sec": self.requests / uptime if uptime else 0.0,
+            "latency_ms": {
+                "mean": sum(latencies) / len(latencies) * 1000 if latencies else 0.0,
+                "p50": percentile(0.50),
+                "p95": percentile(0.95),
+                "p99": percentile(0.99),
+                "max": latencies[-1] * 1000 if latencies else 0.0,
+            },
+            "solve_seconds": self.solve_seconds,
+        }
+
+class QueryServer:
+    """Serves NDJSON queries from memory; see serve()."""
+
+    def __init__(self, pool, threads=SERVER_THREADS):
+        from concurrent.futures import ThreadPoolExecutor
+
+        self.pool = pool
+        self.threads = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="mixfinder-query")
+        self.stats = ServerStats()
+
+    async def respond(self, line, number):
+        """Yield the response records for one request line as a solver thread produces them."""
+        import asyncio
+
+        query = parse_query(line)
+        if isinstance(query, dict) and query.get("op") == "stats":
+            yield self.stats.snapshot()
+            return
+
+        loop = asyncio.get_running_loop()
+        records = asyncio.Queue()
+        stop = []  # set when the consumer goes away, so the search is cancelled
+
+        def produce():
+            stream = query_records(query, self.pool, number)
+            try:
+                for record in stream:
+                    if stop:
+                        break
+                    loop.call_soon_threadsafe(records.put_nowait, record)
+            finally:
+                stream.close()
+                loop.call_soon_threadsafe(records.put_nowait, None)
+
+        self.stats.in_flight += 1
+        producer = loop.run_in_executor(self.threads, produce)
+        record = None
+        try:
+            while (next_record := await records.get()) is not None:
+                record = next_record
+                yield record
+        finally:
+            stop.append(True)
+            self.stats.in_flight -= 1
+        await producer
+        if record is not None:
+            self.stats.record(record["seconds"], "error" in record)
+
+    async def answer(self, writer, line, number):
+        """Write the responses to one request; a failure is answered with an error record."""
+        start_time = time.time()
+        responses = self.respond(line, number)
+        try:
+            async for response in responses:
+                writer.write(json.dumps(response).encode("utf-8") + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            raise
+        except Exception as error:
+            seconds = time.time() - start_time
+            self.stats.record(seconds, True)
+            query = parse_query(line)
+            record = {"id": query.get("id", number) if isinstance(query, dict) else number,
+                      "error": f"{type(error).__name__}: {error}", "seconds": seconds}
+            writer.write(json.dumps(record).encode("utf-8") + b"\n")
+            await writer.drain()
+        finally:
+            await responses.aclose()
+
+    async def handle(self, reader, writer):
+        number = 0
+        try:
+            while line := await reader.readline():
+                line = line.strip()
+                if not line:
+                    continue
+                number += 1
+                await self.answer(writer, line, number)
+        except ConnectionError:
+            pass  # the client went away; nothing left to answer
+        finally:
+            writer.close()
+
+def preload(base_names=None):
+    """Load the compiled rules and every available graph and recipe book into this process."""
+    compile_rules()
+    for name in base_names or base_products:
+        path = recipe_book_path(base_products[name])
+        book = open_recipe_book(path, recipe_book_key(base_products[name]))
+        if book is not None:
+            _book_cache[path] = book
+    return [name for name in base_names or base_products if load_state_graph(base_products[name]) is not None]
+
+async def serve(socket_path=None, host="127.0.0.1", port=SERVER_PORT, ready=None):
+    """Run the query server until cancelled; ``ready`` is called with the bound address."""
+    import asyncio
+    import signal
+
+    if socket_path and server_is_listening(socket_path):
+        raise OSError(f"A server is already listening on {socket_path}")
+    graphs = preload()
+    with WorkerPool(show_progress=False) as pool:
+        pool.warm_up()
+        server = QueryServer(pool)
+        if socket_path:
+            # A socket file left by a server that is gone is replaced
+            listener = await asyncio.start_unix_server(server.handle, path=socket_path)
+        else:
+            listener = await asyncio.start_server(server.handle, host, port)
+        address = listener.sockets[0].getsockname()
+        print(f"🛰  Serving on {address} ({len(graphs)} graphs in memory, {pool.board.workers} workers)",
+              file=sys.stderr, flush=True)
+        if ready is not None:
+            ready(address)
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+        try:
+            async with listener:
+                await listener.serve_forever()
+        except asyncio.CancelledError:
+            print("👋 Server stopped", file=sys.stderr)
+        finally:
+            server.threads.shutdown(cancel_futures=True)
+            if socket_path and os.path.exists(socket_path):
+                os.unlink(socket_path)
+
+def server_is_listening(socket_path):
+    import socket
+
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(socket_path)
+    except OSError:
+        return False
+    finally:
+        probe.close()
+    return True
+
+def ask_server(lines, socket_path=None, host="127.0.0.1", port=SERVER_PORT):
+    """Send NDJSON request lines to a running server and yield its parsed responses."""
+    import socket
+
+    if socket_path:
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.connect(socket_path)
+    else:
+        connection = socket.create_connection((host, port))
+    with connection, connection.makefile("rwb") as stream:
+        for line in lines:
+            line = line.strip()
+            if line:
+                stream.write(line.encode("utf-8") + b"\n")
+        stream.flush()
+        connection.shutdown(socket.SHUT_WR)
+        # Top-k queries answer with several lines, so read until the server hangs up
+        while response := stream.readline():
+            yield json.loads(response)
+
+def benchmark_startup(runs=20):
+    """Time `import mixfinder` and compile_rules() in fresh interpreters."""
+    import py_compile
+    import statistics
+    import subprocess
+
+    py_compile.compile(os.path.abspath(__file__))  # time the cached bytecode, as installed
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [here, os.environ.get("PYTHONPATH")])))
+    script = ("import time; start = time.perf_counter(); import mixfinder; imported = time.perf_counter(); "
+              "mixfinder.compile_rules(); print(imported - start, time.perf_counter() - imported)")
+
+    timings = {"interpreter": [], "import mixfinder": [], "compile_rules()": [], "process total": []}
+    for _ in range(runs):
+        start_time = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], env=env, check=True)
+        timings["interpreter"].append(time.perf_counter() - start_time)
+
+        start_time = time.perf_counter()
+        out = subprocess.run([sys.executable, "-c", script], env=env, check=True, capture_output=True, text=True)
+        timings["process total"].append(time.perf_counter() - start_time)
+        imported, compiled = map(float, out.stdout.split())
+        timings["import mixfinder"].append(imported)
+        timings["compile_rules()"].append(compiled)
+
+    print(f"⏱  Startup over {runs} runs (median / min):")
+    for name, values in timings.items():
+        print(f"  {name:<18} {statistics.median(values) * 1000:7.1f} ms / {min(values) * 1000:7.1f} ms")
+
+# Solver benchmarks
+# `bench` runs a fixed set of scenarios, each in a fresh interpreter with an
+# empty cache directory, so no graph short-cuts the search and the peak RSS
+# is the scenario's own. Scenarios cover the transition step, the per-base
+# workers and the dispatchers over "Anything" (every base), across depths and
+# a fixed set of goals. Profit depths stop at 7: one base at depth 8 already
+# takes 10-20s and depth 10 minutes.
+BENCH_GOALS = {
+    "one": ["Energizing"],
+    "three": ["Anti-Gravity", "Glowing", "Zombifying"],
+    "four": ["Zombifying", "Cyclopean", "Glowing", "Anti-Gravity"],
+}
+BENCH_DEPTHS = {"shortest": range(4, 13), "profit": range(4, 8)}
+BENCH_QUICK_DEPTHS = {"shortest": (4, 8, 12), "profit": (4, 6)}
+BENCH_TOP = 10  # mixes asked of the top-k profit dispatcher
+BENCH_TOLERANCE = 0.10  # slowdown against the baseline reported as a regression
+BENCH_MIN_SECONDS = 0.05  # scenarios faster than this are too noisy to compare
+
+def bench_scenarios(quick=False):
+    depths = BENCH_QUICK_DEPTHS if quick else BENCH_DEPTHS
+    goals = ["four"] if quick else list(BENCH_GOALS)
+    bases = list(base_products)[:1] if quick else list(base_products)
+    scenarios = [{"kind": "apply_ingredient"}, {"kind": "transitions"}]
+    scenarios += [{"kind": "shortest", "base": base, "depth": depth, "goal": goal}
+                  for base in bases for depth in depths["shortest"] for goal in goals]
+    scenarios += [{"kind": "profit", "base": base, "depth": depth}
+                  for base in bases for depth in depths["profit"]]
+    scenarios += [{"kind": "dispatch-shortest", "base": "Anything", "depth": depth, "goal": goal}
+                  for depth in depths["shortest"] for goal in goals]
+    scenarios += [{"kind": "dispatch-profit", "base": "Anything", "depth": depth} for depth in depths["profit"]]
+    for scenario in scenarios:
+        scenario["name"] = "/".join(str(part) for part in (
+            scenario["kind"], scenario.get("base"), scenario.get("depth") and f"d{scenario['depth']}",
+            scenario.get("goal")) if part)
+    return scenarios
+
+def peak_rss_mb():
+    """Peak resident set size of this process and its reaped children, or None if unknown."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / (1 << 10)  # bytes on macOS, KiB elsewhere
+
+def run_bench_scenario(scenario):
+    """Run one scenario in this process and return its measurements."""
+    kind, base, depth = scenario["kind"], scenario.get("base"), scenario.get("depth")
+    effects = BENCH_GOALS.get(scenario.get("goal"))
+    rules = compile_rules()
+    first_time = found = None
+
+    if kind in ("apply_ingredient", "transitions"):
+        # Every state within 4 ingredients of OG Kush, through every ingredient
+        start = rules.mask_of(base_products["OG Kush"])
+        masks, frontier = {start}, [start]
+        for _ in range(4):
+            frontier = [new for mask in frontier for new in rules.successors(mask) if new not in masks]
+            masks.update(frontier)
+        samples = [(mask, rules.effects_of(mask)) for mask in sorted(masks)]
+        start_time = time.perf_counter()
+        if kind == "apply_ingredient":
+            for _, effects in samples:
+                for ingredient in rules.ingredients:
+                    apply_ingredient(effects, ingredient)
+        else:
+            for mask, _ in samples:
+                rules._expand(mask)  # uncached, unlike successors()
+        seconds = time.perf_counter() - start_time
+        states = len(samples) * len(rules.ingredients)
+    elif kind in ("shortest", "profit"):
+        progress = TaskProgress()
+        start_time = time.perf_counter()
+        if kind == "shortest":
+            found = bfs_worker_process((base, base_products[base], effects, depth, effect_rules), progress)
+        else:
+            found = bfs_worker_profit((base, base_products[base], depth, effect_rules), progress)
+        seconds = time.perf_counter() - start_time
+        states = progress.done
+    else:
+        with WorkerPool(scenario.get("workers"), show_progress=False) as pool:
+            pool.warm_up()
+            start_time = time.perf_counter()
+            if kind == "dispatch-shortest":
+                found = bfs_solver_multiprocessing(effects, 0, depth, pool=pool)
+            else:
+                for found in iter_profit_mixes(0, BENCH_TOP, depth, pool=pool):
+                    if first_time is None:
+                        first_time = time.perf_counter() - start_time
+            seconds = time.perf_counter() - start_time
+            states = pool.board.totals()[0]
+
+    return {
+        **scenario,
+        "seconds": seconds,
+        "first_result_seconds": seconds if first_time is None else first_time,
+        "states": states,
+        "states_per_sec": states / seconds if seconds else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+        "found": found is not None,
+    }
+
+def bench_in_subprocess(scenario, cache_dir):
+    import subprocess
+
+    env = dict(os.environ, MIXFINDER_CACHE_DIR=cache_dir)
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), "bench", "--scenario", json.dumps(scenario)],
+                         env=env, check=True, capture_output=True, text=True)
+    return json.loads(out.stdout.splitlines()[-1])
+
+def benchmark_solvers(quick=False, only=None, repeat=1, json_path=None, baseline_path=None):
+    """Run the benchmark scenarios; returns 1 if any regressed against the baseline, else 0."""
+    import platform
+    import statistics
+    import tempfile
+
+    scenarios = [scenario for scenario in bench_scenarios(quick) if not only or only in scenario["name"]]
+    workers = os.cpu_count() or 1
+    baseline = {}
+    if baseline_path:
+        with open(baseline_path, encoding="utf-8") as f:
+            baseline = {record["name"]: record for record in json.load(f)["results"]}
+
+    print(f"🏁 {len(scenarios)} scenarios, {workers} workers, median of {repeat} run(s) each")
+    results = []
+    regressions = 0
+    with tempfile.TemporaryDirectory(prefix="mixfinder-bench-") as cache_dir:
+        for scenario in scenarios:
+            runs = sorted((bench_in_subprocess(scenario, cache_dir) for _ in range(repeat)),
+                          key=lambda record: record["seconds"])
+            record = runs[len(runs) // 2]
+
+            # Dispatchers are rerun on one worker for their multi-core scaling
+            if scenario["kind"].startswith("dispatch") and workers > 1:
+                serial = statistics.median(bench_in_subprocess({**scenario, "workers": 1}, cache_dir)["seconds"]
+                                           for _ in range(repeat))
+                record["scaling"] = {"workers": workers, "serial_seconds": serial,
+                                     "speedup": serial / record["seconds"],
+                                     "efficiency": serial / (workers * record["seconds"])}
+            results.append(record)
+
+            line = (f"  {record['name']:<40} {record['seconds']:8.3f}s  first {record['first_result_seconds']:7.3f}s"
+                    f"  {record['states_per_sec']:>11,.0f} states/s")
+            if record["peak_rss_mb"] is not None:
+                line += f"  {record['peak_rss_mb']:7.1f} MB"
+            if "scaling" in record:
+                line += f"  {record['scaling']['efficiency']:.0%} scaling"
+            old = baseline.get(record["name"])
+            if old:
+                ratio = record["seconds"] / old["seconds"] if old["seconds"] else 1.0
+                slower = ratio > 1 + BENCH_TOLERANCE and record["seconds"] >= BENCH_MIN_SECONDS
+                regressions += slower
+                line += f"  {'🐢' if slower else '🚀' if ratio < 1 - BENCH_TOLERANCE else '  '} x{ratio:.2f} vs baseline"
+            print(line, flush=True)
+
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "version": 1,
+                "created": time.time(),
+                "machine": {"python": platform.python_version(), "platform": platform.platform(),
+                            "cpus": workers, "engine": SEARCH_ENGINE},
+                "quick": quick,
+                "results": results,
+            }, f, indent=1)
+        print(f"💾 Results written to {json_path}")
+    if baseline:
+        print(f"{'🐢' if regressions else '✅'} {regressions} regression(s) beyond {BENCH_TOLERANCE:.0%} "
+              f"against {baseline_path}")
+    return 1 if regressions else 0
+
+# Differential fuzzing
+# Random states through the compiled kernels and mix_step, on the shipped
+# rules and on random rulesets with chained, merging and dangling
+# replacements and small effect caps, where table-building bugs would hide.
+# Random recipes, many sharing prefixes, go through a RecipeTrie (and on the
+# shipped rules through evaluate_recipes) and are checked step by step
+# against mix_step and the transition tables.
+FUZZ_SHOWN = 5  # mismatches printed in full
+FUZZ_RECIPE_SHARE = 4  # one recipe per this many random states
+
+def random_ruleset(rng):
+    """A random ruleset in the effect_rules format, with its effect cap and starting effects."""
+    names = [f"E{i:02}" for i in range(rng.randint(4, 40))]
+    rules = {}
+    for index in range(rng.randint(1, 12)):
+        sources = rng.sample(names, rng.randint(0, len(names) // 2))
+        replaces = {old: rng.choice(names) for old in sources}
+        if rng.random() < 0.2:
+            replaces[f"Typo{index}"] = rng.choice(names)  # an effect nothing produces
+        # Up to three additions, repeats allowed, so slots can run out part-way
+        adds = [rng.choice(names + [f"Extra{index}"]) for _ in range(rng.randint(0, 3))]
+        rules[f"I{index}"] = {"replaces": replaces, "adds": adds}
+    return rules, rng.randint(1, MAX_EFFECTS), rng.sample(names, rng.randint(0, 3))
+
+def random_recipes(rng, states, ingredient_count, count):
+    """(start effects, ingredient indices) pairs, half of them extending a prefix of an earlier one."""
+    recipes = []
+    for _ in range(count):
+        if recipes and rng.random() < 0.5:
+            start, path = rng.choice(recipes)
+            path = path[:rng.randint(0, len(path))]
+        else:
+            start, path = rng.choice(states), []
+        recipes.append((start, path + [rng.randrange(ingredient_count) for _ in range(rng.randint(1, 4))]))
+    return recipes
+
+def fuzz_transitions(cases=20000, rulesets=50, seed=None):
+    """Compare every compiled transition path with mix_step; returns the number of mismatches."""
+    import random
+
+    seed = random.randrange(1 << 32) if seed is None else seed
+    rng = random.Random(seed)
+    try:
+        _numpy()
+        numpy_available = True
+    except ImportError:
+        numpy_available = False
+
+    suites = [("shipped rules", effect_rules, MAX_EFFECTS, compile_rules())]
+    for number in range(rulesets):
+        rules, max_effects, starting = random_ruleset(rng)
+        suites.append((f"random ruleset {number}", rules, max_effects, CompiledRules(rules, max_effects, starting)))
+
+    mismatches = checked = recipe_count = 0
+    per_suite = max(1, cases // len(suites))
+
+    def compare(name, kernel, effects, ingredients, expected, got):
+        nonlocal mismatches
+        if got != expected:
+            mismatches += 1
+            if mismatches <= FUZZ_SHOWN:
+                print(f"❌ {name}, {kernel}: {effects} + {' + '.join(ingredients)}\n"
+                      f"   reference {expected}\n   compiled  {got}")
+
+    for name, rules, max_effects, compiled in suites:
+        states = [rng.sample(compiled.effects, rng.randint(0, min(max_effects, len(compiled.effects))))
+                  for _ in range(per_suite)]
+        masks = [compiled.mask_of(effects) for effects in states]
+        ingredient_count = len(compiled.ingredients)
+        kernels = {
+            # Before successors fills the cache transition() would answer from
+            "transition": [[compiled.transition(mask, index) for index in range(ingredient_count)] for mask in masks],
+            "successors": [compiled.successors(mask) for mask in masks],
+            "uncached": [compiled._expand(mask) for mask in masks],
+        }
+        if numpy_available and len(compiled.effects) <= 64:
+            np = _numpy()
+            kernels["numpy"] = FrontierKernel(compiled).expand(np.array(masks, dtype=np.uint64)).T.tolist()
+
+        for position, effects in enumerate(states):
+            for index, ingredient in enumerate(compiled.ingredients):
+                expected = mix_step(effects, ingredient, rules, max_effects)[0]
+                checked += 1
+                for kernel, results in kernels.items():
+                    compare(name, kernel, effects, [ingredient], expected,
+                            compiled.effects_of(int(results[position][index])))
+
+        # Whole recipes: the trie's shared prefixes against stepping each one through the tables
+        trie = RecipeTrie(compiled, [0] * ingredient_count)
+        recipes = random_recipes(rng, states, ingredient_count, per_suite // FUZZ_RECIPE_SHARE + 1)
+        recipe_count += len(recipes)
+        for effects, path in recipes:
+            ingredients = [compiled.ingredients[index] for index in path]
+            expected, mask = effects, compiled.mask_of(effects)
+            for ingredient, index in zip(ingredients, path):
+                expected = mix_step(expected, ingredient, rules, max_effects)[0]
+                mask = compiled.successors(mask)[index]
+            compare(name, "successors", effects, ingredients, expected, compiled.effects_of(mask))
+            row = trie.insert(compiled.mask_of(effects), path)
+            compare(name, "trie", effects, ingredients, expected, compiled.effects_of(trie.table.states[row]))
+
+        if rules is effect_rules:
+            recipes = [{"base": base, "path": [compiled.ingredients[index] for index in path]}
+                       for base, (_, path) in zip(rng.choices(sorted(base_products), k=len(recipes)), recipes)]
+            for recipe, record in zip(recipes, evaluate_recipes(recipes)):
+                expected = list(base_products[recipe["base"]])
+                for ingredient in recipe["path"]:
+                    expected = apply_ingredient(expected, ingredient)
+                compare(name, "evaluate_recipes", recipe["base"], recipe["path"], sorted(expected),
+                        sorted(record.get("effects", [])))
+
+    print(f"{'❌' if mismatches else '✅'} {checked:,} transitions and {recipe_count:,} recipes over "
+          f"{len(suites)} rulesets ({', '.join(kernels)}, trie, evaluate_recipes; seed {seed}): "
+          f"{mismatches} mismatches")
+    return mismatches
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="🔬 Schedule 1 Mix Pathfinder")
+    commands = parser.add_subparsers(dest="command")
+
+    build = commands.add_parser("build-graph", help="precompute reachable-state graphs for fast queries")
+    build.add_argument("--depth", type=int, default=GRAPH_DEPTH, help=f"max ingredients (default {GRAPH_DEPTH})")
+    build.add_argument("--base", action="append", choices=list(base_products), help="base product (repeatable, default all)")
+
+    books = commands.add_parser("build-book", help="precompute recipe books for re-scoring profit under new prices")
+    books.add_argument("--depth", type=int, default=BOOK_DEPTH, choices=range(1, BOOK_MAX_DEPTH + 1),
+                       metavar="DEPTH", help=f"max ingredients (default {BOOK_DEPTH}, at most {BOOK_MAX_DEPTH})")
+    books.add_argument("--base", action="append", choices=list(base_products), help="base product (repeatable, default all)")
+
+    batch = commands.add_parser("batch", help="answer NDJSON queries from a file or stdin, streaming NDJSON results")
+    batch.add_argument("queries", nargs="?", default="-", help="query file (default: stdin)")
+    batch.add_argument("--progress", action="store_true", help="show progress bars on stderr")
+    batch.add_argument("--trace", help="record search telemetry and write it to this Chrome trace file")
+
+    evaluate = commands.add_parser("evaluate", help="re-score NDJSON recipes under the current rules and prices")
+    evaluate.add_argument("recipes", nargs="?", default="-", help="recipe file (default: stdin)")
+    evaluate.add_argument("--prices", help="JSON file of price overrides, as in a query's \"prices\"")
+
+    startup = commands.add_parser("bench-startup", help="measure import and rule-loading time in fresh processes")
+    startup.add_argument("--runs", type=int, default=20, help="processes to time (default 20)")
+
+    fuzz = commands.add_parser("fuzz", help="check the compiled transitions and the recipe trie against the reference")
+    fuzz.add_argument("--cases", type=int, default=20000, help="random states in total (default 20000)")
+    fuzz.add_argument("--rulesets", type=int, default=50, help="random rulesets besides the real one (default 50)")
+    fuzz.add_argument("--seed", type=int, help="random seed (default: random, printed)")
+
+    sweep = commands.add_parser("sweep", help="best profit mix under each of many price scenarios")
+    sweep.add_argument("scenarios", nargs="?", help="JSON list (or NDJSON) of price overrides, as in a query's prices")
+    sweep.add_argument("--scale", nargs=3, metavar=("TABLE", "FROM", "TO"),
+                       help="instead, scale a price table (base_prices, ingredient_costs or effect_multipliers)")
+    sweep.add_argument("--steps", type=int, default=101, help="scenarios in a --scale sweep (default 101)")
+    sweep.add_argument("--name", action="append", help="price to scale (repeatable, default the whole table)")
+    sweep.add_argument("--base", action="append", choices=list(base_products), help="base product (repeatable, default all)")
+    sweep.add_argument("--depth", type=int, default=BOOK_DEPTH, help=f"max ingredients (default {BOOK_DEPTH})")
+    sweep.add_argument("--json", help="write every scenario's mix and the breakpoints to this file")
+
+    bench = commands.add_parser("bench", help="benchmark the solvers on fixed scenarios")
+    bench.add_argument("--quick", action="store_true", help="one base, one goal and a few depths")
+    bench.add_argument("--only", help="run scenarios whose name contains this")
+    bench.add_argument("--repeat", type=int, default=1, help="runs per scenario, keeping the median (default 1)")
+    bench.add_argument("--json", help="write the results as JSON to this file")
+    bench.add_argument("--baseline", help="compare against results from an earlier --json run")
+    bench.add_argument("--scenario", help=argparse.SUPPRESS)  # internal: run one scenario, print its JSON
+
+    for name, help_text in (("serve", "answer NDJSON queries from memory over a local socket"),
+                            ("ask", "send NDJSON queries from a file or stdin to a running server")):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument("--socket", help="Unix socket path (default: TCP on localhost)")
+        command.add_argument("--port", type=int, default=SERVER_PORT, help=f"localhost TCP port (default {SERVER_PORT})")
+        if name == "ask":
+            command.add_argument("queries", nargs="?", default="-", help="query file (default: stdin)")
+
+    args = parser.parse_args(argv)
+    if args.command == "serve":
+        import asyncio
+        asyncio.run(serve(args.socket, port=args.port))
+    elif args.command == "ask":
+        source = sys.stdin if args.queries == "-" else open(args.queries, encoding="utf-8")
+        with source:
+            for response in ask_server(source, args.socket, port=args.port):
+                print(json.dumps(response), flush=True)
+    elif args.command == "bench-startup":
+        benchmark_startup(args.runs)
+    elif args.command == "sweep":
+        try:
+            if args.scale:
+                table, start, stop = args.scale
+                scenarios = scaled_scenarios(table, float(start), float(stop), args.steps, args.name)
+            elif args.scenarios:
+                with open(args.scenarios, encoding="utf-8") as f:
+                    text = f.read()
+                scenarios = (json.loads(text) if text.lstrip().startswith("[")
+                             else [json.loads(line) for line in text.splitlines() if line.strip()])
+            else:
+                parser.error("sweep needs a scenarios file or --scale")
+            run_sweep(scenarios, args.base or 0, args.depth, args.json)
+        except ValueError as error:
+            print(f"❌ {error}", file=sys.stderr)
+            sys.exit(2)
+    elif args.command == "fuzz":
+        sys.exit(1 if fuzz_transitions(args.cases, args.rulesets, args.seed) else 0)
+    elif args.command == "bench" and args.scenario:
+        print(json.dumps(run_bench_scenario(json.loads(args.scenario))))
+    elif args.command == "bench":
+        sys.exit(benchmark_solvers(args.quick, args.only, args.repeat, args.json, args.baseline))
+    elif args.command == "build-graph":
+        build_graphs(args.base, args.depth)
+    elif args.command == "build-book":
+        build_recipe_books(args.base, args.depth)
+    elif args.command == "batch":
+        run_batch(args.queries, args.progress, args.trace)
+    elif args.command == "evaluate":
+        try:
+            run_evaluate(args.recipes, args.prices)
+        except ValueError as error:
+            print(f"❌ {error}", file=sys.stderr)
+            sys.exit(2)
+    else:
+        interactive_session()
+
+if __name__ == "__main__":
+    try:
+        from multiprocessing import freeze_support
+        freeze_support()
+
+        main()
     except KeyboardInterrupt:
         print("\n👋 Goodbye!")
@@ -0,0 +1,7 @@
+import os
+import sys
+import tempfile
+
+# Keep compiled rules, graphs and books out of the working tree's cache
+os.environ.setdefault("MIXFINDER_CACHE_DIR", tempfile.mkdtemp(prefix="mixfinder-tests-"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
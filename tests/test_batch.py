@@ -0,0 +1,29 @@
+import json
+
+import mixfinder
+
+
+def test_batch_cli_answers_every_line(tmp_path, capsys):
+    queries = tmp_path / "queries.ndjson"
+    queries.write_text("\n".join([
+        json.dumps({"id": "short", "effects": ["Calming"], "bases": ["OG Kush"], "depth": 4}),
+        "{not json",
+        "",
+        json.dumps({"id": "unknown", "effects": ["Calming", "Sparkly"], "bases": ["OG Kush"]}),
+        json.dumps({"id": "top", "mode": "profit", "bases": "Meth", "depth": 3, "top": 2}),
+        "[1, 2]",
+    ]) + "\n", encoding="utf-8")
+
+    mixfinder.main(["batch", str(queries)])
+    records = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+    assert [record["id"] for record in records] == ["short", 2, "unknown", "top", "top", "top", 5]
+    short, bad, unknown, first, second, done, array = records
+    assert "error" not in short and "Calming" in short["result"]["effects"]
+    assert short["profit"] == mixfinder.mix_profit(short["result"])
+    assert bad["error"].startswith("Invalid JSON") and "result" not in bad
+    assert unknown["error"] == "Unknown effect(s): Sparkly"
+    assert [first["rank"], second["rank"]] == [1, 2] and first["profit"] >= second["profit"]
+    assert done["done"] and done["count"] == 2
+    assert array["error"] == "Query must be a JSON object"
+    assert all(record["seconds"] >= 0 for record in records)
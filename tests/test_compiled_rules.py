@@ -0,0 +1,69 @@
+import itertools
+
+import pytest
+
+import mixfinder
+
+# Several additions per rule, some of them already present or replaced out,
+# under a small effect cap: the slots run out part-way through the additions
+RULES = {
+    "Two": {"replaces": {"A": "B"}, "adds": ["C", "D"]},
+    "Three": {"replaces": {"B": "C", "C": "C"}, "adds": ["C", "E", "A"]},
+    "Again": {"replaces": {}, "adds": ["D", "D", "E"]},
+    "None": {"replaces": {"E": "A"}, "adds": []},
+}
+EFFECTS = ["A", "B", "C", "D", "E"]
+
+
+def states(max_effects):
+    for count in range(max_effects + 1):
+        yield from (list(effects) for effects in itertools.combinations(EFFECTS, count))
+
+
+@pytest.mark.parametrize("max_effects", [1, 2, 3, 4])
+def test_compiled_transitions_add_one_effect_at_a_time(max_effects):
+    compiled = mixfinder.CompiledRules(RULES, max_effects, EFFECTS)
+    kernels = {
+        "transition": lambda mask, index: compiled.transition(mask, index),
+        "expand": lambda mask, index: compiled._expand(mask)[index],
+    }
+    try:
+        np = mixfinder._numpy()
+    except ImportError:
+        pass
+    else:
+        frontier = mixfinder.FrontierKernel(compiled)
+        kernels["numpy"] = lambda mask, index: int(frontier.expand(np.array([mask], dtype=np.uint64))[index][0])
+
+    for effects in states(max_effects):
+        mask = compiled.mask_of(effects)
+        for index, ingredient in enumerate(compiled.ingredients):
+            expected = mixfinder.mix_step(effects, ingredient, RULES, max_effects)[0]
+            for name, kernel in kernels.items():
+                assert compiled.effects_of(kernel(mask, index)) == expected, (name, effects, ingredient)
+
+
+def test_saved_compiled_rules_keep_the_additions():
+    compiled = mixfinder.compile_rules(RULES, 3)
+    key = compiled.fingerprint
+    loaded = mixfinder.read_compiled_rules(mixfinder.compiled_rules_path(key), key)
+    assert loaded.multi_add
+    for effects in states(3):
+        mask = compiled.mask_of(effects)
+        assert loaded._expand(mask) == compiled._expand(mask)
+
+
+def test_compile_rules_skips_the_fingerprint_for_a_known_ruleset(monkeypatch):
+    rules = {name: dict(rule) for name, rule in mixfinder.effect_rules.items()}
+    compiled = mixfinder.compile_rules(rules)
+    assert mixfinder.compile_rules(mixfinder.effect_rules) is compiled  # same fingerprint, same tables
+
+    def fingerprint(*args):
+        raise AssertionError("fingerprinted a ruleset compile_rules already knows")
+
+    monkeypatch.setattr(mixfinder, "ruleset_fingerprint", fingerprint)
+    assert mixfinder.compile_rules(rules) is compiled
+    assert mixfinder.compile_rules() is compiled
+    # An equal ruleset in another object is still keyed by its content
+    with pytest.raises(AssertionError):
+        mixfinder.compile_rules(dict(rules))
@@ -0,0 +1,126 @@
+import random
+
+import pytest
+
+import mixfinder
+
+
+@pytest.fixture(scope="module")
+def pool():
+    with mixfinder.WorkerPool(show_progress=False) as pool:
+        yield pool
+
+
+def random_constraints(rng):
+    """A random base, query depth and constraints object."""
+    effects = sorted(mixfinder.compile_rules().bit)
+    ingredients = sorted(mixfinder.effect_rules)
+    spec = {}
+    if rng.random() < 0.5:
+        spec["ingredients"] = rng.sample(ingredients, rng.randint(6, 16))
+    if rng.random() < 0.3:
+        spec["exclude"] = rng.sample(ingredients, rng.randint(1, 4))
+    if rng.random() < 0.8:
+        spec["forbid"] = rng.sample(effects, rng.randint(1, 4))
+    if rng.random() < 0.5:
+        spec["forbid_anywhere"] = True
+    if rng.random() < 0.6:
+        spec["budget"] = rng.randint(3, 25)
+    depth = rng.choice([3, 4])
+    if rng.random() < 0.3:
+        spec["max_ingredients"], depth = depth, 6
+    return rng.choice(sorted(mixfinder.base_products)), depth, spec
+
+
+def recipes(base, constraints, depth):
+    """Every recipe meeting the constraints, as (path, state, cost), by trying every path."""
+    rules = mixfinder.compile_rules(constraints.rules())
+    limits = constraints.limits(rules)
+    found = []
+
+    def extend(mask, path, cost):
+        if mask & limits["blocked"] or cost > constraints.budget:
+            return
+        if not mask & limits["forbidden"]:
+            found.append((path, mask, cost))
+        if len(path) < depth:
+            for index, new_mask in enumerate(rules.successors(mask)):
+                extend(new_mask, path + [index], cost + mixfinder.ingredient_costs[rules.ingredients[index]])
+
+    extend(rules.mask_of(mixfinder.base_products[base]), [], 0)
+    return rules, found
+
+
+def check_mix(mix, constraints, depth, desired=()):
+    """Replay a result with apply_ingredient and check it against the constraints."""
+    forbidden = set(constraints.forbidden)
+    effects = list(mixfinder.base_products[mix["base"]])
+    assert len(mix["path"]) <= depth
+    for ingredient in mix["path"]:
+        assert ingredient in constraints.ingredients
+        effects = mixfinder.apply_ingredient(effects, ingredient)
+        assert not (constraints.anywhere and set(effects) & forbidden)
+    assert sorted(effects) == sorted(mix["effects"])
+    assert not set(effects) & forbidden
+    assert sum(mixfinder.ingredient_costs[ing] for ing in mix["path"]) <= constraints.budget
+    assert set(desired) <= set(effects)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_constrained_searches_match_exhaustive_search(pool, seed):
+    rng = random.Random(seed)
+    base, depth, spec = random_constraints(rng)
+    constraints = mixfinder.MixConstraints.from_json(spec)
+    capped = constraints.depth(depth)
+    rules, found = recipes(base, constraints, capped)
+    bit_values = rules.multiplier_bits(mixfinder.effect_multipliers)
+
+    def profit(mask, cost):
+        return mixfinder.base_prices[base] * mixfinder.mask_multiplier(mask, bit_values) - cost
+
+    def query(mode, **fields):
+        return mixfinder.solve({"mode": mode, "bases": base, "depth": depth, "constraints": spec, **fields}, pool)
+
+    best = query("profit")
+    if not found:
+        assert best is None
+    else:
+        check_mix(best, constraints, capped)
+        assert mixfinder.mix_profit(best) == pytest.approx(max(profit(mask, cost) for _, mask, cost in found))
+
+    # Top-k ranks the DP's labels: the cheapest per (state, depth) that no shallower label matches on cost
+    cheapest = {}
+    for path, mask, cost in found:
+        cheapest[mask, len(path)] = min(cost, cheapest.get((mask, len(path)), cost))
+    labels = [profit(mask, cost) for (mask, count), cost in cheapest.items()
+              if all(cheapest.get((mask, shallower), float('inf')) > cost for shallower in range(count))]
+    top = list(query("profit", top=5))
+    for mix in top:
+        check_mix(mix, constraints, capped)
+    assert [mixfinder.mix_profit(mix) for mix in top] == pytest.approx(sorted(labels, reverse=True)[:5])
+
+    effects = sorted(mixfinder.compile_rules().bit)
+    for _ in range(3):
+        desired = rng.sample(effects, rng.randint(1, 2))
+        matching = [(path, cost) for path, mask, cost in found
+                    if all(effect in rules.bit and mask >> rules.bit[effect] & 1 for effect in desired)]
+        shortest = query("shortest", effects=desired)
+        cheapest_mix = query("cheapest", effects=desired)
+        if not matching:
+            assert shortest is None and cheapest_mix is None
+            continue
+        check_mix(shortest, constraints, capped, desired)
+        check_mix(cheapest_mix, constraints, capped, desired)
+        assert len(shortest["path"]) == min(len(path) for path, _ in matching)
+        assert sum(mixfinder.ingredient_costs[ing] for ing in cheapest_mix["path"]) == min(
+            cost for _, cost in matching)
+
+    points = {(round(profit(mask, cost), 6), len(path), cost) for path, mask, cost in found}
+    expected = {point for point in points
+                if not any(other != point and other[0] >= point[0] and other[1] <= point[1] and other[2] <= point[2]
+                           for other in points)}
+    front = query("pareto")
+    for mix in front:
+        check_mix(mix, constraints, capped)
+    assert {(round(mixfinder.mix_profit(mix), 6), len(mix["path"]),
+             sum(mixfinder.ingredient_costs[ing] for ing in mix["path"])) for mix in front} == expected
@@ -0,0 +1,65 @@
+import json
+import os
+
+import pytest
+
+import mixfinder
+
+
+class Interrupted(Exception):
+    pass
+
+
+class InterruptingTelemetry(mixfinder.SearchTelemetry):
+    """Telemetry that stops the search once it has expanded ``after`` levels."""
+
+    def __init__(self, after=None):
+        super().__init__()
+        self.after = after
+
+    def record(self, *args, **kwargs):
+        super().record(*args, **kwargs)
+        if len(self.levels) == self.after:
+            raise Interrupted
+
+
+def search(rules, goal, max_depth, spill_dir, telemetry):
+    start = rules.mask_of(mixfinder.base_products["OG Kush"])
+    return mixfinder.external_shortest_search(rules, [(start, 0, [])], goal, max_depth, mixfinder.TaskProgress(),
+                                              mixfinder.SharedBound(), telemetry, spill_dir=str(spill_dir),
+                                              memory_mb=0.01)
+
+
+@pytest.mark.parametrize("desired, max_depth, reachable", [
+    (["Anti-Gravity", "Zombifying", "Cyclopean"], 6, True),  # found at depth 5
+    (["Anti-Gravity", "Zombifying", "Cyclopean"], 4, False),  # stopped by max_depth
+])
+def test_interrupted_external_search_resumes_from_its_manifest(tmp_path, desired, max_depth, reachable):
+    rules = mixfinder.compile_rules()
+    goal = rules.mask_of(desired)
+    start = rules.mask_of(mixfinder.base_products["OG Kush"])
+    expected = mixfinder.shortest_search(rules, [(start, 0, [])], goal, max_depth, mixfinder.TaskProgress(),
+                                         mixfinder.SharedBound())
+    assert (expected is not None) == reachable
+
+    with pytest.raises(Interrupted):
+        search(rules, goal, max_depth, tmp_path, InterruptingTelemetry(after=3))
+    directory, = tmp_path.iterdir()
+    with open(directory / "manifest.json", encoding="utf-8") as handle:
+        assert json.load(handle)["levels"] == 4  # the start labels and three expanded levels
+    assert {f"level-{level:03d}.bin" for level in range(4)} <= set(os.listdir(directory))
+
+    telemetry = InterruptingTelemetry()
+    found = search(rules, goal, max_depth, tmp_path, telemetry)
+    # Only the levels after the interruption are expanded again
+    assert [level["depth"] for level in telemetry.levels] == list(range(3, min(max_depth, 5)))
+    assert (found is not None) == reachable
+    if reachable:
+        mask, path = found
+        assert len(path) == len(expected[1])
+        effects = list(mixfinder.base_products["OG Kush"])
+        for index in path:
+            effects = mixfinder.apply_ingredient(effects, rules.ingredients[index])
+        assert rules.mask_of(effects) == mask and mask & goal == goal
+    # A finished search, found or not, removes its files
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,13 @@
+import random
+
+import mixfinder
+
+
+def test_compiled_transitions_and_recipe_trie_match_mix_step():
+    # fuzz_transitions draws its rulesets first, so these are the ones it checks
+    rng = random.Random(0)
+    rulesets = [mixfinder.random_ruleset(rng) for _ in range(10)]
+    assert any(len(rule["adds"]) > 1 for rules, _, _ in rulesets for rule in rules.values())
+    assert any(len(rule["adds"]) == 0 for rules, _, _ in rulesets for rule in rules.values())
+
+    assert mixfinder.fuzz_transitions(cases=4000, rulesets=10, seed=0) == 0
@@ -0,0 +1,169 @@
+import random
+
+import pytest
+
+import mixfinder
+
+BASE = "Meth"
+DEPTH = 5
+
+
+@pytest.fixture(scope="module")
+def built():
+    return mixfinder.build_state_graph(mixfinder.base_products[BASE], DEPTH)
+
+
+@pytest.fixture
+def cache(monkeypatch, tmp_path):
+    monkeypatch.setattr(mixfinder, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(mixfinder, "_graph_cache", {})
+    return tmp_path
+
+
+def searched(rules, desired, depth):
+    start = [(rules.mask_of(mixfinder.base_products[BASE]), 0, [])]
+    costs = [mixfinder.ingredient_costs[ing] for ing in rules.ingredients]
+    found = mixfinder.shortest_search(rules, start, desired, depth, mixfinder.TaskProgress(),
+                                      mixfinder.SharedBound(), costs=costs)
+    return None if found is None else (len(found[1]), sum(costs[index] for index in found[1]))
+
+
+def test_reopened_graph_answers_as_the_search_does(built, cache):
+    path = mixfinder.state_graph_path(mixfinder.base_products[BASE])
+    mixfinder.write_state_graph(built, path)
+    graph = mixfinder.load_state_graph(mixfinder.base_products[BASE])
+    assert graph is not None and isinstance(graph.masks, memoryview)  # mapped, not read in
+    assert len(graph) == len(built) and graph.max_depth == DEPTH
+    assert list(graph.masks) == list(built.masks) and list(graph.successors) == list(built.successors)
+
+    rules = mixfinder.compile_rules()
+    effects = sorted(rules.bit)
+    rng = random.Random(0)
+    for _ in range(40):
+        desired = rng.sample(effects, rng.randint(1, 4))
+        depth = rng.randint(2, DEPTH)
+        decided, result = mixfinder.graph_shortest(graph, BASE, desired, depth)
+        assert decided
+        found = None if result is None else (
+            len(result["path"]), sum(mixfinder.ingredient_costs[ing] for ing in result["path"]))
+        assert found == searched(rules, rules.mask_of(desired), depth), desired
+        if result is not None:
+            assert set(desired) <= set(result["effects"])
+
+    # Past the graph's depth a miss proves nothing
+    deep = ["Anti-Gravity", "Zombifying", "Cyclopean", "Electrifying", "Shrinking"]
+    assert mixfinder.graph_shortest(graph, BASE, deep, DEPTH) == (True, None)
+    assert mixfinder.graph_shortest(graph, BASE, deep, DEPTH + 1) == (False, None)
+
+
+def test_stale_graph_is_rejected(built, cache, monkeypatch):
+    base_effects = mixfinder.base_products[BASE]
+    path = mixfinder.state_graph_path(base_effects)
+    mixfinder.write_state_graph(built, path)
+    assert mixfinder.open_state_graph(path, built.key) is not None
+    assert mixfinder.open_state_graph(path, "0" * 64) is None
+
+    # New prices reorder the goal index, so the same file no longer fits
+    monkeypatch.setitem(mixfinder.ingredient_costs, "Cuke", mixfinder.ingredient_costs["Cuke"] + 1)
+    assert mixfinder.state_graph_key(base_effects) != built.key
+    assert mixfinder.open_state_graph(path, mixfinder.state_graph_key(base_effects)) is None
+    assert mixfinder.load_state_graph(base_effects) is None
+
+    # So is a file from another format version
+    with open(path, "r+b") as f:
+        f.seek(8)
+        f.write((mixfinder._GRAPH_VERSION + 1).to_bytes(4, "little"))
+    assert mixfinder.open_state_graph(path, built.key) is None
+
+
+BASES = ["OG Kush", "Meth", "Cocaine"]
+graph_shortest = mixfinder.graph_shortest
+
+
+@pytest.fixture(scope="module")
+def pool():
+    with mixfinder.WorkerPool(show_progress=False) as pool:
+        yield pool
+
+
+@pytest.fixture(scope="module")
+def graph_dir(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("graphs")
+    for base in BASES:
+        graph = mixfinder.build_state_graph(mixfinder.base_products[base], DEPTH)
+        mixfinder.write_state_graph(graph, str(directory / mixfinder.state_graph_path(
+            mixfinder.base_products[base]).rsplit("/", 1)[1]))
+    return directory
+
+
+def answer(monkeypatch, directory, query, pool):
+    """solve() with the graphs in directory (if any), and how many bases a graph decided."""
+    monkeypatch.setattr(mixfinder, "CACHE_DIR", str(directory))
+    monkeypatch.setattr(mixfinder, "_graph_cache", {})
+    decided = []
+
+    def lookup(*args):
+        answer = graph_shortest(*args)
+        decided.append(answer[0])
+        return answer
+
+    monkeypatch.setattr(mixfinder, "graph_shortest", lookup)
+    result = mixfinder.solve(query, pool)
+    if "top" in query:
+        result = list(result)
+    return result, sum(decided)
+
+
+def recipe(result):
+    return None if result is None else (
+        result["base"], len(result["path"]), sum(mixfinder.ingredient_costs[ing] for ing in result["path"]))
+
+
+def test_graph_answers_match_searched_answers(monkeypatch, pool, graph_dir, tmp_path):
+    rules = mixfinder.compile_rules()
+    effects = sorted(rules.bit)
+    rng = random.Random(1)
+    queries = [{"effects": rng.sample(effects, rng.randint(1, 3)), "bases": BASES, "depth": rng.randint(3, DEPTH)}
+               for _ in range(12)]
+    # Deeper than the graphs: misses there are undecided and fall back to the search
+    queries.append({"effects": ["Anti-Gravity", "Zombifying", "Cyclopean", "Electrifying"], "bases": BASES,
+                    "depth": DEPTH + 1})
+    served = 0
+    for query in queries:
+        from_graph, decided = answer(monkeypatch, graph_dir, query, pool)
+        searched, _ = answer(monkeypatch, tmp_path, query, pool)
+        assert recipe(from_graph) == recipe(searched), query
+        served += decided
+    assert served >= len(queries) * len(BASES) // 2
+
+    query = {"mode": "profit", "bases": BASES, "depth": 4, "top": 10}
+    from_graph = [mixfinder.mix_profit(mix) for mix in answer(monkeypatch, graph_dir, query, pool)[0]]
+    searched = [mixfinder.mix_profit(mix) for mix in answer(monkeypatch, tmp_path, query, pool)[0]]
+    assert from_graph == pytest.approx(searched)
+
+
+@pytest.mark.parametrize("constraints", [
+    {"forbid": ["Calming", "Energizing", "Munchies"]},
+    {"forbid": ["Paranoia", "Toxic"], "forbid_anywhere": True},
+    {"exclude": ["Cuke", "Banana", "Mega Bean", "Donut"]},
+    {"ingredients": ["Cuke", "Banana", "Paracetamol", "Horse Semen", "Iodine"]},
+    {"budget": 6},
+    {"max_ingredients": 3},
+])
+def test_constrained_queries_match_with_or_without_graphs(monkeypatch, pool, graph_dir, tmp_path, constraints):
+    narrowed = mixfinder.MixConstraints.from_json(constraints).narrowed
+    rng = random.Random(2)
+    effects = sorted(mixfinder.compile_rules().bit)
+    for _ in range(4):
+        query = {"effects": rng.sample(effects, rng.randint(1, 2)), "bases": BASES, "depth": DEPTH,
+                 "constraints": constraints}
+        from_graph, decided = answer(monkeypatch, graph_dir, query, pool)
+        searched, _ = answer(monkeypatch, tmp_path, query, pool)
+        assert recipe(from_graph) == recipe(searched), query
+        # Only a length cap may be answered from the graphs; anything narrower is searched
+        assert (decided == 0) if narrowed else (decided == len(BASES))
+        if from_graph is not None:
+            assert not set(from_graph["effects"]) & set(constraints.get("forbid", []))
+            assert not set(from_graph["path"]) & set(constraints.get("exclude", []))
+            assert set(from_graph["path"]) <= set(constraints.get("ingredients", from_graph["path"]))
+            assert len(from_graph["path"]) <= constraints.get("max_ingredients", DEPTH)
@@ -0,0 +1,67 @@
+import random
+
+import pytest
+
+import mixfinder
+
+
+def check_recipe(rules, base, found, desired, forbidden, blocked):
+    """Replay a (mask, path) answer with mix_step; returns its cost."""
+    effects = list(mixfinder.base_products[base])
+    for index in found[1]:
+        effects = mixfinder.mix_step(effects, rules.ingredients[index])[0]
+        assert not rules.mask_of(effects) & blocked
+    mask = rules.mask_of(effects)
+    assert mask == found[0]
+    assert mask & desired == desired and not mask & forbidden
+    return sum(mixfinder.ingredient_costs[rules.ingredients[index]] for index in found[1])
+
+
+# Seeds 29 and 31 have a suffix whose first-found completion is not the cheapest
+@pytest.mark.parametrize("seed", [0, 1, 2, 3, 4, 29, 31])
+def test_mitm_matches_bfs(monkeypatch, seed):
+    # A small forward frontier, so most of each recipe comes from the backward side
+    monkeypatch.setattr(mixfinder, "MITM_FRONTIER", 1 << 6)
+    rng = random.Random(seed)
+    rules = mixfinder.compile_rules()
+    costs = [mixfinder.ingredient_costs[ing] for ing in rules.ingredients]
+    effects = sorted(rules.bit)
+    base = rng.choice(sorted(mixfinder.base_products))
+    start = [(rules.mask_of(mixfinder.base_products[base]), 0, [])]
+    depth = rng.choice([7, 8])
+
+    cases = [(rng.sample(effects, rng.randint(2, 4)), [], False) for _ in range(2)]
+    cases.append((rng.sample(effects, 2), rng.sample(effects, 2), False))
+    cases.append((rng.sample(effects, 3), rng.sample(effects, 1), True))
+    for desired, excluded, anywhere in cases:
+        desired = rules.mask_of(desired)
+        forbidden = rules.mask_of(excluded) & ~desired
+        blocked = forbidden if anywhere else 0
+        if rules.mask_of(mixfinder.base_products[base]) & blocked:
+            continue
+        expected = mixfinder.shortest_search(rules, start, desired, depth, mixfinder.TaskProgress(),
+                                             mixfinder.SharedBound(), forbidden=forbidden, blocked=blocked,
+                                             costs=costs)
+        found = mixfinder.mitm_shortest_search(rules, start, desired, depth, mixfinder.TaskProgress(),
+                                               mixfinder.SharedBound(), forbidden=forbidden, blocked=blocked,
+                                               costs=costs)
+        assert (found is None) == (expected is None)
+        if found is not None:
+            assert len(found[1]) == len(expected[1])
+            assert check_recipe(rules, base, found, desired, forbidden, blocked) == check_recipe(
+                rules, base, expected, desired, forbidden, blocked)
+
+
+@pytest.mark.parametrize("desired, depth", [
+    # Ten ingredients deep: none within 8
+    (["Anti-Gravity", "Zombifying", "Cyclopean", "Electrifying", "Shrinking"], 8),
+    # More effects than MAX_EFFECTS allows in one mix
+    (["Anti-Gravity", "Athletic", "Balding", "Bright-Eyed", "Calming", "Calorie-Dense", "Cyclopean",
+      "Disorienting", "Electrifying"], 9),
+])
+def test_mitm_unreachable_goal(monkeypatch, desired, depth):
+    monkeypatch.setattr(mixfinder, "MITM_FRONTIER", 1 << 6)
+    rules = mixfinder.compile_rules()
+    start = [(rules.mask_of(mixfinder.base_products["OG Kush"]), 0, [])]
+    assert mixfinder.mitm_shortest_search(rules, start, rules.mask_of(desired), depth, mixfinder.TaskProgress(),
+                                          mixfinder.SharedBound()) is None
@@ -0,0 +1,57 @@
+import random
+
+import pytest
+
+import mixfinder
+
+pytest.importorskip("numpy")
+
+
+def search(engine, rules, starts, desired, depth, costs):
+    found = engine(rules, starts, desired, depth, mixfinder.TaskProgress(), mixfinder.SharedBound(), costs=costs)
+    return None if found is None else (found[0], len(found[1]), sum(costs[index] for index in found[1]), found[1])
+
+
+@pytest.mark.parametrize("depth", [1, 2, 4, 6])
+def test_numpy_shortest_search_matches_python(depth):
+    rng = random.Random(depth)
+    rules = mixfinder.compile_rules()
+    costs = [mixfinder.ingredient_costs[ing] for ing in rules.ingredients]
+    effects = sorted(rules.bit)
+    hits = 0
+    goals = [rng.sample(effects, rng.randint(1, 3)) for _ in range(4)] + [None] * 4
+    # Ten ingredients deep, so both searches run out of levels
+    goals.append(["Anti-Gravity", "Zombifying", "Cyclopean", "Electrifying", "Shrinking"])
+    for goal in goals:
+        base = rng.choice(sorted(mixfinder.base_products))
+        start = rules.mask_of(mixfinder.base_products[base])
+        if goal is None:
+            # Some of the effects at the end of a random walk, so there is an answer
+            walk = start
+            for _ in range(depth):
+                walk = rules.transition(walk, rng.randrange(len(rules.ingredients)))
+            goal = rng.sample(rules.effects_of(walk), min(3, walk.bit_count()))
+        desired = rules.mask_of(goal)
+        # From the base, and from a shard-like set of start labels a few levels down
+        _, frontier = mixfinder.plan_shards(rules, mixfinder.base_products[base], depth, 8, costs, revisit=False)
+        for starts in ([(start, 0, [])], frontier):
+            expected = search(mixfinder.shortest_search, rules, starts, desired, depth, costs)
+            found = search(mixfinder.numpy_shortest_search, rules, starts, desired, depth, costs)
+            assert (found is None) == (expected is None), (base, desired)
+            if found is None:
+                continue
+            hits += 1
+            mask, length, cost, path = found
+            assert (length, cost) == expected[1:3]
+            assert mask & desired == desired
+            # The path replays from its start label to the mask it claims
+            for start_mask, start_cost, prefix in starts:
+                if path[:len(prefix)] == prefix:
+                    replayed = start_mask
+                    for index in path[len(prefix):]:
+                        replayed = rules.transition(replayed, index)
+                    if replayed == mask:
+                        break
+            else:
+                pytest.fail(f"no start label replays {path}")
+    assert hits
@@ -0,0 +1,48 @@
+import random
+
+import pytest
+
+import mixfinder
+
+
+def brute_force_front(rules, base, depth, costs, bit_values):
+    """(profit, ingredient count, cost) Pareto front, from every path of up to depth ingredients."""
+    base_price = mixfinder.base_prices[base]
+    points = set()
+    level = {(rules.mask_of(mixfinder.base_products[base]), 0)}
+    for count in range(depth + 1):
+        points |= {(round(base_price * mixfinder.mask_multiplier(mask, bit_values) - cost, 6), count, cost)
+                   for mask, cost in level}
+        level = {(new_mask, cost + costs[index]) for mask, cost in level
+                 for index, new_mask in enumerate(rules.successors(mask))}
+    return {point for point in points
+            if not any(other != point and other[0] >= point[0] and other[1] <= point[1] and other[2] <= point[2]
+                       for other in points)}
+
+
+@pytest.mark.parametrize("bounded", [False, True])
+@pytest.mark.parametrize("base", ["OG Kush", "Meth"])
+@pytest.mark.parametrize("seed", [None, 1, 2])
+def test_pareto_search_matches_exhaustive_search_at_depth_4(seed, base, bounded):
+    rules = mixfinder.compile_rules()
+    if seed is None:
+        costs = [mixfinder.ingredient_costs[ing] for ing in rules.ingredients]
+    else:
+        # Small, often equal costs make plenty of ties
+        rng = random.Random(seed)
+        costs = [rng.choice([0, 1, 2, 3, 5, 8]) for _ in rules.ingredients]
+    bit_values = rules.multiplier_bits(mixfinder.effect_multipliers)
+    base_price = mixfinder.base_prices[base]
+    bound = mixfinder.profit_bound(rules, base_price, costs, bit_values, 4) if bounded else None
+
+    found = mixfinder.pareto_search({rules.mask_of(mixfinder.base_products[base]): 0}, rules.successors, int, 4,
+                                    base_price, costs, bit_values, bound=bound)
+    points = {(round(profit, 6), count, cost) for profit, count, cost, *_ in found}
+    assert len(points) == len(found)
+    assert points == brute_force_front(rules, base, 4, costs, bit_values)
+    for profit, count, cost, mask, root, path in found:
+        assert len(path) == count
+        assert sum(costs[index] for index in path) == cost
+        for index in path:
+            root = rules.successors(root)[index]
+        assert root == mask
@@ -0,0 +1,49 @@
+import random
+
+import mixfinder
+
+
+def best_extension(rules, mask, cost, remaining, base_price, costs, bit_values):
+    """Exact best profit of adding 1..remaining ingredients to mask."""
+    best = float('-inf')
+    for index, new_mask in enumerate(rules.successors(mask)):
+        new_cost = cost + costs[index]
+        best = max(best, base_price * mixfinder.mask_multiplier(new_mask, bit_values) - new_cost)
+        if remaining > 1:
+            best = max(best, best_extension(rules, new_mask, new_cost, remaining - 1, base_price, costs, bit_values))
+    return best
+
+
+def test_profit_bound_never_undercuts_an_extension():
+    rules = mixfinder.compile_rules()
+    costs = [mixfinder.ingredient_costs[ing] for ing in rules.ingredients]
+    bit_values = rules.multiplier_bits(mixfinder.effect_multipliers)
+    rng = random.Random(5)
+    for base in ("OG Kush", "Meth", "Cocaine"):
+        base_price = mixfinder.base_prices[base]
+        bound = mixfinder.profit_bound(rules, base_price, costs, bit_values, 3)
+        for _ in range(40):
+            # A random reachable state, so its effect count is a real one
+            mask, cost = rules.mask_of(mixfinder.base_products[base]), 0
+            for _ in range(rng.randrange(7)):
+                index = rng.randrange(len(costs))
+                mask, cost = rules.successors(mask)[index], cost + costs[index]
+            for remaining in (1, 2, 3):
+                exact = best_extension(rules, mask, cost, remaining, base_price, costs, bit_values)
+                assert bound(mask, cost, remaining) >= exact - 1e-9
+
+
+def test_profit_search_keeps_a_label_tied_with_the_incumbent():
+    # One step from the end the bound is exact; the beam finds this optimum
+    # before the search does, and the label reaching it must still survive.
+    base, depth = "Green Crack", 4
+    rules = mixfinder.compile_rules()
+    costs = [mixfinder.ingredient_costs[ing] for ing in rules.ingredients]
+    bit_values = rules.multiplier_bits(mixfinder.effect_multipliers)
+    base_price = mixfinder.base_prices[base]
+    start = rules.mask_of(mixfinder.base_products[base])
+    bound = mixfinder.profit_bound(rules, base_price, costs, bit_values, depth)
+    found = mixfinder.profit_search({start: 0}, rules.successors, int, depth, base_price, costs, bit_values,
+                                    bound=bound, top=mixfinder.TopMixes())
+    exact = best_extension(rules, start, 0, depth, base_price, costs, bit_values)
+    assert abs(found[0][0] - exact) < 1e-9
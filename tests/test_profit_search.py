@@ -0,0 +1,46 @@
+import pytest
+
+import mixfinder
+
+
+def brute_force(base, depth):
+    """Cheapest cost of every effect set reachable in 1..depth ingredients, by trying every path."""
+    rules = mixfinder.compile_rules()
+    costs = [mixfinder.ingredient_costs[ing] for ing in rules.ingredients]
+    cheapest = {}
+    level = [(rules.mask_of(mixfinder.base_products[base]), 0)]
+    for _ in range(depth):
+        level = [(new_mask, cost + costs[index])
+                 for mask, cost in level for index, new_mask in enumerate(rules.successors(mask))]
+        for mask, cost in level:
+            cheapest[mask] = min(cost, cheapest.get(mask, cost))
+    base_price = mixfinder.base_prices[base]
+    bit_values = rules.multiplier_bits(mixfinder.effect_multipliers)
+    return {tuple(rules.effects_of(mask)): base_price * mixfinder.mask_multiplier(mask, bit_values) - cost
+            for mask, cost in cheapest.items()}
+
+
+def search(engine, base, depth, k, per_state):
+    rules = mixfinder.compile_rules()
+    start = rules.mask_of(mixfinder.base_products[base])
+    return mixfinder.profit_worker_shard(
+        (engine, base, [(start, 0, [])], depth, mixfinder.effect_rules, k, per_state, None, {}))
+
+
+@pytest.mark.parametrize("engine", ["python", "numpy"])
+@pytest.mark.parametrize("base", ["OG Kush", "Green Crack", "Meth", "Cocaine"])
+def test_profit_search_matches_exhaustive_search_at_depth_4(engine, base):
+    if engine == "numpy":
+        pytest.importorskip("numpy")
+    exact = brute_force(base, 4)
+
+    best = search(engine, base, 4, 1, False)[0]
+    assert len(best["path"]) <= 4
+    assert mixfinder.mix_profit(best) == pytest.approx(max(exact.values()))
+
+    # One mix per effect set: each must be the cheapest way to reach it
+    found = {tuple(mix["effects"]): mixfinder.mix_profit(mix) for mix in search(engine, base, 4, 100, True)}
+    ranked = sorted(exact.values(), reverse=True)[:100]
+    assert sorted(found.values(), reverse=True) == pytest.approx(ranked)
+    for effects, profit in found.items():
+        assert profit == pytest.approx(exact[effects])
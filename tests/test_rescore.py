@@ -0,0 +1,66 @@
+import random
+
+import pytest
+
+import mixfinder
+
+BASES = ["OG Kush", "Meth"]
+
+
+def random_prices(rng):
+    return {
+        "base_prices": {base: rng.randint(10, 150) for base in BASES},
+        "ingredient_costs": {ing: rng.randint(0, 15) for ing in rng.sample(sorted(mixfinder.ingredient_costs), 8)},
+        "effect_multipliers": {effect: round(rng.uniform(0, 0.6), 2)
+                               for effect in rng.sample(sorted(mixfinder.effect_multipliers), 10)},
+    }
+
+
+def brute_force(prices, depth):
+    """Profit of the cheapest path to every (base, effect set) within depth, trying every path."""
+    bases, costs_by_name, multipliers = mixfinder.merged_prices(prices)
+    rules = mixfinder.compile_rules()
+    costs = [costs_by_name[ing] for ing in rules.ingredients]
+    bit_values = rules.multiplier_bits(multipliers)
+    profits = {}
+    for base in BASES:
+        cheapest = {}
+        level = [(rules.mask_of(mixfinder.base_products[base]), 0)]
+        for _ in range(depth):
+            level = [(new_mask, cost + costs[index])
+                     for mask, cost in level for index, new_mask in enumerate(rules.successors(mask))]
+            for mask, cost in level:
+                cheapest[mask] = min(cost, cheapest.get(mask, cost))
+        for mask, cost in cheapest.items():
+            profits[base, mask] = bases[base] * mixfinder.mask_multiplier(mask, bit_values) - cost
+    return profits
+
+
+def searched(monkeypatch, prices, depth, k):
+    """The k best profits found by searching again under the new prices."""
+    for name, table in zip(("base_prices", "ingredient_costs", "effect_multipliers"), mixfinder.merged_prices(prices)):
+        monkeypatch.setattr(mixfinder, name, table)
+    rules = mixfinder.compile_rules()
+    profits = []
+    for base in BASES:
+        start = rules.mask_of(mixfinder.base_products[base])
+        profits += map(mixfinder.mix_profit, mixfinder.profit_worker_shard(
+            ("python", base, [(start, 0, [])], depth, mixfinder.effect_rules, k, False, None, {})))
+    return sorted(profits, reverse=True)[:k]
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_rescored_profit_matches_exhaustive_search_under_new_prices(monkeypatch, seed):
+    prices = random_prices(random.Random(seed))
+    merged = mixfinder.merged_prices(prices)
+    everything = sorted(brute_force(prices, 4).values(), reverse=True)
+
+    def rescored(k, per_effect_set):
+        mixes = mixfinder.rescored_profit_mixes(BASES, 4, k, per_effect_set, prices)
+        assert all(len(mix["path"]) <= 4 for mix in mixes)
+        return [mixfinder.mix_financials(mix, merged)["profit"] for mix in mixes]
+
+    assert rescored(1, False) == pytest.approx(everything[:1])
+    assert rescored(20, True) == pytest.approx(everything[:20])
+    # Several paths may reach one effect set; those the search keeps, rescoring must too
+    assert rescored(10, False) == pytest.approx(searched(monkeypatch, prices, 4, 10))
@@ -0,0 +1,57 @@
+import asyncio
+import json
+import os
+import tempfile
+
+import mixfinder
+
+
+def top_query(id, base, k):
+    return json.dumps({"id": id, "mode": "profit", "bases": base, "depth": 4, "top": k, "engine": "python"})
+
+
+def check_ranked(records, id, k):
+    ranked, done = records[:-1], records[-1]
+    assert [record["id"] for record in records] == [id] * (k + 1)
+    assert [record["rank"] for record in ranked] == list(range(1, k + 1))
+    profits = [record["profit"] for record in ranked]
+    assert profits == sorted(profits, reverse=True)
+    assert done["done"] and done["count"] == k and "error" not in done
+    return ranked
+
+
+def test_server_streams_top_k_and_survives_bad_lines():
+    socket_path = os.path.join(tempfile.mkdtemp(prefix="mixfinder-server-"), "server.sock")
+
+    async def session():
+        ready = asyncio.Event()
+        server = asyncio.create_task(mixfinder.serve(socket_path, ready=lambda address: ready.set()))
+        await asyncio.wait_for(ready.wait(), 120)
+        try:
+            ask = lambda lines: list(mixfinder.ask_server(lines, socket_path))
+            # Two connections at once, the second with a bad line between its queries
+            first, second = await asyncio.gather(
+                asyncio.to_thread(ask, [top_query("kush", "OG Kush", 5)]),
+                asyncio.to_thread(ask, [top_query("meth", "Meth", 3), "{not json", top_query("coke", "Cocaine", 2)]))
+            stats = await asyncio.to_thread(ask, ['{"op": "stats"}'])
+        finally:
+            server.cancel()
+            await asyncio.gather(server, return_exceptions=True)
+        return first, second, stats
+
+    first, second, stats = asyncio.run(session())
+
+    kush = check_ranked(first, "kush", 5)
+    expected = list(mixfinder.iter_profit_mixes("OG Kush", 5, 4, engine="python"))
+    assert [record["profit"] for record in kush] == [mixfinder.mix_profit(mix) for mix in expected]
+
+    check_ranked(second[:4], "meth", 3)
+    bad = second[4]
+    assert bad["id"] == 2 and bad["error"].startswith("Invalid JSON")
+    check_ranked(second[5:], "coke", 2)
+    assert len(second) == 8
+
+    [snapshot] = stats
+    assert snapshot["requests"] == 4 and snapshot["errors"] == 1 and snapshot["in_flight"] == 0
+    assert snapshot["latency_ms"]["max"] >= snapshot["latency_ms"]["p50"] > 0
+    assert not os.path.exists(socket_path)
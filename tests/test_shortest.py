@@ -0,0 +1,67 @@
+import random
+
+import pytest
+
+import mixfinder
+
+ENGINES = ["python", "numpy", "external"]
+
+
+@pytest.fixture(scope="module")
+def pool():
+    with mixfinder.WorkerPool(show_progress=False) as pool:
+        yield pool
+
+
+@pytest.fixture(scope="module")
+def graphs():
+    return {}
+
+
+def exhaustive(base, desired, depth):
+    """(ingredient count, cost) of the cheapest of the shortest recipes, from every path's cost."""
+    rules = mixfinder.compile_rules()
+    costs = [mixfinder.ingredient_costs[ing] for ing in rules.ingredients]
+    level = {rules.mask_of(mixfinder.base_products[base]): 0}  # mask -> cheapest path of exactly this length
+    for count in range(depth + 1):
+        hits = [cost for mask, cost in level.items() if mask & desired == desired]
+        if hits:
+            return count, min(hits)
+        next_level = {}
+        for mask, cost in level.items():
+            for index, new_mask in enumerate(rules.successors(mask)):
+                next_level[new_mask] = min(cost + costs[index], next_level.get(new_mask, float('inf')))
+        level = next_level
+    return None
+
+
+def summary(path):
+    return None if path is None else (len(path), sum(mixfinder.ingredient_costs[ing] for ing in path))
+
+
+@pytest.mark.parametrize("seed", range(6))
+def test_shortest_mix_is_the_cheapest_of_the_shortest(pool, graphs, seed):
+    rng = random.Random(seed)
+    rules = mixfinder.compile_rules()
+    effects = sorted(rules.bit)
+    for _ in range(4):
+        base = rng.choice(sorted(mixfinder.base_products))
+        desired = rng.sample(effects, rng.randint(1, 3))
+        expected = exhaustive(base, rules.mask_of(desired), 5)
+
+        if base not in graphs:
+            graphs[base] = mixfinder.build_state_graph(mixfinder.base_products[base], 5)
+        decided, result = mixfinder.graph_shortest(graphs[base], base, desired, 5)
+        assert decided
+        assert summary(result and result["path"]) == expected
+
+        for engine in ENGINES:
+            if engine == "numpy":
+                pytest.importorskip("numpy")
+            result = mixfinder.bfs_solver_multiprocessing(desired, [base], 5, engine=engine, pool=pool)
+            assert summary(result and result["path"]) == expected, (engine, base, desired)
+            if result is not None:
+                replayed = list(mixfinder.base_products[base])
+                for ingredient in result["path"]:
+                    replayed = mixfinder.apply_ingredient(replayed, ingredient)
+                assert replayed == result["effects"] and set(desired) <= set(replayed)
@@ -0,0 +1,76 @@
+import random
+
+import pytest
+
+import mixfinder
+
+from test_rescore import BASES, random_prices
+
+DEPTH = 4
+
+
+def profit(mix, scenario):
+    return mixfinder.mix_financials(mix, mixfinder.merged_prices(scenario))["profit"]
+
+
+def blend(first, second, fraction):
+    """Prices a fraction of the way from one scenario to the next."""
+    return {table: {name: (1 - fraction) * first[table][name] + fraction * second[table][name]
+                    for name in first[table]} for table in first}
+
+
+def test_every_scenario_matches_rescoring_at_its_prices():
+    rng = random.Random(0)
+    scenarios = [random_prices(rng) for _ in range(2 * mixfinder.SWEEP_CHUNK + 3)]
+    swept = mixfinder.price_sweep(scenarios, BASES, DEPTH)
+
+    assert [row["scenario"] for row in swept["scenarios"]] == list(range(len(scenarios)))
+    for row, scenario in zip(swept["scenarios"], scenarios):
+        [best] = mixfinder.rescored_profit_mixes(BASES, DEPTH, prices=scenario)
+        assert row["profit"] == pytest.approx(profit(best, scenario))
+        assert row["profit"] == pytest.approx(profit(row["result"], scenario))
+        assert len(row["result"]["path"]) <= DEPTH
+
+
+def test_sweep_without_numpy_gives_the_same_mixes(monkeypatch):
+    scenarios = mixfinder.scaled_scenarios("ingredient_costs", 0.0, 3.0, 12)
+    expected = mixfinder.price_sweep(scenarios, BASES, DEPTH)
+
+    def missing():
+        raise ImportError("no NumPy here")
+
+    monkeypatch.setattr(mixfinder, "_numpy", missing)
+    found = mixfinder.price_sweep(scenarios, BASES, DEPTH)
+    assert [row["profit"] for row in found["scenarios"]] == pytest.approx(
+        [row["profit"] for row in expected["scenarios"]])
+
+
+@pytest.mark.parametrize("table, start, stop", [
+    ("ingredient_costs", 0.0, 4.0),
+    ("effect_multipliers", 0.2, 3.0),
+])
+def test_breakpoints_are_where_the_top_mix_changes(table, start, stop):
+    # One table scaled at a time, so profits move linearly between scenarios
+    scenarios = mixfinder.scaled_scenarios(table, start, stop, 9)
+    swept = mixfinder.price_sweep(scenarios, BASES, DEPTH)
+    rows = swept["scenarios"]
+    assert swept["breakpoints"], "the sweep should cross at least one breakpoint"
+
+    changes = [index for index in range(len(rows) - 1) if rows[index]["result"] != rows[index + 1]["result"]]
+    assert [point["after"] for point in swept["breakpoints"]] == changes
+
+    for point in swept["breakpoints"]:
+        index, at = point["after"], point["at"]
+        assert point["from"] == rows[index]["result"] and point["to"] == rows[index + 1]["result"]
+        assert index <= at <= index + 1
+        first, second = scenarios[index], scenarios[index + 1]
+        # The two mixes tie at the crossing; the old one leads before it and the new one after
+        crossing = blend(first, second, at - index)
+        assert profit(point["from"], crossing) == pytest.approx(profit(point["to"], crossing))
+        for fraction, leader, other in ((0.0, "from", "to"), (1.0, "to", "from")):
+            prices = blend(first, second, fraction)
+            assert profit(point[leader], prices) >= profit(point[other], prices) - 1e-9
+        # And the new one really is the best mix there is past the crossing
+        after = blend(first, second, (at - index + 1) / 2)
+        [best] = mixfinder.rescored_profit_mixes(BASES, DEPTH, prices=after)
+        assert profit(point["to"], after) == pytest.approx(profit(best, after))
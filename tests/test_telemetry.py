@@ -0,0 +1,47 @@
+import json
+
+import mixfinder
+
+# Five ingredients deep, so the shards have levels of their own to search
+QUERY = {"id": "deep", "effects": ["Anti-Gravity", "Zombifying", "Cyclopean"], "bases": ["OG Kush"], "depth": 6,
+         "engine": "python", "telemetry": True}
+
+
+def test_query_telemetry_and_chrome_trace(tmp_path, capsys):
+    queries = tmp_path / "queries.ndjson"
+    queries.write_text(json.dumps(QUERY) + "\n" + json.dumps({**QUERY, "id": "quiet", "telemetry": False}) + "\n",
+                       encoding="utf-8")
+    trace_path = tmp_path / "trace.json"
+
+    mixfinder.main(["batch", str(queries), "--trace", str(trace_path)])
+    deep, quiet = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert "error" not in deep and len(deep["result"]["path"]) == 5
+    assert "telemetry" not in quiet  # traced for the file, but not asked to report it
+
+    telemetry = deep["telemetry"]
+    assert telemetry["label"] == "query deep"
+    assert [phase["name"] for phase in telemetry["phases"]] == ["plan", "search"]
+    assert telemetry["tasks"] == len(telemetry["task_records"]) > 0
+    assert 0 < telemetry["worker_seconds"] and telemetry["queue_seconds"] >= 0
+    levels = [level for task in telemetry["task_records"] for level in task["levels"]]
+    assert sum(level["generated"] for level in levels) == sum(total["generated"] for total in telemetry["by_depth"])
+    depths = [total["depth"] for total in telemetry["by_depth"]]
+    assert depths == list(range(depths[0], depths[-1] + 1)) and depths[-1] <= QUERY["depth"]
+    for total in telemetry["by_depth"]:
+        assert total["generated"] >= total["new"] >= 0 and 0 <= total["dedup_hit_rate"] < 1
+    assert all(total["new"] > 0 for total in telemetry["by_depth"][:-1])  # the last level only finds the goal
+
+    trace = json.loads(trace_path.read_text(encoding="utf-8"))
+    events = trace["traceEvents"]
+    assert trace["displayTimeUnit"] == "ms"
+    assert all(event["ph"] == "X" and event["dur"] >= 0 for event in events)
+    for label, record in (("query deep", telemetry), ("query quiet", None)):
+        mine = [event for event in events if event["args"].get("query") == label]
+        assert [event["name"] for event in mine if event["cat"] == "parent"] == ["plan", "search"]
+        tasks = [event for event in mine if event["cat"] == "task"]
+        assert tasks and all("queued_ms" in event["args"] for event in tasks)
+        if record is not None:
+            assert len(tasks) == record["tasks"]
+    level_events = [event for event in events if event["cat"] == "level"]
+    assert len(level_events) == 2 * len(levels)
+    assert all({"frontier", "generated", "new", "seconds"} <= set(event["args"]) for event in level_events)
@@ -0,0 +1,38 @@
+import pytest
+
+import mixfinder
+
+
+def signature(mix):
+    return round(mixfinder.mix_profit(mix), 6), tuple(mix["effects"]), len(mix["path"])
+
+
+def unsharded(base, depth, k, per_effect_set):
+    rules = mixfinder.compile_rules()
+    start = rules.mask_of(mixfinder.base_products[base])
+    return mixfinder.profit_worker_shard(
+        ("python", base, [(start, 0, [])], depth, mixfinder.effect_rules, k, per_effect_set, None, {}))
+
+
+@pytest.mark.parametrize("base, depth, k, per_effect_set", [
+    ("OG Kush", 5, 300, False),
+    ("Cocaine", 4, 500, False),
+    ("OG Kush", 5, 300, True),
+])
+def test_sharded_top_k_matches_unsharded(monkeypatch, base, depth, k, per_effect_set):
+    monkeypatch.setattr(mixfinder, "SHARDS_PER_WORKER", 16)
+    expected = sorted(map(signature, unsharded(base, depth, k, per_effect_set)), reverse=True)
+    found = sorted(map(signature, mixfinder.iter_profit_mixes(base, k, depth, per_effect_set, "python")),
+                   reverse=True)
+
+    assert [mix[0] for mix in found] == [mix[0] for mix in expected]
+    # Mixes tied with the k-th may differ; everything above it must not
+    cut = expected[-1][0]
+    assert [mix for mix in found if mix[0] > cut] == [mix for mix in expected if mix[0] > cut]
+
+
+def test_sharded_top_k_is_best_first(monkeypatch):
+    monkeypatch.setattr(mixfinder, "SHARDS_PER_WORKER", 16)
+    profits = [mixfinder.mix_profit(mix) for mix in mixfinder.iter_profit_mixes("Meth", 50, 5, engine="python")]
+    assert len(profits) == 50
+    assert profits == sorted(profits, reverse=True)